@@ -0,0 +1,284 @@
+"""
+Advice Rule Engine
+Crop, yield and weather advice defined as a table of threshold rules
+(advice_rules.json), evaluated one row at a time or over a whole batch with
+NumPy boolean masks
+
+A table is a list of groups. In a 'first' group the first matching rule wins
+and a rule without a condition is the fallback; in an 'all' group every
+matching rule applies. Messages may use {placeholders} for input fields and
+for values passed in by the caller, e.g. {predicted_yield:.2f}.
+"""
+
+import json
+import operator
+import string
+
+import numpy as np
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+MATCH_MODES = ('first', 'all')
+# Below this many rows the fixed cost of the array operations outweighs the
+# per-row loop, so small batches are evaluated row by row
+SMALL_BATCH = 32
+OUTPUT_STYLES = ('text', 'advisory')
+
+class RuleTableError(ValueError):
+    """Raised when a rule table is malformed"""
+
+class Rule:
+    """One message with the conditions (all must hold) under which it applies"""
+
+    def __init__(self, spec, where):
+        when = spec.get('when') or []
+        if isinstance(when, dict):
+            when = [when]
+        self.conditions = []
+        for condition in when:
+            try:
+                field, op, value = condition['field'], condition['op'], float(condition['value'])
+            except (KeyError, TypeError, ValueError) as e:
+                raise RuleTableError(f'{where}: bad condition {condition!r} ({e})') from e
+            if op not in OPERATORS:
+                raise RuleTableError(f"{where}: unknown operator '{op}' (use one of {', '.join(OPERATORS)})")
+            self.conditions.append((field, OPERATORS[op], value))
+
+        if 'message' not in spec:
+            raise RuleTableError(f'{where}: rule has no message')
+        self.message = spec['message']
+        self.severity = spec.get('severity', 'info')
+        self.title = spec.get('title', '')
+        segments = list(string.Formatter().parse(self.message))
+        self.placeholders = list(dict.fromkeys(name for _, name, _, _ in segments if name is not None))
+        if any(not name or name.isdigit() for name in self.placeholders):
+            raise RuleTableError(f'{where}: message placeholders must be named, e.g. {{rainfall}}')
+
+        # A message with one plain {field} or {field:spec} is filled by a single
+        # format() call between fixed prefix and suffix text
+        self._template = None
+        fields = [i for i, segment in enumerate(segments) if segment[1] is not None]
+        if len(fields) == 1:
+            _, name, spec, conversion = segments[fields[0]]
+            if name.isidentifier() and not conversion and '{' not in spec:
+                prefix = ''.join(segment[0] for segment in segments[:fields[0] + 1])
+                suffix = ''.join(segment[0] for segment in segments[fields[0] + 1:])
+                self._template = (prefix, name, spec, suffix)
+
+    def mask(self, columns, n):
+        mask = np.ones(n, dtype=bool)
+        for field, compare, threshold in self.conditions:
+            mask &= compare(columns[field], threshold)
+        return mask
+
+    def fill(self, values):
+        """The message with placeholders filled from the ``values`` dict"""
+        if not self.placeholders:
+            return self.message
+        if self._template is not None:
+            prefix, name, spec, suffix = self._template
+            return prefix + format(values[name], spec) + suffix
+        return self.message.format(**values)
+
+    def fill_many(self, columns):
+        """Messages for many rows, from a dict of equal-length value lists"""
+        if self._template is not None:
+            prefix, name, spec, suffix = self._template
+            return [prefix + format(value, spec) + suffix for value in columns[name]]
+        names = list(columns)
+        return [self.message.format(**dict(zip(names, values))) for values in zip(*columns.values())]
+
+    def render(self, output, values=None):
+        """The rule's advice, with placeholders filled from ``values``"""
+        return self.advice(output, self.fill(values))
+
+    def advice(self, output, message):
+        if output == 'text':
+            return message
+        return {'type': self.severity, 'title': self.title, 'message': message}
+
+class RuleTable:
+    """Named advice tables loaded from a JSON rule file"""
+
+    def __init__(self, spec):
+        self.tables = {}
+        for name, table in spec.items():
+            output = table.get('output', 'text')
+            if output not in OUTPUT_STYLES:
+                raise RuleTableError(f"{name}: unknown output '{output}' (use one of {', '.join(OUTPUT_STYLES)})")
+            groups = []
+            fields = []
+            for group in table.get('groups', []):
+                where = f"{name}.{group.get('name', len(groups))}"
+                match = group.get('match', 'first')
+                if match not in MATCH_MODES:
+                    raise RuleTableError(f"{where}: unknown match mode '{match}' (use 'first' or 'all')")
+                rules = [Rule(rule, f'{where}[{i}]') for i, rule in enumerate(group.get('rules', []))]
+                for rule in rules:
+                    fields.extend(field for field, _, _ in rule.conditions if field not in fields)
+                groups.append((match, rules))
+            self.tables[name] = (output, groups, fields)
+
+    def evaluate(self, name, row, context=None):
+        """Advice for one row (a dict of inputs), as a list of messages or advisory dicts"""
+        output, groups, _ = self._table(name)
+        converted = {}
+        advice = []
+        for match, rules in groups:
+            for rule in rules:
+                for field, compare, threshold in rule.conditions:
+                    value = converted.get(field)
+                    if value is None:
+                        value = converted[field] = float(row[field])
+                    if not compare(value, threshold):
+                        break
+                else:
+                    values = None
+                    if rule.placeholders:
+                        values = {field: context[field] if context and field in context else row[field]
+                                  for field in rule.placeholders}
+                    advice.append(rule.render(output, values))
+                    if match == 'first':
+                        break
+        return advice
+
+    def evaluate_batch(self, name, rows, context=None):
+        """Advice for many rows at once
+
+        ``rows`` is a list of input dicts or a pandas DataFrame; ``context``
+        maps placeholder names to one value per row. Conditions are evaluated
+        as boolean masks over whole columns, each rule's advice is placed into
+        the matching rows with one array assignment, and rows are then built
+        in groups that share the same set of applicable messages.
+        """
+        output, groups, fields = self._table(name)
+        context = context or {}
+        n = len(rows)
+        if n < SMALL_BATCH:
+            records = rows.to_dict('records') if hasattr(rows, 'columns') else rows
+            return [self.evaluate(name, row, {field: values[i] for field, values in context.items()})
+                    for i, row in enumerate(records)]
+        columns = _float_columns(rows, fields)
+
+        # One object column per message position: a 'first' group fills one,
+        # each rule of an 'all' group fills its own
+        slots = []
+        present = []
+        for match, rules in groups:
+            remaining = np.ones(n, dtype=bool)
+            slot = np.full(n, None, dtype=object)
+            for rule in rules:
+                mask = rule.mask(columns, n)
+                if match == 'first':
+                    mask &= remaining
+                    remaining &= ~mask
+                matched = np.flatnonzero(mask)
+                if len(matched):
+                    slot[matched] = self._render_matched(output, rule, matched, rows, context)
+                if match == 'all':
+                    slots.append(slot)
+                    present.append(mask)
+                    slot = np.full(n, None, dtype=object)
+            if match == 'first':
+                slots.append(slot)
+                present.append(~remaining)
+
+        if not n or not slots:
+            return [[] for _ in range(n)]
+        advice = _assemble(slots, present, n)
+        if output == 'advisory':
+            return [[dict(item) for item in items] for items in advice]
+        return advice
+
+    def _render_matched(self, output, rule, matched, rows, context):
+        """The rule's advice for the matched rows, or one shared value if it has no placeholders"""
+        if not rule.placeholders:
+            return rule.render(output)
+
+        sources = {field: _raw_column(rows, context, field) for field in rule.placeholders}
+        rendered = np.empty(len(matched), dtype=object)
+        if len(sources) == 1:
+            field, source = next(iter(sources.items()))
+            if isinstance(source, np.ndarray) and source.dtype.kind not in 'biufc':
+                # Labels such as crop names repeat, so render each distinct one once
+                positions = {}
+                ids = np.fromiter((positions.setdefault(value, len(positions)) for value in source[matched].tolist()),
+                                  np.int64, len(matched))
+                distinct = np.empty(len(positions), dtype=object)
+                distinct[:] = [rule.render(output, {field: value}) for value in positions]
+                rendered[:] = distinct[ids]
+                return rendered
+
+        # Values keep their type from the source, so an int 25 still renders as '25'
+        messages = rule.fill_many({field: _pick(source, matched) for field, source in sources.items()})
+        rendered[:] = messages if output == 'text' else [rule.advice(output, message) for message in messages]
+        return rendered
+
+    def _table(self, name):
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise RuleTableError(f"No advice table named '{name}'") from None
+
+def _float_columns(rows, fields):
+    """Condition fields of a list of dicts or a DataFrame as float64 arrays"""
+    if hasattr(rows, 'columns'):
+        return {field: rows[field].to_numpy(dtype=np.float64) for field in fields}
+    if not fields:
+        return {}
+    getter = operator.itemgetter(*fields)
+    matrix = np.array([getter(row) for row in rows], dtype=np.float64).reshape(len(rows), len(fields))
+    return {field: matrix[:, j] for j, field in enumerate(fields)}
+
+def _assemble(slots, present, n):
+    """Per-row lists of the filled slots, built group by group of rows that have
+    the same slots filled so no per-item filtering is needed"""
+    if len(slots) > 62:
+        return [[item for item in row if item is not None] for row in np.column_stack(slots).tolist()]
+
+    weights = np.left_shift(1, np.arange(len(slots), dtype=np.int64))
+    patterns = np.column_stack(present).astype(np.int64) @ weights
+    uniques, inverse = np.unique(patterns, return_inverse=True)
+    order = np.argsort(inverse.reshape(-1), kind='stable')
+    bounds = np.cumsum(np.bincount(inverse.reshape(-1)))[:-1]
+
+    advice = [None] * n
+    for pattern, indices in zip(uniques.tolist(), np.split(order, bounds)):
+        filled = [slot[indices] for j, slot in enumerate(slots) if pattern >> j & 1]
+        rows = np.column_stack(filled).tolist() if filled else [[] for _ in range(len(indices))]
+        for i, items in zip(indices.tolist(), rows):
+            advice[i] = items
+    return advice
+
+def _pick(source, matched):
+    """Values of a per-row sequence at the matched positions, as a list"""
+    if isinstance(source, np.ndarray):
+        values = source[matched]
+        # Python floats and ints format like float64 and integer scalars, only faster
+        if values.dtype == np.float64 or values.dtype.kind in 'biuO':
+            return values.tolist()
+        return list(values)
+    return [source[i] for i in matched.tolist()]
+
+def _raw_column(rows, context, field):
+    """Placeholder values for every row, from the caller's context or the inputs"""
+    if field in context:
+        return context[field]
+    if hasattr(rows, 'columns'):
+        return rows[field].to_numpy()
+    return [row[field] for row in rows]
+
+def load_rule_table(path):
+    """Read and validate a JSON rule file"""
+    with open(path, encoding='utf-8') as f:
+        try:
+            spec = json.load(f)
+        except json.JSONDecodeError as e:
+            raise RuleTableError(f'{path}: {e}') from e
+    return RuleTable(spec)
@@ -3,45 +3,564 @@ Smart Agriculture Decision Support System
 Flask Backend Application
 """
 
-from flask import Flask, render_template, request, jsonify
+import time
+
+_import_started = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import wraps
 import pickle
 import numpy as np
-import pandas as pd
-import requests
 from datetime import datetime
+import csv
+import hashlib
+import hmac
+import io
+import json
 import os
+import signal
+import sys
+import tempfile
+import threading
+import zlib
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+
+# Model tooling lives next to the training scripts
+sys.path.insert(0, MODELS_DIR)
+from forest_engine import FlatForest, compile_forest
+from model_artifacts import MANIFEST_NAME, ArtifactError, content_version, load_crop_model, load_yield_model
+from model_registry import REGISTRY_DIR, REGISTRY_FILE, read_registry, version_dir
+from yield_surface import SurfaceError, YieldSurface
+from crop_lookup import CropLookup, CropLookupError
+from category_lookup import add_category_lookups, encode_category, UnknownCategoryError
+from prediction_cache import MISSING, PredictionCache, SQLiteCacheBackend, quantize, make_key
+from weather_client import WeatherClient, WeatherProviderError
+from advice_rules import load_rule_table
+from file_watcher import FileWatcher
+from micro_batcher import MicroBatcher
+from crop_planner import DEFAULT_MIN_SUITABILITY, MAX_PLAN_PLOTS, parse_plots, plan_farm
+from metrics import (REGISTRY, REQUEST_LATENCY, SamplingProfiler, TimedModel, stage, record_error,
+                     server_timing_header)
 
 app = Flask(__name__)
 
 # Configuration
-WEATHER_API_KEY = 'demo'  # Using demo mode for offline capability
-WEATHER_API_URL = 'https://api.openweathermap.org/data/2.5/weather'
+# Set OPENWEATHER_API_KEY to use live weather; 'demo' keeps the offline mock data
+WEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY', 'demo')
+WEATHER_API_URL = os.environ.get('WEATHER_API_URL', 'https://api.openweathermap.org/data/2.5/weather')
+WEATHER_CACHE_TTL = float(os.environ.get('WEATHER_CACHE_TTL', '600'))
+WEATHER_TIMEOUT = float(os.environ.get('WEATHER_TIMEOUT', '3'))
+# Multi-city advisories: concurrent fetches, overall deadline and request size cap
+WEATHER_MAX_CONCURRENCY = int(os.environ.get('WEATHER_MAX_CONCURRENCY', '64'))
+WEATHER_BATCH_DEADLINE = float(os.environ.get('WEATHER_BATCH_DEADLINE', '8'))
+MAX_WEATHER_CITIES = 500
+MAX_BATCH_ROWS = 100000
+
+# Inference backend: 'flat' (compiled node arrays, default) or 'sklearn'
+INFERENCE_BACKEND = os.environ.get('AGRI_INFERENCE_BACKEND', 'flat')
+
+# Per-request sampling profiler, enabled with AGRI_PROFILING=1 and requested
+# with an 'X-Profile: 1' header; folded stacks are written to AGRI_PROFILE_DIR
+PROFILING_ENABLED = os.environ.get('AGRI_PROFILING', '0') == '1'
+PROFILE_DIR = os.environ.get('AGRI_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'agri-profiles'))
+
+# Advice thresholds and messages; point AGRI_ADVICE_RULES at a copy of
+# advice_rules.json to tune them without code changes
+ADVICE_RULES_PATH = os.environ.get('AGRI_ADVICE_RULES', os.path.join(BASE_DIR, 'advice_rules.json'))
+
+# The app serves the version registry.json marks as current (models/ itself
+# when nothing is published) and reloads when registry.json changes, checked
+# every AGRI_REGISTRY_POLL seconds (0 turns polling off) or on SIGHUP
+REGISTRY_POLL_SECONDS = float(os.environ.get('AGRI_REGISTRY_POLL', '2'))
+# Shadow comparisons waiting to run; more are dropped rather than queued
+SHADOW_MAX_PENDING = 256
+# Shadow yield predictions within this many tons/ha count as agreeing
+SHADOW_YIELD_TOLERANCE = 0.1
+
+# Model reloads and observation uploads need a matching X-Admin-Token header;
+# they are refused until AGRI_ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get('AGRI_ADMIN_TOKEN')
+
+# Micro-batching, enabled with AGRI_MICROBATCH=1: single-row crop and yield
+# predictions from concurrent requests wait up to AGRI_MICROBATCH_WAIT_MS for
+# each other (or until AGRI_MICROBATCH_MAX_ROWS rows) and share one model call
+MICROBATCH_ENABLED = os.environ.get('AGRI_MICROBATCH', '0') == '1'
+MICROBATCH_WAIT_MS = float(os.environ.get('AGRI_MICROBATCH_WAIT_MS', '2'))
+MICROBATCH_MAX_ROWS = int(os.environ.get('AGRI_MICROBATCH_MAX_ROWS', '64'))
+
+# Crop serving mode: 'model' runs the forest for every request; 'lookup'
+# answers single-row recommendations from the precomputed table built by
+# models/crop_lookup.py and runs the forest only for inputs outside its grid
+# or in cells where the forest's top crop is not stable
+CROP_SERVING_MODE = os.environ.get('AGRI_CROP_SERVING', 'model')
+
+# Yield surfaces whose measured mean relative error against the forest is
+# above this are not served
+SURFACE_MAX_ERROR = float(os.environ.get('AGRI_SURFACE_MAX_ERROR', '0.05'))
+
+# Set AGRI_WARMUP=1 to start loading models in the background at import time
+WARMUP_ON_IMPORT = os.environ.get('AGRI_WARMUP', '0') == '1'
+
+# Crop model feature order, with the dataset column names accepted in CSV uploads
+CROP_FEATURES = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
+CROP_FEATURE_ALIASES = {'n': 'nitrogen', 'p': 'phosphorus', 'k': 'potassium'}
+YIELD_NUMERIC_FIELDS = ['area', 'rainfall', 'fertilizer', 'pesticide']
+# Yield model feature order, as named in explanations
+YIELD_FEATURES = ['state', 'crop'] + YIELD_NUMERIC_FIELDS
+
+# Prediction cache: entries (0 disables), time-to-live in seconds, and an
+# optional SQLite file that lets all workers on a host share cached results
+CACHE_SIZE = int(os.environ.get('AGRI_CACHE_SIZE', '10000'))
+CACHE_TTL = float(os.environ.get('AGRI_CACHE_TTL', '3600'))
+CACHE_SHARED_PATH = os.environ.get('AGRI_CACHE_SHARED_PATH')
+CACHE_SHARED_MAX_ROWS = int(os.environ.get('AGRI_CACHE_SHARED_MAX_ROWS', '100000'))
+# Decimal places kept per input field when building cache keys, e.g.
+# AGRI_CACHE_ROUNDING='{"rainfall": 0}' treats rainfall to the mm as one query
+CACHE_ROUNDING = json.loads(os.environ.get('AGRI_CACHE_ROUNDING', '{}'))
+
+weather_client = WeatherClient(
+    WEATHER_API_URL,
+    WEATHER_API_KEY,
+    connect_timeout=min(2.0, WEATHER_TIMEOUT),
+    read_timeout=WEATHER_TIMEOUT,
+    pool_size=WEATHER_MAX_CONCURRENCY,
+    cache_ttl=WEATHER_CACHE_TTL
+)
+
+# Bounded pool shared by all multi-city requests, created on first use
+_weather_pool = None
+_weather_pool_lock = threading.Lock()
+
+prediction_cache = PredictionCache(
+    maxsize=CACHE_SIZE,
+    ttl=CACHE_TTL,
+    backend=SQLiteCacheBackend(CACHE_SHARED_PATH, CACHE_TTL, CACHE_SHARED_MAX_ROWS) if CACHE_SHARED_PATH else None
+)
+
+advice_rules = load_rule_table(ADVICE_RULES_PATH)
+
+# Models are loaded on first use (or by warm_up()), not at import time.
+# 'serving' holds the current version's models (and a candidate's, if one is
+# configured); a reload builds a new dict and rebinds the name, and every
+# request reads it once, so in-flight requests finish on the models they started with
+serving = None
+_reload_watcher = None
+
+model_state = {
+    'status': 'not_loaded',  # not_loaded -> loading -> ready | failed
+    'error': None,
+    'import_seconds': None,
+    'model_load_seconds': None,
+    'loaded_at': None,
+    'reloads': 0,
+    'reload_error': None
+}
+_model_lock = threading.Lock()
+
+# Cache and model state read at scrape time by /metrics
+REGISTRY.gauge('agri_models_ready', 'Whether the models are loaded (1) or not (0)',
+               lambda: 1 if model_state['status'] == 'ready' else 0)
+REGISTRY.gauge('agri_prediction_cache_events', 'Prediction cache counters by event',
+               lambda: {(name,): value for name, value in prediction_cache.counters.items()}, ('event',))
+REGISTRY.gauge('agri_weather_upstream_calls', 'Weather provider calls made',
+               lambda: weather_client.upstream_calls)
+REGISTRY.gauge('agri_weather_coalesced_requests', 'Weather requests served by another in-flight call',
+               lambda: weather_client.coalesced)
+MODEL_RELOADS = REGISTRY.counter('agri_model_reloads_total', 'Model hot-swaps by outcome', ('outcome',))
+SHADOW_COMPARISONS = REGISTRY.counter(
+    'agri_shadow_comparisons_total', 'Rows compared against the shadow candidate', ('model', 'outcome'))
+SHADOW_YIELD_DIFFERENCE = REGISTRY.histogram(
+    'agri_shadow_yield_abs_difference', 'Absolute yield difference, current vs. shadow candidate (tons/ha)',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+REGISTRY.gauge('agri_microbatch_queue_depth', 'Rows waiting in the micro-batchers for their model call',
+               lambda: microbatch_depths(), ('model',))
+CROP_LOOKUPS = REGISTRY.counter(
+    'agri_crop_lookups_total', 'Single-row crop recommendations in lookup mode by outcome', ('outcome',))
+REGISTRY.gauge('agri_model_version_info', 'Loaded model versions by role',
+               lambda: {(role, snapshot['version']): 1 for role, snapshot in serving_snapshots()},
+               ('role', 'version'))
+
+_shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+_shadow_slots = threading.BoundedSemaphore(SHADOW_MAX_PENDING)
+
+class ModelsUnavailable(Exception):
+    """Raised when the trained models cannot be loaded"""
 
 # Load ML models
-def load_models():
-    """Load trained ML models"""
-    global crop_model, yield_model_data
+def load_models(directory=MODELS_DIR):
+    """Load trained ML models from a models directory (or registry version)
+    
+    Returns the crop model, the yield model data and content hashes of the
+    files they were loaded from.
+    """
+    if INFERENCE_BACKEND not in ('flat', 'sklearn'):
+        raise ValueError(f"Unknown AGRI_INFERENCE_BACKEND '{INFERENCE_BACKEND}' (use 'flat' or 'sklearn')")
+    if CROP_SERVING_MODE not in ('model', 'lookup'):
+        raise ValueError(f"Unknown AGRI_CROP_SERVING '{CROP_SERVING_MODE}' (use 'model' or 'lookup')")
+    
+    # Memory-mapped artifacts: no unpickling, and node arrays are shared
+    # between worker processes through the page cache
+    crop_dir = os.path.join(directory, 'artifacts', 'crop')
+    yield_dir = os.path.join(directory, 'artifacts', 'yield')
+    if INFERENCE_BACKEND == 'flat' and artifacts_available(directory):
+        try:
+            crop, yield_data = load_crop_model(crop_dir), add_category_lookups(load_yield_model(yield_dir))
+            print("✓ Models memory-mapped from artifacts")
+            versions = {
+                'crop': content_version(os.path.join(crop_dir, MANIFEST_NAME)),
+                'yield': content_version(os.path.join(yield_dir, MANIFEST_NAME))
+            }
+            return (*instrument_models(crop, yield_data), versions)
+        except ArtifactError as e:
+            print(f"Warning: could not load model artifacts - {e}")
+            print("Falling back to pickled models")
     
     try:
         # Load crop recommendation model
-        with open('models/crop_model.pkl', 'rb') as f:
-            crop_model = pickle.load(f)
+        crop_path = os.path.join(directory, 'crop_model.pkl')
+        with open(crop_path, 'rb') as f:
+            crop = pickle.load(f)
         print("✓ Crop recommendation model loaded successfully")
         
         # Load yield prediction model
-        with open('models/yield_model.pkl', 'rb') as f:
-            yield_model_data = pickle.load(f)
+        yield_path = os.path.join(directory, 'yield_model.pkl')
+        with open(yield_path, 'rb') as f:
+            yield_data = add_category_lookups(pickle.load(f))
         print("✓ Yield prediction model loaded successfully")
         
+        versions = {'crop': content_version(crop_path), 'yield': content_version(yield_path)}
+        
     except FileNotFoundError as e:
         print(f"Error: Model file not found - {e}")
         print("Please train the models first by running:")
         print("  python models/train_crop_model.py")
         print("  python models/train_yield_model.py")
-        exit(1)
+        raise ModelsUnavailable(f"Model file not found: {e.filename}") from e
+    
+    # Swap in the flat-array engine; it matches sklearn's predictions
+    # but skips its per-call overhead on single rows
+    if INFERENCE_BACKEND == 'flat':
+        crop = compile_forest(crop)
+        yield_data['model'] = compile_forest(yield_data['model'])
+        print("✓ Models compiled for flat-array inference")
+    
+    return (*instrument_models(crop, yield_data), versions)
+
+def load_snapshot(version=None):
+    """Load and warm up one registry version (None: the models in models/)"""
+    directory = MODELS_DIR if version is None else version_dir(version)
+    crop, yield_data, content = load_models(directory)
+    crop.predict_proba(np.zeros((1, len(CROP_FEATURES))))
+    yield_data['model'].predict(np.zeros((1, len(yield_data['feature_columns']))))
+    if version is None:
+        version = 'local-' + hashlib.sha256(f"{content['crop']}:{content['yield']}".encode()).hexdigest()[:8]
+    return {'version': version, 'crop': crop, 'yield': yield_data, 'content': content,
+            'surface': load_surface(directory, content['yield']),
+            'lookup': load_crop_lookup(directory, content['crop']) if CROP_SERVING_MODE == 'lookup' else None,
+            'batchers': make_batchers(crop, yield_data) if MICROBATCH_ENABLED else None,
+            'explainers': {}}
+
+def make_batchers(crop, yield_data):
+    """Micro-batchers for one loaded version, so rows of different versions never share a call"""
+    wait = MICROBATCH_WAIT_MS / 1000
+    return {
+        'crop': MicroBatcher(crop.predict_proba, 'crop', MICROBATCH_MAX_ROWS, wait),
+        'yield': MicroBatcher(yield_data['model'].predict, 'yield', MICROBATCH_MAX_ROWS, wait)
+    }
+
+def microbatch_depths():
+    """Rows waiting per model, over every loaded version"""
+    depths = {('crop',): 0, ('yield',): 0}
+    for _, snapshot in serving_snapshots():
+        for name, batcher in (snapshot['batchers'] or {}).items():
+            depths[(name,)] += batcher.pending
+    return depths
+
+def load_surface(directory, yield_content):
+    """The precomputed yield surface, if one was built from exactly this yield model"""
+    try:
+        surface = YieldSurface.load(os.path.join(directory, 'artifacts', 'yield_surface'))
+    except SurfaceError:
+        return None
+    if surface.model_content != yield_content:
+        print("Warning: yield surface was built from another yield model; "
+              "re-run python models/yield_surface.py")
+        return None
+    if surface.error['mean_relative'] > SURFACE_MAX_ERROR:
+        print(f"Warning: yield surface error {surface.error['mean_relative']:.1%} is above "
+              f"AGRI_SURFACE_MAX_ERROR ({SURFACE_MAX_ERROR:.1%}); rebuild it with more cells")
+        return None
+    print("✓ Yield surface memory-mapped")
+    return surface
+
+def load_crop_lookup(directory, crop_content):
+    """The precomputed crop lookup table, if one was built from exactly this crop model"""
+    try:
+        table = CropLookup.load(os.path.join(directory, 'artifacts', 'crop_lookup'))
+    except CropLookupError as e:
+        print(f"Warning: {e}; crop recommendations will use the model (run python models/crop_lookup.py)")
+        return None
+    if table.model_content != crop_content:
+        print("Warning: crop lookup table was built from another crop model; "
+              "re-run python models/crop_lookup.py")
+        return None
+    print("✓ Crop lookup table memory-mapped")
+    return table
+
+def build_serving(previous=None):
+    """Load what the registry asks to serve, reusing versions that are already loaded
+    
+    A candidate that fails to load is left out (and reported) rather than
+    holding back the current version.
+    """
+    registry = read_registry()
+    if registry is None or not registry.get('current'):
+        return {'primary': load_snapshot(), 'candidate': None, 'mode': None, 'fraction': 0.0}
+    
+    # Published versions never change, so a loaded one can be shared
+    loaded = {snapshot['version']: snapshot for _, snapshot in serving_snapshots(previous)}
+    primary = loaded.get(registry['current']) or load_snapshot(registry['current'])
+    candidate = None
+    if registry.get('candidate'):
+        try:
+            candidate = loaded.get(registry['candidate']) or load_snapshot(registry['candidate'])
+        except Exception as e:
+            print(f"Warning: could not load candidate {registry['candidate']} - {e}")
+            model_state['reload_error'] = f"candidate {registry['candidate']}: {e}"
+    return {
+        'primary': primary,
+        'candidate': candidate,
+        'mode': registry.get('mode') if candidate else None,
+        'fraction': float(registry.get('fraction') or 0.0) if candidate else 0.0
+    }
+
+def serving_snapshots(state=None):
+    """(role, snapshot) pairs of the loaded versions"""
+    state = serving if state is None else state
+    if state is None:
+        return []
+    return [(role, state[role]) for role in ('primary', 'candidate') if state[role] is not None]
+
+def publish_serving(state):
+    """Make a newly built serving state the one every new request uses
+    
+    Nothing is modified in place: requests already running keep the
+    snapshot they read, and old models are freed once those finish. Cache
+    keys include the model content hashes, so no cached answer from other
+    models is served afterwards.
+    """
+    global serving
+    serving = state
+    model_state['loaded_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def instrument_models(crop, yield_data):
+    """Wrap both models so their calls are timed and their batch sizes recorded"""
+    yield_data['model'] = TimedModel(yield_data['model'], 'yield')
+    return TimedModel(crop, 'crop'), yield_data
+
+def artifacts_available(directory=MODELS_DIR):
+    """Check whether exported model artifacts exist for both models"""
+    return all(
+        os.path.exists(os.path.join(directory, 'artifacts', kind, MANIFEST_NAME))
+        for kind in ('crop', 'yield')
+    )
+
+def ensure_models_loaded():
+    """Load the models once, on first use; concurrent callers wait for the same load"""
+    if model_state['status'] == 'ready':
+        return
+    
+    with _model_lock:
+        if model_state['status'] == 'ready':
+            return
+        
+        model_state['status'] = 'loading'
+        started = time.perf_counter()
+        try:
+            publish_serving(build_serving())
+        except Exception as e:
+            model_state['status'] = 'failed'
+            model_state['error'] = str(e)
+            raise ModelsUnavailable(str(e)) from e
+        
+        model_state['model_load_seconds'] = round(time.perf_counter() - started, 4)
+        model_state['status'] = 'ready'
+        model_state['error'] = None
+        print(f"✓ Models ready in {model_state['model_load_seconds'] * 1000:.1f} ms")
+        start_reload_watcher()
+
+def reload_models():
+    """Load what the registry (or models/) now holds and swap it in without a restart
+    
+    The new models are loaded and warmed up while the current ones keep
+    serving; if loading fails, the current ones stay in place.
+    """
+    if model_state['status'] != 'ready':
+        ensure_models_loaded()
+        return
+    
+    with _model_lock:
+        started = time.perf_counter()
+        model_state['reload_error'] = None
+        try:
+            state = build_serving(serving)
+        except Exception as e:
+            MODEL_RELOADS.inc(outcome='failed')
+            model_state['reload_error'] = str(e)
+            raise
+        
+        publish_serving(state)
+        model_state['model_load_seconds'] = round(time.perf_counter() - started, 4)
+        model_state['reloads'] += 1
+        MODEL_RELOADS.inc(outcome='swapped')
+        roles = ', '.join(f"{role} {snapshot['version']}" for role, snapshot in serving_snapshots(state))
+        print(f"✓ Models reloaded in {model_state['model_load_seconds'] * 1000:.1f} ms: {roles}")
+
+def start_reload_watcher():
+    """Reload in the background whenever registry.json changes or SIGHUP arrives"""
+    global _reload_watcher
+    if _reload_watcher is not None:
+        return
+    
+    def reload_quietly():
+        try:
+            reload_models()
+        except Exception as e:
+            print(f"Warning: model reload failed, still serving the previous models - {e}")
+    
+    _reload_watcher = FileWatcher(os.path.join(REGISTRY_DIR, REGISTRY_FILE), reload_quietly,
+                                  interval=REGISTRY_POLL_SECONDS if REGISTRY_POLL_SECONDS > 0 else None,
+                                  name='model-reload').start()
+
+def register_fork_handlers():
+    """Keep model state consistent in processes forked from this one (see serve.py)
+    
+    A fork waits for any reload in progress, so no child starts with the
+    model lock held, and each child gets its own reload watcher: threads
+    do not survive fork.
+    """
+    os.register_at_fork(before=_model_lock.acquire, after_in_parent=_model_lock.release,
+                        after_in_child=_after_fork_in_child)
+
+def _after_fork_in_child():
+    global _reload_watcher
+    _model_lock.release()
+    if _reload_watcher is not None:
+        _reload_watcher = _reload_watcher.forked().start()
+
+def handle_reload_signal(signum, frame):
+    """SIGHUP: reload on the watcher thread (signal handlers must not block)"""
+    if _reload_watcher is not None:
+        _reload_watcher.trigger()
+
+def warm_up():
+    """Load the models so the first request is fast (loading runs one prediction through each)"""
+    ensure_models_loaded()
+
+def start_background_warm_up():
+    """Run warm_up() in a daemon thread; failures are reported by /api/ready"""
+    def run():
+        try:
+            warm_up()
+        except ModelsUnavailable:
+            pass
+    
+    threading.Thread(target=run, name='model-warm-up', daemon=True).start()
+
+def requires_models(view):
+    """Route decorator that loads the models and picks this request's version before the view runs"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        ensure_models_loaded()
+        g.serving = serving
+        g.models = select_models(g.serving)
+        return view(*args, **kwargs)
+    return wrapper
+
+def select_models(state):
+    """The version that answers this request
+    
+    An X-Model-Version header naming a loaded version picks it. In A/B mode
+    the candidate answers a fixed share of clients, keyed on X-Client-Id (or
+    the client address) so each client keeps seeing the same version.
+    """
+    requested = request.headers.get('X-Model-Version')
+    if requested:
+        for _, snapshot in serving_snapshots(state):
+            if snapshot['version'] == requested:
+                return snapshot
+    
+    if state['candidate'] is not None and state['mode'] == 'ab':
+        client = request.headers.get('X-Client-Id') or request.remote_addr or ''
+        if zlib.crc32(client.encode()) % 10000 < state['fraction'] * 10000:
+            return state['candidate']
+    return state['primary']
+
+def requires_admin_token(view):
+    """Route decorator that checks X-Admin-Token, refusing every request while AGRI_ADMIN_TOKEN is unset"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({
+                'success': False,
+                'error': 'Admin endpoints are disabled; set AGRI_ADMIN_TOKEN to enable them'
+            }), 403
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({
+                'success': False,
+                'error': 'Missing or invalid X-Admin-Token'
+            }), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.errorhandler(ModelsUnavailable)
+def models_unavailable(e):
+    """Report missing models as a temporary outage rather than a bad request"""
+    record_error(e)
+    return jsonify({
+        'success': False,
+        'error': f'Models are not available: {e}'
+    }), 503
+
+@app.before_request
+def start_request_timer():
+    """Start per-request timing, and the sampling profiler when asked for"""
+    g.request_started = time.perf_counter()
+    if PROFILING_ENABLED and request.headers.get('X-Profile') == '1':
+        g.profiler = SamplingProfiler(threading.get_ident()).start()
 
-# Load models on startup
-load_models()
+@app.after_request
+def finish_request_timer(response):
+    """Record request latency and expose stage timings in Server-Timing"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            route=request.endpoint or 'unknown',
+            method=request.method,
+            status=str(response.status_code)
+        )
+    stages = g.get('stage_timings')
+    if stages:
+        response.headers['Server-Timing'] = server_timing_header(stages)
+    models = g.get('models')
+    if models is not None:
+        response.headers['X-Model-Version'] = models['version']
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.endpoint or 'unknown'}.folded"
+        with open(os.path.join(PROFILE_DIR, filename), 'w') as f:
+            f.write(profiler.folded())
+        response.headers['X-Profile-File'] = filename
+        response.headers['X-Profile-Samples'] = str(profiler.samples)
+    return response
 
 # ==================== ROUTES ====================
 
@@ -56,12 +575,15 @@ def crop_recommendation_page():
     return render_template('crop_recommendation.html')
 
 @app.route('/yield-prediction')
+@requires_models
 def yield_prediction_page():
     """Yield prediction page"""
-    # Get available states and crops from the model
-    states = list(yield_model_data['state_encoder'].classes_)
-    crops = list(yield_model_data['crop_encoder'].classes_)
-    return render_template('yield_prediction.html', states=states, crops=crops)
+    # Option lists are built once when the model loads
+    return render_template(
+        'yield_prediction.html',
+        states=g.models['yield']['state_options'],
+        crops=g.models['yield']['crop_options']
+    )
 
 @app.route('/weather-advisory')
 def weather_advisory_page():
@@ -71,112 +593,549 @@ def weather_advisory_page():
 # ==================== API ENDPOINTS ====================
 
 @app.route('/api/recommend-crop', methods=['POST'])
+@requires_models
 def recommend_crop():
     """API endpoint for crop recommendation"""
     try:
-        data = request.get_json()
-        
-        # Extract features
-        features = np.array([[
-            float(data['nitrogen']),
-            float(data['phosphorus']),
-            float(data['potassium']),
-            float(data['temperature']),
-            float(data['humidity']),
-            float(data['ph']),
-            float(data['rainfall'])
-        ]])
+        with stage('parse'):
+            data = request.get_json()
+            values = parse_numeric_fields(data, CROP_FEATURES)
         
-        # Make prediction
-        prediction = crop_model.predict(features)[0]
-        
-        # Get prediction probabilities
-        probabilities = crop_model.predict_proba(features)[0]
-        top_3_indices = np.argsort(probabilities)[-3:][::-1]
-        
-        recommendations = []
-        for idx in top_3_indices:
-            crop_name = crop_model.classes_[idx]
-            confidence = float(probabilities[idx] * 100)
-            recommendations.append({
-                'crop': crop_name,
-                'confidence': round(confidence, 2)
-            })
+        models = g.models
+        recommendations = lookup_crop_recommendations(models, values)
+        if recommendations is not None:
+            prediction = recommendations[0]['crop']
+            source = 'lookup'
+            quantization_error = models['lookup'].manifest['quantization_error']
+        else:
+            # One forest pass (or cache hit) gives both the label and the ranking
+            probabilities = crop_probabilities(models, values)
+            classes = models['crop'].classes_
+            prediction = classes[np.argmax(probabilities)]
+            recommendations = top_crop_recommendations(probabilities, classes)
+            source = 'model'
+            quantization_error = None
+        shadow_crop(np.array([values], dtype=np.float64), [prediction])
         
         # Generate advice based on inputs
-        advice = generate_crop_advice(data, prediction)
+        with stage('advice'):
+            advice = generate_crop_advice(data, prediction)
         
+        with stage('serialize'):
+            response = jsonify({
+                'success': True,
+                'recommended_crop': prediction,
+                'top_recommendations': recommendations,
+                'advice': advice,
+                'model_version': models['version'],
+                'source': source,
+                'quantization_error': quantization_error,
+                'input_parameters': {
+                    'Nitrogen (N)': f"{data['nitrogen']} kg/ha",
+                    'Phosphorus (P)': f"{data['phosphorus']} kg/ha",
+                    'Potassium (K)': f"{data['potassium']} kg/ha",
+                    'Temperature': f"{data['temperature']}°C",
+                    'Humidity': f"{data['humidity']}%",
+                    'pH': data['ph'],
+                    'Rainfall': f"{data['rainfall']} mm"
+                }
+            })
+        return response
+        
+    except Exception as e:
+        record_error(e)
         return jsonify({
-            'success': True,
-            'recommended_crop': prediction,
-            'top_recommendations': recommendations,
-            'advice': advice,
-            'input_parameters': {
-                'Nitrogen (N)': f"{data['nitrogen']} kg/ha",
-                'Phosphorus (P)': f"{data['phosphorus']} kg/ha",
-                'Potassium (K)': f"{data['potassium']} kg/ha",
-                'Temperature': f"{data['temperature']}°C",
-                'Humidity': f"{data['humidity']}%",
-                'pH': data['ph'],
-                'Rainfall': f"{data['rainfall']} mm"
-            }
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/recommend-crop/batch', methods=['POST'])
+@requires_models
+def recommend_crop_batch():
+    """API endpoint for crop recommendation over many soil-test rows"""
+    try:
+        with stage('parse'):
+            rows = read_batch_rows()
+        if len(rows) > MAX_BATCH_ROWS:
+            return jsonify({
+                'success': False,
+                'error': f'Batch too large: {len(rows)} rows (limit {MAX_BATCH_ROWS})'
+            }), 413
+        
+        with stage('validate'):
+            features, valid_rows, valid_inputs, errors = parse_crop_rows(rows)
+        
+        results = [None] * len(rows)
+        for row_index, error in errors.items():
+            results[row_index] = {'row': row_index, 'success': False, 'error': error}
+        
+        if valid_rows:
+            # Single forest pass over the whole matrix
+            crop_model = g.models['crop']
+            probabilities = crop_model.predict_proba(features)
+            best = np.argmax(probabilities, axis=1)
+            top_3 = np.argsort(probabilities, axis=1)[:, -3:][:, ::-1]
+            
+            predictions = crop_model.classes_[best]
+            shadow_crop(features, predictions)
+            with stage('advice'):
+                advice = generate_crop_advice_batch(valid_inputs, predictions)
+            for i, row_index in enumerate(valid_rows):
+                results[row_index] = {
+                    'row': row_index,
+                    'success': True,
+                    'recommended_crop': predictions[i],
+                    'top_recommendations': top_crop_recommendations(probabilities[i], crop_model.classes_, top_3[i]),
+                    'advice': advice[i]
+                }
+        
+        with stage('serialize'):
+            response = jsonify({
+                'success': True,
+                'count': len(rows),
+                'succeeded': len(valid_rows),
+                'failed': len(errors),
+                'model_version': g.models['version'],
+                'results': results
+            })
+        return response
         
     except Exception as e:
+        record_error(e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 400
 
 @app.route('/api/predict-yield', methods=['POST'])
+@requires_models
 def predict_yield():
     """API endpoint for yield prediction"""
     try:
-        data = request.get_json()
-        
-        # Encode categorical variables
-        state_encoded = yield_model_data['state_encoder'].transform([data['state']])[0]
-        crop_encoded = yield_model_data['crop_encoder'].transform([data['crop']])[0]
+        with stage('parse'):
+            data = request.get_json()
+            numeric_values = parse_numeric_fields(data, YIELD_NUMERIC_FIELDS)
         
-        # Prepare features
-        features = np.array([[
-            state_encoded,
-            crop_encoded,
-            float(data['area']),
-            float(data['rainfall']),
-            float(data['fertilizer']),
-            float(data['pesticide'])
-        ]])
+        # Encode categorical variables with the precomputed lookup tables
+        models = g.models
+        with stage('encode'):
+            state_encoded = encode_category(models['yield']['state_codes'], 'state', data['state'])
+            crop_encoded = encode_category(models['yield']['crop_codes'], 'crop', data['crop'])
         
         # Make prediction
-        model = yield_model_data['model']
-        predicted_yield = model.predict(features)[0]
-        total_production = predicted_yield * float(data['area'])
+        predicted_yield = yield_prediction(models, state_encoded, crop_encoded, numeric_values)
+        shadow_yield([data['state']], [data['crop']], np.array([numeric_values], dtype=np.float64), [predicted_yield])
+        total_production = predicted_yield * numeric_values[0]
         
         # Generate advice
-        advice = generate_yield_advice(data, predicted_yield)
+        with stage('advice'):
+            advice = generate_yield_advice(data, predicted_yield)
+        
+        with stage('serialize'):
+            response = jsonify({
+                'success': True,
+                'predicted_yield': round(predicted_yield, 2),
+                'total_production': round(total_production, 2),
+                'advice': advice,
+                'model_version': models['version'],
+                'input_parameters': {
+                    'State': data['state'],
+                    'Crop': data['crop'],
+                    'Area': f"{data['area']} hectares",
+                    'Annual Rainfall': f"{data['rainfall']} mm",
+                    'Fertilizer': f"{data['fertilizer']} kg/ha",
+                    'Pesticide': f"{data['pesticide']} kg/ha"
+                }
+            })
+        return response
         
+    except UnknownCategoryError as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'field': e.field,
+            'value': e.value
+        }), 422
+    except Exception as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/predict-yield/bulk', methods=['POST'])
+@requires_models
+def predict_yield_bulk():
+    """API endpoint for streaming yield predictions over a large CSV upload"""
+    try:
+        # pandas is only needed here, so it is not imported at startup
+        from predict_yield_bulk import predict_yield_chunks, SERIALIZERS, DEFAULT_CHUNK_SIZE
+        
+        output_format = request.args.get('format', 'ndjson')
+        if output_format not in SERIALIZERS:
+            raise ValueError(f"Unsupported format '{output_format}' (use 'ndjson' or 'csv')")
+        chunksize = int(request.args.get('chunksize', DEFAULT_CHUNK_SIZE))
+        if chunksize <= 0:
+            raise ValueError('chunksize must be positive')
+        
+        # Read straight from the upload stream instead of buffering the body
+        source = request.files['file'].stream if 'file' in request.files else request.stream
+        with stage('parse'):
+            chunks = predict_yield_chunks(source, g.models['yield'], chunksize=chunksize)
+        
+        mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'text/csv'
+        return Response(stream_with_context(SERIALIZERS[output_format](chunks)), mimetype=mimetype)
+        
+    except Exception as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/yield-surface', methods=['POST'])
+@requires_models
+def yield_surface_lookup():
+    """API endpoint for yield what-ifs answered from the precomputed response surface"""
+    try:
+        surface = g.models['surface']
+        if surface is None:
+            return surface_unavailable()
+    
+        with stage('parse'):
+            data = request.get_json()
+            numeric_values = parse_numeric_fields(data, YIELD_NUMERIC_FIELDS)
+    
+        with stage('encode'):
+            state_index = encode_category(surface.state_index, 'state', data['state'])
+            crop_index = encode_category(surface.crop_index, 'crop', data['crop'])
+    
+        predicted_yield = surface.lookup_index(state_index, crop_index, *numeric_values)
         return jsonify({
             'success': True,
             'predicted_yield': round(predicted_yield, 2),
-            'total_production': round(total_production, 2),
-            'advice': advice,
-            'input_parameters': {
-                'State': data['state'],
-                'Crop': data['crop'],
-                'Area': f"{data['area']} hectares",
-                'Annual Rainfall': f"{data['rainfall']} mm",
-                'Fertilizer': f"{data['fertilizer']} kg/ha",
-                'Pesticide': f"{data['pesticide']} kg/ha"
-            }
+            'total_production': round(predicted_yield * numeric_values[0], 2),
+            'source': 'surface',
+            'approximation_error': surface.error,
+            'model_version': g.models['version']
+        })
+    
+    except UnknownCategoryError as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'field': e.field,
+            'value': e.value
+        }), 422
+    except Exception as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/yield-surface/slice')
+@requires_models
+def yield_surface_slice():
+    """Rainfall x fertilizer x pesticide grid of one state and crop, for answering slider moves in the browser"""
+    try:
+        surface = g.models['surface']
+        if surface is None:
+            return surface_unavailable()
+    
+        state, crop = request.args.get('state'), request.args.get('crop')
+        area = float(request.args.get('area', surface.manifest['ranges']['area'][0]))
+        encode_category(surface.state_index, 'state', state)
+        encode_category(surface.crop_index, 'crop', crop)
+        with stage('serialize'):
+            response = jsonify({
+                'success': True,
+                'state': state,
+                'crop': crop,
+                'area': area,
+                **surface.slice(state, crop, area),
+                'approximation_error': surface.error,
+                'model_version': g.models['version']
+            })
+        return response
+    
+    except UnknownCategoryError as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'field': e.field,
+            'value': e.value
+        }), 422
+    except Exception as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+def surface_unavailable():
+    """503 for surface endpoints when no surface matches the serving yield model"""
+    return jsonify({
+        'success': False,
+        'error': 'No yield surface for the serving yield model; run python models/yield_surface.py'
+    }), 503
+
+@app.route('/api/explain/<kind>', methods=['POST'])
+@requires_models
+def explain_predictions(kind):
+    """API endpoint for per-feature contributions to crop or yield predictions
+    
+    Takes one JSON row, or many rows like the batch endpoints. Contributions
+    come from a tree-path decomposition of the forest: the base value plus
+    the contributions equals the prediction.
+    """
+    try:
+        if kind not in ('crop', 'yield'):
+            return jsonify({
+                'success': False,
+                'error': f"Unknown model '{kind}' (use 'crop' or 'yield')"
+            }), 404
+        
+        with stage('parse'):
+            data = request.get_json(silent=True) if request.is_json else None
+            single = isinstance(data, dict) and 'rows' not in data
+            rows = [data] if single else read_batch_rows()
+        if len(rows) > MAX_BATCH_ROWS:
+            return jsonify({
+                'success': False,
+                'error': f'Batch too large: {len(rows)} rows (limit {MAX_BATCH_ROWS})'
+            }), 413
+        
+        models = g.models
+        with stage('validate'):
+            if single and kind == 'yield':
+                # An unknown label in a single row is a 422, as for /api/predict-yield
+                encode_category(models['yield']['state_codes'], 'state', data.get('state'))
+                encode_category(models['yield']['crop_codes'], 'crop', data.get('crop'))
+            if kind == 'crop':
+                features, valid_rows, valid_inputs, errors = parse_crop_rows(rows)
+                features, valid_rows, targets = parse_explain_targets(models, features, valid_rows, valid_inputs,
+                                                                      errors)
+            else:
+                features, valid_rows, errors = parse_yield_rows(rows, models['yield'])
+                targets = None
+        
+        if single and errors:
+            return jsonify({
+                'success': False,
+                'error': errors[0]
+            }), 400
+        
+        with stage('explain'):
+            explanations = explain_rows(models, kind, features, targets)
+        
+        with stage('serialize'):
+            if single:
+                return jsonify({
+                    'success': True,
+                    **explanations[0],
+                    'model_version': models['version']
+                })
+            
+            results = [None] * len(rows)
+            for row_index, error in errors.items():
+                results[row_index] = {'row': row_index, 'success': False, 'error': error}
+            for row_index, explanation in zip(valid_rows, explanations):
+                results[row_index] = {'row': row_index, 'success': True, **explanation}
+            names = CROP_FEATURES if kind == 'crop' else YIELD_FEATURES
+            response = jsonify({
+                'success': True,
+                'count': len(rows),
+                'succeeded': len(valid_rows),
+                'failed': len(errors),
+                'model_version': models['version'],
+                # Average size of each feature's contribution over the explained rows
+                'mean_abs_contributions': {
+                    name: round(float(np.mean([abs(e['contributions'][name]) for e in explanations])), 4)
+                    for name in names
+                } if explanations else {},
+                'results': results
+            })
+        return response
+        
+    except UnknownCategoryError as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'field': e.field,
+            'value': e.value
+        }), 422
+    except Exception as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/crop-plan', methods=['POST'])
+@requires_models
+def crop_plan():
+    """API endpoint choosing a crop and fertilizer rate for every plot of a farm"""
+    try:
+        with stage('parse'):
+            data = request.get_json()
+            plots = data.get('plots') if isinstance(data, dict) else None
+            if not isinstance(plots, list) or not plots:
+                raise ValueError("Expected an object with a non-empty 'plots' array")
+        if len(plots) > MAX_PLAN_PLOTS:
+            return jsonify({
+                'success': False,
+                'error': f'Too many plots: {len(plots)} (limit {MAX_PLAN_PLOTS})'
+            }), 413
+    
+        models = g.models
+        with stage('validate'):
+            soil, valid_rows, valid_inputs, errors = parse_crop_rows(plots)
+            plot_fields, plot_errors = parse_plots(valid_inputs, models['yield']['state_codes'])
+            errors.update({valid_rows[i]: error for i, error in plot_errors.items()})
+            if errors:
+                return jsonify({
+                    'success': False,
+                    'error': f'{len(errors)} invalid plot(s)',
+                    'errors': errors
+                }), 400
+            crops = data.get('crops')
+            for crop in crops or []:
+                encode_category(models['yield']['crop_codes'], 'crop', crop)
+    
+        with stage('optimize'):
+            plan = plan_farm(
+                models['crop'], models['yield'], soil, plot_fields,
+                objective=data.get('objective', 'production'),
+                prices=data.get('prices'),
+                fertilizer_budget=data.get('fertilizer_budget'),
+                fertilizer_levels=data.get('fertilizer_levels'),
+                max_crop_share=data.get('max_crop_share'),
+                min_distinct_crops=data.get('min_distinct_crops'),
+                min_suitability=data.get('min_suitability', DEFAULT_MIN_SUITABILITY),
+                crops=crops,
+                crop_mapping=data.get('crop_mapping'),
+                allow_unmatched_crops=bool(data.get('allow_unmatched_crops', False))
+            )
+    
+        with stage('serialize'):
+            response = jsonify({'success': True, 'model_version': models['version'], **plan})
+        return response
+    
+    except UnknownCategoryError as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'field': e.field,
+            'value': e.value
+        }), 422
+    except Exception as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/ready')
+def readiness():
+    """Readiness probe: 200 once models are loaded, 503 while loading or after a failure"""
+    # The first probe kicks off loading without blocking on it
+    if model_state['status'] == 'not_loaded' and not _model_lock.locked():
+        start_background_warm_up()
+    
+    ready = model_state['status'] == 'ready'
+    return jsonify({
+        'ready': ready,
+        'status': model_state['status'],
+        'error': model_state['error'],
+        'inference_backend': INFERENCE_BACKEND,
+        'import_seconds': model_state['import_seconds'],
+        'model_load_seconds': model_state['model_load_seconds'],
+        'models': serving_summary(),
+        'pid': os.getpid(),
+        'loaded_at': model_state['loaded_at'],
+        'reloads': model_state['reloads'],
+        'reload_error': model_state['reload_error']
+    }), 200 if ready else 503
+
+@app.route('/api/models/reload', methods=['POST'])
+@requires_admin_token
+def reload_models_endpoint():
+    """Swap in the models currently on disk (e.g. after incremental training) without a restart"""
+    try:
+        reload_models()
+    except ModelsUnavailable:
+        raise
+    except Exception as e:
+        record_error(e)
+        return jsonify({
+            'success': False,
+            'error': f'Reload failed, still serving the previous models: {e}',
+            'models': serving_summary()
+        }), 500
+    
+    return jsonify({
+        'success': True,
+        'models': serving_summary(),
+        'loaded_at': model_state['loaded_at'],
+        'model_load_seconds': model_state['model_load_seconds'],
+        'reloads': model_state['reloads']
+    })
+
+@app.route('/api/observations/<kind>', methods=['POST'])
+@requires_admin_token
+def add_observations(kind):
+    """Append labeled field observations (JSON rows or CSV) to the columnar store for retraining"""
+    try:
+        # pandas and pyarrow are only needed here, so they are not imported at startup
+        from observation_store import append_observations, count_observations
+        
+        with stage('parse'):
+            rows = read_batch_rows()
+        if len(rows) > MAX_BATCH_ROWS:
+            return jsonify({
+                'success': False,
+                'error': f'Batch too large: {len(rows)} rows (limit {MAX_BATCH_ROWS})'
+            }), 413
+        
+        with stage('store'):
+            stored, errors, _ = append_observations(kind, rows)
+        return jsonify({
+            'success': True,
+            'count': len(rows),
+            'stored': stored,
+            'failed': len(errors),
+            'errors': [{'row': row_index, 'error': error} for row_index, error in sorted(errors.items())],
+            'total_observations': count_observations(kind)
         })
         
     except Exception as e:
+        record_error(e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 400
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of request, stage, error, batch and cache metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache-stats')
+def cache_stats():
+    """Prediction cache hit/miss/eviction counters"""
+    return jsonify(prediction_cache.stats())
+
+@app.route('/api/weather-stats')
+def weather_stats():
+    """Weather provider call, coalescing and cache counters"""
+    return jsonify(weather_client.stats())
+
 @app.route('/api/weather', methods=['POST'])
 def get_weather():
     """API endpoint for weather information and advisory"""
@@ -184,23 +1143,77 @@ def get_weather():
         data = request.get_json()
         city = data.get('city', 'Mumbai')
         
-        # Try to fetch real weather data
-        weather_data = fetch_weather_data(city)
-        
-        if not weather_data:
-            # Use mock data if API fails
-            weather_data = get_mock_weather_data(city)
+        with stage('weather'):
+            weather_data, advisory, source = weather_advisory_for_city(city)
         
-        # Generate advisory based on weather
-        advisory = generate_weather_advisory(weather_data)
+        with stage('serialize'):
+            response = jsonify({
+                'success': True,
+                'weather': weather_data,
+                'advisory': advisory,
+                'source': source
+            })
+        return response
         
+    except Exception as e:
+        record_error(e)
         return jsonify({
-            'success': True,
-            'weather': weather_data,
-            'advisory': advisory
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/weather/batch', methods=['POST'])
+def get_weather_batch():
+    """API endpoint for weather advisories for many cities at once
+    
+    Cities are fetched concurrently. A city whose provider fetch fails is
+    reported with its error rather than mock data, and anything not finished
+    by the deadline is reported as timed out while the rest are returned.
+    """
+    try:
+        data = request.get_json()
+        cities = data.get('cities') if isinstance(data, dict) else data
+        if not isinstance(cities, list) or not cities:
+            raise ValueError("Expected a non-empty 'cities' list")
+        if len(cities) > MAX_WEATHER_CITIES:
+            return jsonify({
+                'success': False,
+                'error': f'Too many cities: {len(cities)} (limit {MAX_WEATHER_CITIES})'
+            }), 413
+        deadline = min(float(data.get('timeout', WEATHER_BATCH_DEADLINE)), WEATHER_BATCH_DEADLINE) \
+            if isinstance(data, dict) else WEATHER_BATCH_DEADLINE
+        
+        pool = get_weather_pool()
+        with stage('weather'):
+            futures = [pool.submit(weather_advisory_for_city, str(city), fallback=False) for city in cities]
+            wait(futures, timeout=deadline)
+        
+        results = []
+        for city, future in zip(cities, futures):
+            if not future.done():
+                # Free the pool slot if the fetch has not started yet
+                future.cancel()
+                results.append({'city': city, 'success': False, 'error': 'Timed out'})
+            elif future.exception() is not None:
+                results.append({'city': city, 'success': False, 'error': str(future.exception())})
+            else:
+                weather_data, advisory, source = future.result()
+                results.append({'city': city, 'success': True, 'weather': weather_data, 'advisory': advisory,
+                                'source': source})
+        
+        succeeded = sum(1 for result in results if result['success'])
+        with stage('serialize'):
+            response = jsonify({
+                'success': True,
+                'count': len(results),
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded,
+                'results': results
+            })
+        return response
         
     except Exception as e:
+        record_error(e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -208,190 +1221,479 @@ def get_weather():
 
 # ==================== HELPER FUNCTIONS ====================
 
-def fetch_weather_data(city):
-    """Fetch real weather data from OpenWeather API"""
-    try:
-        # Note: In production, use a real API key
-        # For demo purposes, we'll use mock data
+def serving_summary():
+    """Versions in service, for /api/ready and the reload endpoint"""
+    state = serving
+    if state is None:
         return None
-    except:
+    return {
+        'version': state['primary']['version'],
+        'content': state['primary']['content'],
+        'yield_surface': state['primary']['surface'] is not None,
+        'yield_surface_error': (state['primary']['surface'].error
+                                if state['primary']['surface'] is not None else None),
+        'crop_serving': CROP_SERVING_MODE,
+        'crop_lookup_error': (state['primary']['lookup'].manifest['quantization_error']
+                              if state['primary']['lookup'] is not None else None),
+        'candidate': state['candidate']['version'] if state['candidate'] is not None else None,
+        'candidate_mode': state['mode'],
+        'candidate_fraction': state['fraction']
+    }
+
+def top_crop_recommendations(probabilities, classes, indices=None):
+    """Build the top-3 crop list from one row of class probabilities"""
+    if indices is None:
+        indices = np.argsort(probabilities)[-3:][::-1]
+    
+    recommendations = []
+    for idx in indices:
+        recommendations.append({
+            'crop': classes[idx],
+            'confidence': round(float(probabilities[idx] * 100), 2)
+        })
+    return recommendations
+
+def crop_probabilities(models, values):
+    """Class probabilities for one row of crop features, served from the cache when possible
+    
+    With caching enabled the model runs on the rounded inputs, so every
+    request that shares a cache key gets exactly the same answer.
+    """
+    if not prediction_cache.enabled:
+        return predict_crop_row(models, [float(v) for v in values])
+    
+    values = quantize(CROP_FEATURES, values, CACHE_ROUNDING)
+    key = make_key(f"crop@{models['content']['crop']}", CROP_FEATURES, values)
+    probabilities = prediction_cache.get_or_compute(key, lambda: predict_crop_row(models, values).tolist())
+    return np.asarray(probabilities)
+
+def lookup_crop_recommendations(models, values):
+    """Top-3 crops from the lookup table, or None when it is off, the row is
+    outside its grid or the row's cell is not stable
+    """
+    table = models['lookup']
+    if table is None:
+        return None
+    index = table.cell(values)
+    if index is None:
+        CROP_LOOKUPS.inc(outcome='outside')
+        return None
+    if not table.stable[index]:
+        CROP_LOOKUPS.inc(outcome='unstable')
         return None
+    CROP_LOOKUPS.inc(outcome='hit')
+    return table.recommendations(index)
+
+def explanation_forest(models, kind):
+    """The flat forest behind a loaded model; sklearn models are compiled once per loaded version"""
+    model = models['crop'] if kind == 'crop' else models['yield']['model']
+    if isinstance(model, TimedModel):
+        model = model.wrapped
+    if isinstance(model, FlatForest):
+        return model
+    compiled = models['explainers']
+    if kind not in compiled:
+        compiled[kind] = compile_forest(model)
+    return compiled[kind]
+
+def explain_rows(models, kind, features, targets=None):
+    """Per-feature contributions for rows of model inputs, served from the cache when possible
+    
+    Crop explanations are for the class index in ``targets`` (-1, or no
+    targets, for the recommended crop) and are in percentage points of
+    confidence; yield explanations are in tons/ha. Rows missing from the
+    cache are decomposed together in one batched pass.
+    """
+    names = CROP_FEATURES if kind == 'crop' else YIELD_FEATURES
+    if targets is None:
+        targets = np.full(len(features), -1, dtype=np.intp)
+    explanations = [None] * len(features)
+    if prediction_cache.enabled:
+        # Explained on the rounded inputs, like cached predictions
+        features = np.array([quantize(names, row, CACHE_ROUNDING) for row in features.tolist()],
+                            dtype=np.float64).reshape(features.shape)
+        namespace = f"explain-{kind}@{models['content'][kind]}"
+        keys = [make_key(namespace, names + ['target'], row + [target])
+                for row, target in zip(features.tolist(), targets.tolist())]
+        for i, key in enumerate(keys):
+            cached = prediction_cache.get(key)
+            if cached is not MISSING:
+                explanations[i] = cached
+    
+    missing = [i for i, explanation in enumerate(explanations) if explanation is None]
+    if missing:
+        forest = explanation_forest(models, kind)
+        rows = features[missing]
+        outputs = targets[missing]
+        if (outputs >= 0).any():
+            # Recommended crops fill in where no crop was asked for
+            outputs = np.where(outputs >= 0, outputs, np.argmax(forest.predict_proba(rows), axis=1))
+        else:
+            outputs = None
+        values, outputs, bias, contributions = forest.contributions(rows, outputs)
+        for j, i in enumerate(missing):
+            if kind == 'crop':
+                explanation = {
+                    'crop': str(forest.classes_[outputs[j]]),
+                    'confidence': round(float(values[j, outputs[j]] * 100), 2),
+                    'recommended_crop': str(forest.classes_[np.argmax(values[j])]),
+                    'base_value': round(float(bias[j] * 100), 2),
+                    'contributions': {name: round(float(c * 100), 2) for name, c in zip(names, contributions[j])}
+                }
+            else:
+                explanation = {
+                    'predicted_yield': round(float(values[j, 0]), 3),
+                    'base_value': round(float(bias[j]), 3),
+                    'contributions': {name: round(float(c), 3) for name, c in zip(names, contributions[j])}
+                }
+            # Features by how much they moved the prediction, largest first
+            explanation['ranking'] = [names[k] for k in np.argsort(-np.abs(contributions[j]), kind='stable')]
+            explanations[i] = explanation
+            if prediction_cache.enabled:
+                prediction_cache.set(keys[i], explanation)
+    return explanations
+
+def predict_crop_row(models, values):
+    """Class probabilities for one row, sharing a model call with concurrent requests when micro-batching"""
+    if models['batchers'] is not None:
+        return models['batchers']['crop'].submit(values)
+    return models['crop'].predict_proba(np.array([values], dtype=np.float64))[0]
+
+def yield_prediction(models, state_encoded, crop_encoded, numeric_values):
+    """Predicted yield for one encoded row, served from the cache when possible"""
+    if not prediction_cache.enabled:
+        values = [float(v) for v in numeric_values]
+    else:
+        values = quantize(YIELD_NUMERIC_FIELDS, numeric_values, CACHE_ROUNDING)
+    
+    def compute():
+        row = [state_encoded, crop_encoded] + values
+        if models['batchers'] is not None:
+            return float(models['batchers']['yield'].submit(row))
+        return float(models['yield']['model'].predict(np.array([row]))[0])
+    
+    if not prediction_cache.enabled:
+        return compute()
+    
+    key = make_key(f"yield@{models['content']['yield']}", ['state', 'crop'] + YIELD_NUMERIC_FIELDS,
+                   [state_encoded, crop_encoded] + values)
+    return prediction_cache.get_or_compute(key, compute)
+
+def shadow_candidate():
+    """The shadow candidate to compare this request against, if any
+    
+    Only requests answered by the current version are shadowed.
+    """
+    state = g.get('serving')
+    if state is None or state['mode'] != 'shadow' or g.get('models') is not state['primary']:
+        return None
+    return state['candidate']
+
+def run_shadow(model, compare):
+    """Run a comparison on the shadow thread without holding up the response
+    
+    Comparisons beyond SHADOW_MAX_PENDING are dropped (and counted) so a
+    slow candidate cannot build an unbounded backlog.
+    """
+    if not _shadow_slots.acquire(blocking=False):
+        SHADOW_COMPARISONS.inc(model=model, outcome='dropped')
+        return
+    
+    def run():
+        try:
+            compare()
+        except Exception:
+            SHADOW_COMPARISONS.inc(model=model, outcome='error')
+        finally:
+            _shadow_slots.release()
+    
+    _shadow_pool.submit(run)
+
+def shadow_crop(features, predictions):
+    """Compare the served crop recommendations with the shadow candidate's"""
+    candidate = shadow_candidate()
+    if candidate is None:
+        return
+    
+    def compare():
+        # The unwrapped model, so shadow work stays out of the request metrics
+        model = candidate['crop'].wrapped
+        shadow = model.classes_[np.argmax(model.predict_proba(features), axis=1)]
+        agree = int(np.sum(shadow == np.asarray(predictions)))
+        SHADOW_COMPARISONS.inc(agree, model='crop', outcome='agree')
+        SHADOW_COMPARISONS.inc(len(shadow) - agree, model='crop', outcome='disagree')
+    
+    run_shadow('crop', compare)
+
+def shadow_yield(states, crops, numeric, predictions):
+    """Compare served yield predictions with the shadow candidate's
+    
+    States and crops are passed as labels because the candidate's encoders
+    may number them differently.
+    """
+    candidate = shadow_candidate()
+    if candidate is None:
+        return
+    
+    def compare():
+        data = candidate['yield']
+        codes = np.array([[encode_category(data['state_codes'], 'state', state),
+                           encode_category(data['crop_codes'], 'crop', crop)]
+                          for state, crop in zip(states, crops)], dtype=np.float64)
+        shadow = data['model'].wrapped.predict(np.hstack([codes, numeric]))
+        differences = np.abs(shadow - np.asarray(predictions, dtype=np.float64))
+        for difference in differences.tolist():
+            SHADOW_YIELD_DIFFERENCE.observe(difference)
+        agree = int(np.sum(differences <= SHADOW_YIELD_TOLERANCE))
+        SHADOW_COMPARISONS.inc(agree, model='yield', outcome='agree')
+        SHADOW_COMPARISONS.inc(len(differences) - agree, model='yield', outcome='disagree')
+    
+    run_shadow('yield', compare)
+
+def read_batch_rows():
+    """Read batch input rows from a JSON array, a CSV body or an uploaded CSV file"""
+    if 'file' in request.files:
+        text = request.files['file'].read().decode('utf-8-sig')
+        return list(csv.DictReader(io.StringIO(text)))
+    
+    if request.mimetype in ('text/csv', 'application/csv'):
+        text = request.get_data(as_text=True)
+        return list(csv.DictReader(io.StringIO(text)))
+    
+    data = request.get_json()
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of rows, an object with a 'rows' array, or CSV")
+    return data
+
+def parse_numeric_fields(data, names):
+    """The named fields of a single-row request as floats
+    
+    Raises KeyError for a missing field and ValueError for a value that is not
+    a finite number, as the batch parsers reject such rows.
+    """
+    values = []
+    for name in names:
+        value = float(data[name])
+        if not np.isfinite(value):
+            raise ValueError(f"Invalid value for '{name}': {data[name]!r}")
+        values.append(value)
+    return values
+
+def parse_crop_rows(rows):
+    """Validate crop feature rows and build the feature matrix
+    
+    Returns the matrix of valid rows, their input positions, the normalized
+    input dicts, and a dict of per-row error messages keyed by input position.
+    """
+    features = np.empty((len(rows), len(CROP_FEATURES)), dtype=np.float64)
+    valid_rows = []
+    valid_inputs = []
+    errors = {}
+    
+    for row_index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[row_index] = 'Row must be an object with named fields'
+            continue
+        
+        # Accept both API field names and dataset column names (N, P, K, ...)
+        normalized = {}
+        for key, value in row.items():
+            key = str(key).strip().lower()
+            normalized[CROP_FEATURE_ALIASES.get(key, key)] = value
+        
+        values = []
+        for name in CROP_FEATURES:
+            if normalized.get(name) in (None, ''):
+                errors[row_index] = f"Missing field '{name}'"
+                break
+            try:
+                value = float(normalized[name])
+            except (TypeError, ValueError):
+                errors[row_index] = f"Invalid value for '{name}': {normalized[name]!r}"
+                break
+            if not np.isfinite(value):
+                errors[row_index] = f"Invalid value for '{name}': {normalized[name]!r}"
+                break
+            values.append(value)
+        else:
+            features[len(valid_rows)] = values
+            valid_rows.append(row_index)
+            valid_inputs.append(normalized)
+    
+    return features[:len(valid_rows)], valid_rows, valid_inputs, errors
+
+def parse_explain_targets(models, features, valid_rows, valid_inputs, errors):
+    """Class indices of the crops to explain (-1: the recommended crop), from each row's optional 'crop'
+    
+    Rows naming an unknown crop move to ``errors``.
+    """
+    class_index = {str(crop): i for i, crop in enumerate(models['crop'].classes_)}
+    keep, targets = [], []
+    for position, (row_index, normalized) in enumerate(zip(valid_rows, valid_inputs)):
+        crop = normalized.get('crop')
+        if crop in (None, ''):
+            targets.append(-1)
+        elif str(crop).strip().lower() in class_index:
+            targets.append(class_index[str(crop).strip().lower()])
+        else:
+            errors[row_index] = f"Unknown crop '{crop}'"
+            continue
+        keep.append(position)
+    return features[keep], [valid_rows[i] for i in keep], np.array(targets, dtype=np.intp)
+
+def parse_yield_rows(rows, yield_data):
+    """Validate yield input rows and build the encoded feature matrix
+    
+    Returns the matrix of valid rows, their input positions and a dict of
+    per-row error messages keyed by input position.
+    """
+    features = np.empty((len(rows), len(YIELD_FEATURES)), dtype=np.float64)
+    valid_rows = []
+    errors = {}
+    
+    for row_index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[row_index] = 'Row must be an object with named fields'
+            continue
+        normalized = {str(key).strip().lower(): value for key, value in row.items()}
+        try:
+            values = [encode_category(yield_data['state_codes'], 'state', normalized.get('state')),
+                      encode_category(yield_data['crop_codes'], 'crop', normalized.get('crop'))]
+        except UnknownCategoryError as e:
+            errors[row_index] = str(e)
+            continue
+        for name in YIELD_NUMERIC_FIELDS:
+            if normalized.get(name) in (None, ''):
+                errors[row_index] = f"Missing field '{name}'"
+                break
+            try:
+                value = float(normalized[name])
+            except (TypeError, ValueError):
+                value = np.nan
+            if not np.isfinite(value):
+                errors[row_index] = f"Invalid value for '{name}': {normalized[name]!r}"
+                break
+            values.append(value)
+        else:
+            features[len(valid_rows)] = values
+            valid_rows.append(row_index)
+    
+    return features[:len(valid_rows)], valid_rows, errors
+
+def fetch_weather_data(city):
+    """Fetch real weather data from OpenWeather API; None in demo mode
+    
+    Raises WeatherProviderError when the provider fails or times out.
+    """
+    if WEATHER_API_KEY == 'demo':
+        return None
+    return weather_client.fetch(city)
+
+def weather_advisory_for_city(city, fallback=True):
+    """Weather for one city, its advisory and the weather's source ('live' or 'mock')
+    
+    In demo mode the weather is mock data. Otherwise a failed provider fetch
+    falls back to mock data, or raises WeatherProviderError without `fallback`.
+    """
+    try:
+        weather_data = fetch_weather_data(city)
+    except WeatherProviderError as e:
+        if not fallback:
+            raise
+        print(f"Warning: {e}")
+        weather_data = None
+    
+    source = 'live'
+    if not weather_data:
+        weather_data = get_mock_weather_data(city)
+        source = 'mock'
+    
+    # Generate advisory based on weather
+    return weather_data, generate_weather_advisory(weather_data), source
+
+def get_weather_pool():
+    """Thread pool that bounds concurrent weather fetches across all requests"""
+    global _weather_pool
+    if _weather_pool is None:
+        with _weather_pool_lock:
+            if _weather_pool is None:
+                _weather_pool = ThreadPoolExecutor(
+                    max_workers=WEATHER_MAX_CONCURRENCY,
+                    thread_name_prefix='weather'
+                )
+    return _weather_pool
 
 def get_mock_weather_data(city):
-    """Generate mock weather data for demo purposes"""
+    """Generate mock weather data for demo purposes
+    
+    Values are seeded from the city name, so the same city always gets the
+    same weather and advisory.
+    """
     import random
     
+    rng = random.Random(zlib.crc32(city.strip().lower().encode('utf-8')))
     mock_data = {
         'city': city,
-        'temperature': round(25 + random.uniform(-5, 10), 1),
-        'humidity': round(60 + random.uniform(-20, 30), 1),
-        'rainfall': round(random.uniform(0, 50), 1),
-        'wind_speed': round(random.uniform(5, 20), 1),
-        'description': random.choice(['Clear sky', 'Partly cloudy', 'Cloudy', 'Light rain', 'Sunny']),
+        'temperature': round(25 + rng.uniform(-5, 10), 1),
+        'humidity': round(60 + rng.uniform(-20, 30), 1),
+        'rainfall': round(rng.uniform(0, 50), 1),
+        'wind_speed': round(rng.uniform(5, 20), 1),
+        'description': rng.choice(['Clear sky', 'Partly cloudy', 'Cloudy', 'Light rain', 'Sunny']),
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     }
     return mock_data
 
 def generate_crop_advice(input_data, recommended_crop):
     """Generate agricultural advice based on inputs"""
-    advice = []
-    
-    # pH advice
-    ph = float(input_data['ph'])
-    if ph < 5.5:
-        advice.append("⚠️ Soil is too acidic. Consider adding lime to raise pH.")
-    elif ph > 8.0:
-        advice.append("⚠️ Soil is too alkaline. Consider adding sulfur to lower pH.")
-    else:
-        advice.append("✓ Soil pH is optimal for most crops.")
-    
-    # NPK advice
-    n = float(input_data['nitrogen'])
-    p = float(input_data['phosphorus'])
-    k = float(input_data['potassium'])
-    
-    if n < 50:
-        advice.append("🌱 Low nitrogen levels. Consider adding urea or composted manure.")
-    if p < 30:
-        advice.append("🌱 Low phosphorus levels. Consider adding bone meal or rock phosphate.")
-    if k < 30:
-        advice.append("🌱 Low potassium levels. Consider adding potash or wood ash.")
-    
-    # Temperature advice
-    temp = float(input_data['temperature'])
-    if temp < 15:
-        advice.append("❄️ Temperature is low. Consider cold-resistant crops or greenhouse farming.")
-    elif temp > 35:
-        advice.append("☀️ Temperature is high. Ensure adequate irrigation and mulching.")
-    
-    # Rainfall advice
-    rainfall = float(input_data['rainfall'])
-    if rainfall < 100:
-        advice.append("💧 Low rainfall area. Ensure proper irrigation system is in place.")
-    elif rainfall > 300:
-        advice.append("🌧️ High rainfall area. Ensure proper drainage to prevent waterlogging.")
-    
-    # Crop-specific advice
-    advice.append(f"🌾 {recommended_crop.capitalize()} is well-suited for your soil and climate conditions.")
-    
-    return advice
+    return advice_rules.evaluate('crop', input_data, {'crop_name': recommended_crop.capitalize()})
+
+def generate_crop_advice_batch(rows, recommended_crops):
+    """Crop advice for many rows (dicts or a DataFrame) in one pass over the rule table"""
+    capitalized = {crop: str(crop).capitalize() for crop in set(recommended_crops)}
+    crop_names = np.array([capitalized[crop] for crop in recommended_crops], dtype=object)
+    return advice_rules.evaluate_batch('crop', rows, {'crop_name': crop_names})
 
 def generate_yield_advice(input_data, predicted_yield):
     """Generate advice for yield improvement"""
-    advice = []
-    
-    crop = input_data['crop']
-    rainfall = float(input_data['rainfall'])
-    fertilizer = float(input_data['fertilizer'])
-    
-    # General advice
-    advice.append(f"📊 Expected yield: {predicted_yield:.2f} tons per hectare")
-    
-    # Fertilizer advice
-    if fertilizer < 100:
-        advice.append("🌱 Consider increasing fertilizer application for better yield.")
-    elif fertilizer > 200:
-        advice.append("⚠️ High fertilizer use. Ensure it's balanced to avoid soil degradation.")
-    else:
-        advice.append("✓ Fertilizer application is within optimal range.")
-    
-    # Rainfall advice
-    if rainfall < 600:
-        advice.append("💧 Supplement with irrigation during dry periods.")
-    elif rainfall > 1500:
-        advice.append("🌧️ Ensure proper drainage systems to prevent crop damage.")
-    
-    # Yield improvement tips
-    advice.append("💡 Tips for better yield:")
-    advice.append("  • Use quality seeds from certified sources")
-    advice.append("  • Implement crop rotation practices")
-    advice.append("  • Monitor and control pests regularly")
-    advice.append("  • Maintain optimal soil moisture levels")
-    
-    return advice
+    return advice_rules.evaluate('yield', input_data, {'predicted_yield': predicted_yield})
+
+def generate_yield_advice_batch(rows, predicted_yields):
+    """Yield advice for many rows (dicts or a DataFrame) in one pass over the rule table"""
+    return advice_rules.evaluate_batch('yield', rows, {'predicted_yield': np.asarray(predicted_yields)})
 
 def generate_weather_advisory(weather_data):
     """Generate weather-based agricultural advisory"""
-    advisory = []
-    
-    temp = weather_data['temperature']
-    humidity = weather_data['humidity']
-    rainfall = weather_data['rainfall']
-    
-    # Temperature advisory
-    if temp > 35:
-        advisory.append({
-            'type': 'warning',
-            'title': 'High Temperature Alert',
-            'message': 'Extreme heat detected. Increase irrigation frequency and provide shade for sensitive crops.'
-        })
-    elif temp < 10:
-        advisory.append({
-            'type': 'warning',
-            'title': 'Low Temperature Alert',
-            'message': 'Cold weather detected. Protect crops from frost damage using covers or mulching.'
-        })
-    else:
-        advisory.append({
-            'type': 'success',
-            'title': 'Optimal Temperature',
-            'message': 'Temperature conditions are favorable for crop growth.'
-        })
-    
-    # Humidity advisory
-    if humidity > 85:
-        advisory.append({
-            'type': 'warning',
-            'title': 'High Humidity',
-            'message': 'High humidity may promote fungal diseases. Monitor crops closely and apply fungicides if needed.'
-        })
-    elif humidity < 40:
-        advisory.append({
-            'type': 'info',
-            'title': 'Low Humidity',
-            'message': 'Dry conditions. Ensure adequate irrigation to prevent crop stress.'
-        })
-    
-    # Rainfall advisory
-    if rainfall > 20:
-        advisory.append({
-            'type': 'info',
-            'title': 'Rainfall Detected',
-            'message': f'Recent rainfall: {rainfall}mm. Postpone irrigation and check drainage systems.'
-        })
-    elif rainfall == 0:
-        advisory.append({
-            'type': 'info',
-            'title': 'No Rainfall',
-            'message': 'No recent rainfall. Maintain regular irrigation schedule.'
-        })
-    
-    # General farming advisory
-    advisory.append({
-        'type': 'success',
-        'title': 'Today\'s Farming Activities',
-        'message': get_daily_farming_activity(weather_data)
-    })
-    
-    return advisory
+    return advice_rules.evaluate('weather', weather_data, {'activity': get_daily_farming_activity(weather_data)})
+
+def generate_weather_advisory_batch(weather_rows):
+    """Weather advisories for many weather dicts in one pass over the rule table"""
+    activities = np.array([advice[0] for advice in advice_rules.evaluate_batch('activity', weather_rows)], dtype=object)
+    return advice_rules.evaluate_batch('weather', weather_rows, {'activity': activities})
 
 def get_daily_farming_activity(weather_data):
     """Suggest daily farming activities based on weather"""
-    temp = weather_data['temperature']
-    rainfall = weather_data['rainfall']
-    
-    if rainfall > 20:
-        return "Avoid field operations. Good day for indoor tasks and equipment maintenance."
-    elif temp > 35:
-        return "Schedule outdoor work for early morning or late evening. Focus on irrigation maintenance."
-    elif temp < 15:
-        return "Good conditions for harvesting. Check for frost-sensitive crops."
-    else:
-        return "Ideal conditions for field operations. Good day for planting, weeding, or applying fertilizers."
+    return advice_rules.evaluate('activity', weather_data)[0]
+
+model_state['import_seconds'] = round(time.perf_counter() - _import_started, 4)
+
+if WARMUP_ON_IMPORT:
+    start_background_warm_up()
 
 # ==================== RUN APPLICATION ====================
 
 if __name__ == '__main__':
+    print(f"App imported in {model_state['import_seconds'] * 1000:.1f} ms")
+    # Installed here rather than on import, so tools and tests that import the
+    # app keep their own SIGHUP handling; serve.py installs its own handler
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, handle_reload_signal)
+    try:
+        warm_up()
+    except ModelsUnavailable:
+        sys.exit(1)
+    
     print("\n" + "="*60)
     print("SMART AGRICULTURE DECISION SUPPORT SYSTEM")
     print("="*60)
@@ -0,0 +1,230 @@
+"""
+Benchmark Suite
+Times the prediction and advisory hot paths: Flask endpoints end to end, bare
+model calls, advice generation and model loading, for batch sizes from 1 row
+up to 100k rows
+
+Usage:
+    python benchmark.py -o bench.json                        # run and save results
+    python benchmark.py --sizes 1,100 --compare bench.json   # flag regressions against a saved run
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+# Measure the models, not the prediction cache
+os.environ.setdefault('AGRI_CACHE_SIZE', '0')
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import app as agri_app
+
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000, 100000]
+# Time budget per case; repeats are reduced for large batches to stay within it
+TARGET_SECONDS = 2.0
+MIN_REPEATS = 3
+MAX_REPEATS = 200
+DEFAULT_THRESHOLD = 0.15
+# Slowdowns smaller than this are timer noise, whatever the relative change
+DEFAULT_MIN_DELTA_MS = 0.05
+
+def percentile_summary(samples, rows):
+    """Latency percentiles in milliseconds and rows/second throughput"""
+    samples = np.asarray(samples)
+    return {
+        'rows': rows,
+        'repeats': len(samples),
+        'p50_ms': round(float(np.percentile(samples, 50)) * 1000, 4),
+        'p95_ms': round(float(np.percentile(samples, 95)) * 1000, 4),
+        'p99_ms': round(float(np.percentile(samples, 99)) * 1000, 4),
+        'mean_ms': round(float(samples.mean()) * 1000, 4),
+        'rows_per_sec': round(rows / float(samples.mean()), 1) if samples.mean() > 0 else None
+    }
+
+def time_case(func, rows, max_seconds=TARGET_SECONDS):
+    """Run func repeatedly (after one warm-up call) and summarize the timings"""
+    started = time.perf_counter()
+    func()
+    first = time.perf_counter() - started
+
+    repeats = int(min(MAX_REPEATS, max(MIN_REPEATS, max_seconds / max(first, 1e-6))))
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return percentile_summary(samples, rows)
+
+def crop_inputs(n, rng):
+    """n crop-feature rows sampled from the dataset with a little noise"""
+    import pandas as pd
+
+    df = pd.read_csv(os.path.join(BASE_DIR, 'datasets', 'crop_recommendation.csv'))
+    base = df[['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']].to_numpy(np.float64)
+    rows = base[rng.integers(0, len(base), n)]
+    return np.round(rows * rng.uniform(0.97, 1.03, rows.shape), 2)
+
+def yield_inputs(n, rng):
+    """n yield rows (as the dataset's columns) sampled with a little noise"""
+    import pandas as pd
+
+    df = pd.read_csv(os.path.join(BASE_DIR, 'datasets', 'crop_yield.csv'))
+    df = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+    for column in ['Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']:
+        df[column] = np.round(df[column] * rng.uniform(0.97, 1.03, n), 2)
+    return df[['State', 'Crop', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']]
+
+def crop_payload(row):
+    return dict(zip(agri_app.CROP_FEATURES, (float(v) for v in row)))
+
+def yield_payload(row):
+    return {
+        'state': row.State, 'crop': row.Crop, 'area': float(row.Area),
+        'rainfall': float(row.Annual_Rainfall), 'fertilizer': float(row.Fertilizer),
+        'pesticide': float(row.Pesticide)
+    }
+
+def encode_yield(df):
+    data = agri_app.serving['primary']['yield']
+    return np.column_stack([
+        [data['state_codes'][s] for s in df['State']],
+        [data['crop_codes'][c] for c in df['Crop']],
+        df[['Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']].to_numpy(np.float64)
+    ])
+
+def run_benchmarks(sizes, seed=42):
+    """Run every case and return the results dictionary"""
+    rng = np.random.default_rng(seed)
+    agri_app.ensure_models_loaded()
+    client = agri_app.app.test_client()
+    results = {}
+
+    def record(name, summary):
+        results[name] = summary
+        print(f"  {name:<40} p50 {summary['p50_ms']:>10.3f} ms   p99 {summary['p99_ms']:>10.3f} ms   "
+              f"{summary['rows_per_sec'] or 0:>12.1f} rows/s")
+
+    def load_quietly():
+        with contextlib.redirect_stdout(io.StringIO()):
+            agri_app.load_models()
+
+    print("\nModel load")
+    record('model_load', time_case(load_quietly, 1))
+
+    largest = max(sizes)
+    crop_X = crop_inputs(largest, rng)
+    yield_df = yield_inputs(largest, rng)
+    yield_X = encode_yield(yield_df)
+    weather = [agri_app.get_mock_weather_data(f'City{i}') for i in range(min(largest, 1000))]
+
+    for n in sizes:
+        print(f"\nBatch size {n}")
+        crop_rows = crop_X[:n]
+        yield_rows = yield_X[:n]
+
+        record(f'model.crop_predict_proba[{n}]', time_case(lambda: agri_app.serving['primary']['crop'].predict_proba(crop_rows), n))
+        record(f'model.yield_predict[{n}]', time_case(lambda: agri_app.serving['primary']['yield']['model'].predict(yield_rows), n))
+
+        crop_dicts = [crop_payload(row) for row in crop_rows]
+        yield_dicts = [yield_payload(row) for row in yield_df.iloc[:n].itertuples()]
+        weather_rows = [weather[i % len(weather)] for i in range(n)]
+
+        record(f'advice.crop[{n}]', time_case(
+            lambda: [agri_app.generate_crop_advice(d, 'rice') for d in crop_dicts], n))
+        record(f'advice.yield[{n}]', time_case(
+            lambda: [agri_app.generate_yield_advice(d, 3.0) for d in yield_dicts], n))
+        record(f'advice.weather[{n}]', time_case(
+            lambda: [agri_app.generate_weather_advisory(w) for w in weather_rows], n))
+        crop_labels = ['rice'] * n
+        yield_values = np.full(n, 3.0)
+        record(f'advice.crop_batch[{n}]', time_case(
+            lambda: agri_app.generate_crop_advice_batch(crop_dicts, crop_labels), n))
+        record(f'advice.yield_batch[{n}]', time_case(
+            lambda: agri_app.generate_yield_advice_batch(yield_dicts, yield_values), n))
+        record(f'advice.weather_batch[{n}]', time_case(
+            lambda: agri_app.generate_weather_advisory_batch(weather_rows), n))
+
+        if n == 1:
+            record('api.recommend_crop[1]', time_case(
+                lambda: client.post('/api/recommend-crop', json=crop_dicts[0]), 1))
+            record('api.predict_yield[1]', time_case(
+                lambda: client.post('/api/predict-yield', json=yield_dicts[0]), 1))
+        else:
+            record(f'api.recommend_crop_batch[{n}]', time_case(
+                lambda: client.post('/api/recommend-crop/batch', json=crop_dicts), n))
+            csv_body = yield_df.iloc[:n].to_csv(index=False)
+            record(f'api.predict_yield_bulk[{n}]', time_case(
+                lambda: client.post('/api/predict-yield/bulk', data=csv_body, content_type='text/csv').get_data(), n))
+
+    return results
+
+def environment_info():
+    """Details needed to judge whether two runs are comparable"""
+    return {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'inference_backend': agri_app.INFERENCE_BACKEND
+    }
+
+def compare(current, baseline, threshold, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    """Print p50 changes against a baseline, return the names of regressed cases"""
+    regressions = []
+    print(f"\n{'case':<40} {'baseline p50':>14} {'current p50':>14} {'change':>9}")
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['p50_ms'], result['p50_ms']
+        change = (after - before) / before if before > 0 else 0.0
+        flag = ''
+        if change > threshold and after - before > min_delta_ms:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<40} {before:>11.3f} ms {after:>11.3f} ms {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark the prediction and advisory hot paths')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='Comma-separated batch sizes (default: %(default)s)')
+    parser.add_argument('-o', '--output', help='Write results JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='Results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative p50 slowdown that counts as a regression (default: %(default)s)')
+    parser.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help='Ignore p50 slowdowns smaller than this many ms (default: %(default)s)')
+    args = parser.parse_args()
+
+    sizes = sorted({int(s) for s in args.sizes.split(',') if s.strip()})
+    report = {'environment': environment_info(), 'results': run_benchmarks(sizes)}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report['results'], baseline['results'], args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            return 1
+        print("\nNo regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""
+Whole-Farm Crop Planner
+Chooses a crop and a fertilizer rate for every plot of a farm so the total
+expected production (or revenue) is as high as possible, subject to a total
+fertilizer budget and crop-diversity limits
+
+Every (plot, crop, fertilizer rate) option is scored with one yield-model
+call over all of them. Soil suitability comes from one recommendation-model
+call over the plots. The choice is then made on the resulting arrays:
+    1. a Lagrange multiplier on fertilizer is bisected so each plot's best
+       option (value - multiplier x fertilizer) fits the budget
+    2. crops over their area share are moved, and missing crops brought in,
+       at the smallest loss
+    3. leftover budget is spent on the upgrades with the best gain per kg
+"""
+
+import re
+
+import numpy as np
+
+OBJECTIVES = ('production', 'revenue')
+# Fertilizer rates tried per plot and crop (kg/ha), covering the training data's range
+DEFAULT_FERTILIZER_LEVELS = [70, 100, 130, 160, 190]
+# Crops the recommendation model gives less than this probability are ruled out
+DEFAULT_MIN_SUITABILITY = 0.05
+# Used for plots that do not give a pesticide rate (training-data median, kg/ha)
+DEFAULT_PESTICIDE = 15.0
+MAX_PLAN_PLOTS = 1000
+MAX_PLAN_OPTIONS = 500000
+BISECTION_STEPS = 60
+
+class PlanError(ValueError):
+    """Raised for plans that cannot be evaluated (bad settings, unknown crops)"""
+
+def _crop_key(name):
+    """Comparable crop name: 'Pigeon Pea' and 'pigeonpeas' both give 'pigeonpea'"""
+    return re.sub(r'[^a-z]', '', str(name).lower()).rstrip('s')
+
+def match_recommendation_classes(crops, classes, mapping=None):
+    """Index of each yield-model crop among the recommendation classes, or -1
+
+    ``mapping`` names the recommendation class to use for a yield-model crop
+    whose name does not match one (e.g. {"Soybean": "kidneybeans"}).
+    """
+    positions = {_crop_key(label): i for i, label in enumerate(classes)}
+    mapping = mapping or {}
+    if not isinstance(mapping, dict):
+        raise PlanError('crop_mapping must be an object of yield-model crop to recommendation crop')
+    unknown = [str(label) for label in mapping.values() if _crop_key(label) not in positions]
+    if unknown:
+        raise PlanError(f"crop_mapping names unknown recommendation crop(s): {', '.join(unknown)}")
+    return np.array([positions.get(_crop_key(mapping.get(crop, crop)), -1) for crop in crops], dtype=np.intp)
+
+def parse_plots(inputs, state_codes):
+    """Plot fields beside the soil readings: id, area, state and rates
+
+    ``inputs`` are the normalized plot dicts. Annual rainfall defaults to
+    the plot's rainfall reading and pesticide to DEFAULT_PESTICIDE. Returns
+    a dict of per-plot lists and a dict of error messages keyed by plot.
+    """
+    plots = {'id': [], 'area': [], 'state_code': [], 'annual_rainfall': [], 'pesticide': []}
+    errors = {}
+    for index, plot in enumerate(inputs):
+        state = plot.get('state')
+        if state not in state_codes:
+            errors[index] = f"Unknown state '{state}'" if state not in (None, '') else "Missing field 'state'"
+            continue
+        values = {}
+        for name, default in (('area', None), ('annual_rainfall', plot.get('rainfall')),
+                              ('pesticide', DEFAULT_PESTICIDE)):
+            value = plot.get(name)
+            if value in (None, ''):
+                value = default
+            try:
+                values[name] = float(value)
+            except (TypeError, ValueError):
+                values[name] = np.nan
+            if not np.isfinite(values[name]) or values[name] < 0:
+                errors[index] = f"Missing field '{name}'" if value is None else f"Invalid value for '{name}': {value!r}"
+                break
+        else:
+            if values['area'] <= 0:
+                errors[index] = 'area must be positive'
+                continue
+            plots['id'].append(plot.get('id', index))
+            plots['state_code'].append(state_codes[state])
+            for name, value in values.items():
+                plots[name].append(value)
+    return plots, errors
+
+def evaluate_options(crop_model, yield_model, soil, state_codes, areas, annual_rainfall, pesticide,
+                     crop_codes, levels):
+    """Suitability (plots x crops) and predicted yield (plots x crops x levels)
+
+    Each model is called once: the recommendation model on the plots' soil
+    rows, the yield model on every plot/crop/level combination.
+    """
+    n_plots, n_crops, n_levels = len(areas), len(crop_codes), len(levels)
+    probabilities = crop_model.predict_proba(soil)
+
+    shape = (n_plots, n_crops, n_levels)
+    features = np.empty(shape + (6,), dtype=np.float64)
+    features[..., 0] = np.asarray(state_codes, dtype=np.float64)[:, None, None]
+    features[..., 1] = np.asarray(crop_codes, dtype=np.float64)[None, :, None]
+    features[..., 2] = np.asarray(areas)[:, None, None]
+    features[..., 3] = np.asarray(annual_rainfall)[:, None, None]
+    features[..., 4] = np.asarray(levels, dtype=np.float64)[None, None, :]
+    features[..., 5] = np.asarray(pesticide)[:, None, None]
+    yields = yield_model.predict(features.reshape(-1, 6)).reshape(shape)
+    return probabilities, yields
+
+def _choose(score):
+    return np.argmax(score, axis=1)
+
+def _crop_areas(choice, option_crop, areas, n_crops):
+    return np.bincount(option_crop[choice], weights=areas, minlength=n_crops)
+
+class _Plan:
+    """Current choice per plot with the running totals the moves need"""
+
+    def __init__(self, choice, value, fert, option_crop, areas, n_crops):
+        self.choice = choice
+        self.value = value
+        self.fert = fert
+        self.option_crop = option_crop
+        self.areas = areas
+        self.rows = np.arange(len(choice))
+        self.crop_area = _crop_areas(choice, option_crop, areas, n_crops)
+        self.crop_plots = np.bincount(option_crop[choice], minlength=n_crops)
+
+    def fertilizer(self):
+        return float(self.fert[self.rows, self.choice].sum())
+
+    def objective(self):
+        return float(self.value[self.rows, self.choice].sum())
+
+    def move(self, plot, option):
+        old, new = self.option_crop[self.choice[plot]], self.option_crop[option]
+        self.crop_area[old] -= self.areas[plot]
+        self.crop_area[new] += self.areas[plot]
+        self.crop_plots[old] -= 1
+        self.crop_plots[new] += 1
+        self.choice[plot] = option
+
+    def deltas(self):
+        """Value and fertilizer change of every possible move (plots x options)"""
+        current = self.choice
+        return (self.value - self.value[self.rows, current][:, None],
+                self.fert - self.fert[self.rows, current][:, None])
+
+    def share_ok(self, cap):
+        """Moves that keep the target crop within the area cap"""
+        if cap is None:
+            return True
+        target_area = self.crop_area[self.option_crop][None, :] + self.areas[:, None]
+        same_crop = self.option_crop[None, :] == self.option_crop[self.choice][:, None]
+        return same_crop | (target_area <= cap + 1e-9)
+
+def optimize_plan(value, fert, option_crop, areas, n_crops, budget=None, max_share=None, min_distinct=None):
+    """Pick one option per plot; returns (choice, constraint violations)
+
+    ``value`` and ``fert`` are plots x options arrays (-inf value marks an
+    option that is not allowed), ``option_crop`` the crop of each option.
+    """
+    allowed = np.isfinite(value)
+    if not allowed.any(axis=1).all():
+        plot = int(np.flatnonzero(~allowed.any(axis=1))[0])
+        raise PlanError(f'Plot {plot} has no allowed crop (check crops, min_suitability and allow_unmatched_crops)')
+    masked_fert = np.where(allowed, fert, np.inf)
+    cap = None if max_share is None else max_share * float(np.sum(areas))
+
+    # 1. Fertilizer budget through a Lagrange multiplier
+    choice = _choose(value)
+    if budget is not None:
+        minimum = float(masked_fert.min(axis=1).sum())
+        if minimum > budget:
+            raise PlanError(f'Fertilizer budget {budget:g} kg is below the minimum of {minimum:.0f} kg '
+                            'for these plots and rates')
+        if fert[np.arange(len(choice)), choice].sum() > budget:
+            low, high = 0.0, 1.0
+            while fert[np.arange(len(choice)), _choose(value - high * masked_fert)].sum() > budget:
+                high *= 2
+            for _ in range(BISECTION_STEPS):
+                middle = (low + high) / 2
+                used = fert[np.arange(len(choice)), _choose(value - middle * masked_fert)].sum()
+                low, high = (middle, high) if used > budget else (low, middle)
+            choice = _choose(value - high * masked_fert)
+
+    plan = _Plan(choice, value, fert, option_crop, areas, n_crops)
+    slack = (lambda: budget - plan.fertilizer()) if budget is not None else (lambda: np.inf)
+
+    # 2a. Move plots out of crops above the area cap, cheapest loss first
+    if cap is not None:
+        for _ in range(len(areas)):
+            over = np.flatnonzero(plan.crop_area > cap + 1e-9)
+            if not len(over):
+                break
+            gain, extra = plan.deltas()
+            movable = (np.isin(option_crop[plan.choice], over)[:, None]
+                       & ~np.isin(option_crop, over)[None, :]
+                       & plan.share_ok(cap) & allowed & (extra <= slack()))
+            if not movable.any():
+                break
+            plot, option = np.unravel_index(np.argmax(np.where(movable, gain, -np.inf)), gain.shape)
+            plan.move(plot, option)
+
+    # 2b. Bring in unused crops until enough are grown
+    if min_distinct:
+        for _ in range(min_distinct):
+            if np.count_nonzero(plan.crop_plots) >= min_distinct:
+                break
+            gain, extra = plan.deltas()
+            movable = ((plan.crop_plots[option_crop] == 0)[None, :]
+                       & (plan.crop_plots[option_crop[plan.choice]] > 1)[:, None]
+                       & plan.share_ok(cap) & allowed & (extra <= slack()))
+            if not movable.any():
+                break
+            plot, option = np.unravel_index(np.argmax(np.where(movable, gain, -np.inf)), gain.shape)
+            plan.move(plot, option)
+
+    # 3. Spend (or recover) budget: best gain per kg first, crop-changing
+    # moves only where they keep the diversity limits
+    for _ in range(len(areas) * value.shape[1]):
+        gain, extra = plan.deltas()
+        keeps_crop = option_crop[None, :] == option_crop[plan.choice][:, None]
+        keeps_diversity = True
+        if min_distinct:
+            keeps_diversity = keeps_crop | (plan.crop_plots[option_crop[plan.choice]] > 1)[:, None]
+        candidates = allowed & plan.share_ok(cap) & keeps_diversity
+        remaining = slack()
+        if remaining < 0:
+            # Over budget after the diversity moves: free fertilizer at the least loss per kg
+            candidates &= extra < 0
+            ratio = np.where(candidates, gain / -np.where(extra < 0, extra, -1.0), -np.inf)
+        else:
+            candidates &= (gain > 1e-12) & (extra <= remaining)
+            ratio = np.where(candidates, np.where(extra > 0, gain / np.where(extra > 0, extra, 1.0), np.inf),
+                             -np.inf)
+        if not candidates.any():
+            break
+        plot, option = np.unravel_index(np.argmax(ratio), ratio.shape)
+        plan.move(plot, option)
+
+    violations = []
+    if budget is not None and plan.fertilizer() > budget + 1e-6:
+        violations.append('fertilizer_budget')
+    if cap is not None and (plan.crop_area > cap + 1e-9).any():
+        violations.append('max_crop_share')
+    if min_distinct and np.count_nonzero(plan.crop_plots) < min_distinct:
+        violations.append('min_distinct_crops')
+    return plan.choice, violations
+
+def plan_farm(crop_model, yield_data, soil, plots, objective='production', prices=None, fertilizer_budget=None,
+              fertilizer_levels=None, max_crop_share=None, min_distinct_crops=None,
+              min_suitability=DEFAULT_MIN_SUITABILITY, crops=None, crop_mapping=None,
+              allow_unmatched_crops=False):
+    """Evaluate every crop and fertilizer rate on every plot and return the best allocation
+
+    ``soil`` is the plots' recommendation-model feature matrix; ``plots`` a
+    dict of equal-length arrays: id, area, state_code, annual_rainfall,
+    pesticide. Crops the recommendation model has no class for (after
+    ``crop_mapping``) have no suitability to check, so they are left out
+    unless ``allow_unmatched_crops`` is set.
+    """
+    if objective not in OBJECTIVES:
+        raise PlanError(f"Unknown objective '{objective}' (use 'production' or 'revenue')")
+    levels = sorted({float(level) for level in (fertilizer_levels or DEFAULT_FERTILIZER_LEVELS)})
+    if not levels or levels[0] < 0:
+        raise PlanError('fertilizer_levels must be non-negative numbers')
+    if max_crop_share is not None and not 0 < max_crop_share <= 1:
+        raise PlanError('max_crop_share must be in (0, 1]')
+
+    crop_codes = yield_data['crop_codes']
+    candidates = list(crop_codes) if crops is None else list(dict.fromkeys(crops))
+    unknown = [crop for crop in candidates if crop not in crop_codes]
+    if unknown:
+        raise PlanError(f"Unknown crop(s): {', '.join(map(str, unknown))}")
+    if objective == 'revenue':
+        prices = prices or {}
+        missing = [crop for crop in candidates if crop not in prices]
+        if missing:
+            raise PlanError(f"Revenue objective needs a price for: {', '.join(missing)}")
+
+    areas = np.asarray(plots['area'], dtype=np.float64)
+    n_plots, n_crops, n_levels = len(areas), len(candidates), len(levels)
+    if n_plots * n_crops * n_levels > MAX_PLAN_OPTIONS:
+        raise PlanError(f'Too many options: {n_plots * n_crops * n_levels} (limit {MAX_PLAN_OPTIONS})')
+
+    probabilities, yields = evaluate_options(
+        crop_model, yield_data['model'], soil, plots['state_code'], areas, plots['annual_rainfall'],
+        plots['pesticide'], [crop_codes[crop] for crop in candidates], levels)
+
+    # Suitability of each candidate on each plot (NaN for crops the recommendation model does not know)
+    matched = match_recommendation_classes(candidates, crop_model.classes_, crop_mapping)
+    suitability = np.where(matched >= 0, probabilities[:, np.maximum(matched, 0)], np.nan)
+    allowed = suitability >= min_suitability
+    if allow_unmatched_crops:
+        allowed |= np.isnan(suitability)
+    unmatched = [crop for crop, index in zip(candidates, matched) if index < 0]
+
+    price = np.array([float(prices[crop]) if objective == 'revenue' else 1.0 for crop in candidates])
+    production = yields * areas[:, None, None]
+    value = np.where(allowed[:, :, None], production * price[None, :, None], -np.inf)
+    fert = np.broadcast_to(areas[:, None, None] * np.asarray(levels)[None, None, :], yields.shape)
+
+    option_crop = np.repeat(np.arange(n_crops), n_levels)
+    choice, violations = optimize_plan(
+        value.reshape(n_plots, -1), np.ascontiguousarray(fert).reshape(n_plots, -1), option_crop, areas, n_crops,
+        budget=fertilizer_budget, max_share=max_crop_share, min_distinct=min_distinct_crops)
+
+    crop_index, level_index = np.divmod(choice, n_levels)
+    rows = np.arange(n_plots)
+    chosen_yield = yields[rows, crop_index, level_index]
+    allocation = []
+    for i in range(n_plots):
+        crop, level = candidates[crop_index[i]], levels[level_index[i]]
+        entry = {
+            'plot': plots['id'][i],
+            'crop': crop,
+            'area': float(areas[i]),
+            'fertilizer_kg_per_ha': level,
+            'fertilizer_kg': round(level * areas[i], 2),
+            'predicted_yield': round(float(chosen_yield[i]), 3),
+            'production': round(float(chosen_yield[i] * areas[i]), 3),
+            'suitability': None if np.isnan(suitability[i, crop_index[i]])
+            else round(float(suitability[i, crop_index[i]]) * 100, 2)
+        }
+        if objective == 'revenue':
+            entry['revenue'] = round(entry['production'] * price[crop_index[i]], 2)
+        allocation.append(entry)
+
+    crop_areas = {}
+    for entry in allocation:
+        crop_areas[entry['crop']] = crop_areas.get(entry['crop'], 0.0) + entry['area']
+    totals = {
+        'production': round(sum(entry['production'] for entry in allocation), 3),
+        'fertilizer_kg': round(sum(entry['fertilizer_kg'] for entry in allocation), 2),
+        'area': float(areas.sum()),
+        'crop_areas': crop_areas
+    }
+    if objective == 'revenue':
+        totals['revenue'] = round(sum(entry['revenue'] for entry in allocation), 2)
+
+    return {
+        'objective': objective,
+        'allocation': allocation,
+        'totals': totals,
+        # The best each plot could do on its own, ignoring every constraint
+        'unconstrained_objective': round(float(np.max(value.reshape(n_plots, -1), axis=1).sum()), 3),
+        'constraints': {
+            'fertilizer_budget': fertilizer_budget,
+            'max_crop_share': max_crop_share,
+            'min_distinct_crops': min_distinct_crops,
+            'min_suitability': min_suitability,
+            'allow_unmatched_crops': bool(allow_unmatched_crops),
+            'met': not violations,
+            'violated': violations
+        },
+        # Crops with no recommendation class: excluded unless allow_unmatched_crops is set
+        'unmatched_crops': unmatched,
+        'evaluated_options': int(n_plots * n_crops * n_levels)
+    }
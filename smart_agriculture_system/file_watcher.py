@@ -0,0 +1,73 @@
+"""
+File Watcher
+Background thread that calls a function when a file changes (polled by
+modification time, size and inode) or when woken up explicitly, e.g. from a
+signal handler
+"""
+
+import os
+import threading
+
+class FileWatcher:
+    """Polls one file and runs ``callback`` after every change
+
+    The file may not exist yet; it appearing or disappearing counts as a
+    change. ``trigger()`` runs the callback on the next loop without waiting
+    for the interval, and is safe to call from a signal handler. With
+    ``interval=None`` the file is not polled and only ``trigger()`` runs it.
+    """
+
+    def __init__(self, path, callback, interval=2.0, name='file-watcher'):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.changes = 0
+        self._last = self._signature()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def forked(self):
+        """An unstarted copy for a forked child process, where this watcher's
+        thread does not exist; a change the parent has not handled yet is
+        still seen as a change
+        """
+        watcher = FileWatcher(self.path, self.callback, self.interval, self._thread.name)
+        watcher._last = self._last
+        return watcher
+
+    def trigger(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            woken = self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            signature = self._signature()
+            if not woken and signature == self._last:
+                continue
+            self._last = signature
+            self.changes += 1
+            try:
+                self.callback()
+            except Exception as e:
+                # The callback reports its own failures; keep watching regardless
+                print(f"Warning: {self._thread.name} callback failed - {e}")
@@ -0,0 +1,681 @@
+"""
+Load Test and Capacity Report
+Replays mixed crop, yield and weather traffic against a locally started
+server, steps the load up until the endpoints saturate, and reports
+throughput, tail latency, error rates and per-worker CPU and memory
+
+Each configuration is served by serve.py on a free local port, with the
+weather provider replaced by weather_stub.py, so nothing leaves the machine.
+Request bodies are dataset rows with a little noise, and weather requests
+pick cities with a skewed popularity so the weather cache sees realistic hits.
+
+Open-loop mode (the default) sends requests at Poisson arrival times for each
+rate in --rates, whether or not earlier ones have been answered, and times
+every request from its scheduled arrival. Time spent queued in the client
+therefore counts as latency, as it would for real users, and an overloaded
+server shows up as growing tails instead of a slower send rate. Closed-loop
+mode runs --concurrency clients that each send their next request as soon
+as the last one is answered.
+
+A step is within capacity when its p99 latency is under --slo-p99-ms, at most
+--max-error-rate of its requests failed and (open loop) the server kept up
+with the offered rate. The report gives each configuration's capacity, the
+first step past it, and the step at which each endpoint's p99 went over the
+limit.
+
+Usage:
+    python load_test.py -o capacity.json                          # open loop at 25..400 req/s
+    python load_test.py --mode closed --concurrency 1,4,16,64 --mix crop=1
+    python load_test.py --config base --config microbatch:AGRI_MICROBATCH=1 \\
+                        --config lookup:AGRI_CROP_SERVING=lookup,workers=2
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, 'models'))
+
+from dataset_store import load_dataset
+
+ENDPOINTS = {
+    'crop': '/api/recommend-crop',
+    'yield': '/api/predict-yield',
+    'weather': '/api/weather'
+}
+DEFAULT_MIX = 'crop=0.5,yield=0.35,weather=0.15'
+DEFAULT_RATES = '25,50,100,200,400'
+DEFAULT_CONCURRENCY = '1,2,4,8,16,32'
+CROP_FIELDS = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
+CROP_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+YIELD_NUMERIC = ['Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+CITIES = ['Mumbai', 'Delhi', 'Bengaluru', 'Hyderabad', 'Ahmedabad', 'Chennai', 'Kolkata', 'Pune',
+          'Jaipur', 'Lucknow', 'Kanpur', 'Nagpur', 'Indore', 'Bhopal', 'Patna', 'Ludhiana',
+          'Nashik', 'Vadodara', 'Rajkot', 'Varanasi', 'Amritsar', 'Coimbatore', 'Madurai', 'Guntur']
+# Distinct request bodies generated per endpoint
+POOL_SIZE = 20000
+PERCENTILES = [50, 75, 90, 95, 99, 99.9]
+SAMPLE_INTERVAL = 0.5
+READY_TIMEOUT = 180.0
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+class LoadTestError(RuntimeError):
+    """Raised when the server or weather stub cannot be started"""
+
+# ---------------------------------------------------------------------------
+# Traffic
+# ---------------------------------------------------------------------------
+
+def parse_mix(text):
+    """'crop=0.5,yield=0.3,weather=0.2' -> {endpoint: share}, normalized to sum to 1"""
+    mix = {}
+    for part in text.split(','):
+        name, _, share = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint '{name}' in --mix (use {', '.join(ENDPOINTS)})")
+        mix[name] = float(share or 1)
+    total = sum(mix.values())
+    if total <= 0 or any(share < 0 for share in mix.values()):
+        raise ValueError('--mix shares must be non-negative and not all zero')
+    return {name: share / total for name, share in mix.items() if share > 0}
+
+def build_traffic(mix, seed, cities=500):
+    """Pre-encoded request bodies per endpoint, so generating load costs next to nothing"""
+    rng = np.random.default_rng(seed)
+    pools = {}
+    if 'crop' in mix:
+        base = load_dataset('crop', CROP_COLUMNS).to_numpy(np.float64)
+        rows = base[rng.integers(0, len(base), POOL_SIZE)]
+        rows = np.round(rows * rng.uniform(0.97, 1.03, rows.shape), 2)
+        pools['crop'] = [json.dumps(dict(zip(CROP_FIELDS, map(float, row)))).encode('utf-8') for row in rows]
+    if 'yield' in mix:
+        df = load_dataset('yield', ['State', 'Crop'] + YIELD_NUMERIC)
+        picked = rng.integers(0, len(df), POOL_SIZE)
+        labels = df[['State', 'Crop']].astype(str).to_numpy()[picked]
+        numeric = df[YIELD_NUMERIC].to_numpy(np.float64)[picked]
+        numeric = np.round(numeric * rng.uniform(0.97, 1.03, numeric.shape), 2)
+        pools['yield'] = [json.dumps({
+            'state': state, 'crop': crop, 'area': area, 'rainfall': rainfall,
+            'fertilizer': fertilizer, 'pesticide': pesticide
+        }).encode('utf-8') for (state, crop), (area, rainfall, fertilizer, pesticide) in zip(labels, numeric.tolist())]
+    if 'weather' in mix:
+        # A few big cities get most lookups, as in real traffic
+        names = CITIES + [f'Town {i}' for i in range(max(0, cities - len(CITIES)))]
+        weights = 1.0 / np.arange(1, len(names) + 1)
+        picked = rng.choice(len(names), POOL_SIZE, p=weights / weights.sum())
+        pools['weather'] = [json.dumps({'city': names[i]}).encode('utf-8') for i in picked]
+    return pools
+
+class Traffic:
+    """Draws (endpoint, body) pairs in the configured mix"""
+
+    def __init__(self, mix, pools, seed):
+        self.names = list(mix)
+        self.cumulative = np.cumsum([mix[name] for name in self.names])
+        self.pools = pools
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            pick = self.rng.random()
+            draw = self.rng.randrange(POOL_SIZE)
+        name = self.names[min(int(np.searchsorted(self.cumulative, pick, side='right')), len(self.names) - 1)]
+        return name, self.pools[name][draw]
+
+def send(host, port, endpoint, body, timeout):
+    """POST one request; returns None on success or a short error label"""
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request('POST', ENDPOINTS[endpoint], body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        return None if response.status < 400 else f'http_{response.status}'
+    except socket.timeout:
+        return 'timeout'
+    except OSError as e:
+        return type(e).__name__
+    except http.client.HTTPException as e:
+        return type(e).__name__
+    finally:
+        connection.close()
+
+# ---------------------------------------------------------------------------
+# Processes and resource sampling
+# ---------------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def child_pids(parent):
+    """Live children of a process (Linux /proc; empty elsewhere)"""
+    children = []
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; fields after it are fixed
+        if int(stat[stat.rindex(')') + 2:].split()[1]) == parent:
+            children.append(int(entry))
+    return sorted(children)
+
+def cpu_seconds(pid):
+    """User plus system CPU time of a process, None once it has exited"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+def memory_mb(pid):
+    """(RSS, PSS) in MB; PSS splits pages shared between workers fairly and is None where unavailable"""
+    rss = pss = None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) / 1024
+                    break
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1]) / 1024
+                    break
+    except OSError:
+        pass
+    return rss, pss
+
+class ResourceSampler:
+    """Samples CPU time and memory of a set of processes while a step runs"""
+
+    def __init__(self, processes):
+        self.processes = processes  # role -> list of pids
+        self.samples = {}
+        self.cpu_start = {}
+        self.stop = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        for pids in self.processes.values():
+            for pid in pids:
+                self.cpu_start[pid] = cpu_seconds(pid)
+                self.samples[pid] = []
+        self.thread = threading.Thread(target=self._run, name='resource-sampler', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop.wait(SAMPLE_INTERVAL):
+            self._sample()
+
+    def _sample(self):
+        for pid in self.samples:
+            rss, pss = memory_mb(pid)
+            if rss is not None:
+                self.samples[pid].append((rss, pss))
+
+    def finish(self):
+        self.stop.set()
+        self.thread.join()
+        self._sample()
+        elapsed = time.perf_counter() - self.started
+        report = {}
+        for role, pids in self.processes.items():
+            report[role] = []
+            for pid in pids:
+                start, end = self.cpu_start.get(pid), cpu_seconds(pid)
+                rss = [s[0] for s in self.samples[pid]]
+                pss = [s[1] for s in self.samples[pid] if s[1] is not None]
+                report[role].append({
+                    'pid': pid,
+                    'cpu_percent': round((end - start) / elapsed * 100, 1) if None not in (start, end) else None,
+                    'rss_mb_peak': round(max(rss), 1) if rss else None,
+                    'rss_mb_mean': round(sum(rss) / len(rss), 1) if rss else None,
+                    'pss_mb_peak': round(max(pss), 1) if pss else None
+                })
+        return report
+
+class ServedConfig:
+    """serve.py and weather_stub.py running for one configuration"""
+
+    def __init__(self, name, env, workers, threads, weather_delay, weather_failure_rate):
+        self.name = name
+        self.env = env
+        self.workers = workers
+        self.threads = threads
+        self.weather_delay = weather_delay
+        self.weather_failure_rate = weather_failure_rate
+        self.port = None
+        self.server = None
+        self.stub = None
+        self.log = None
+
+    def __enter__(self):
+        stub_port = free_port()
+        self.port = free_port()
+        self.log = tempfile.NamedTemporaryFile(prefix=f'agri-load-{self.name}-', suffix='.log', delete=False)
+        self.stub = subprocess.Popen(
+            [sys.executable, os.path.join(BASE_DIR, 'weather_stub.py'), '--port', str(stub_port),
+             '--delay', str(self.weather_delay), '--failure-rate', str(self.weather_failure_rate)],
+            stdout=subprocess.DEVNULL, stderr=self.log)
+
+        env = dict(os.environ)
+        env.update({
+            'WEATHER_API_URL': f'http://127.0.0.1:{stub_port}/data/2.5/weather',
+            'OPENWEATHER_API_KEY': 'stub',
+            'PYTHONUNBUFFERED': '1'
+        })
+        env.update(self.env)
+        self.server = subprocess.Popen(
+            [sys.executable, os.path.join(BASE_DIR, 'serve.py'), '--host', '127.0.0.1',
+             '--port', str(self.port), '--workers', str(self.workers), '--threads', str(self.threads)],
+            cwd=BASE_DIR, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        try:
+            self._wait_until_ready()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _wait_until_ready(self):
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.server.poll() is not None:
+                raise LoadTestError(f"serve.py exited with status {self.server.returncode}:\n{self.log_tail()}")
+            if self.stub.poll() is not None:
+                raise LoadTestError(f"weather_stub.py exited with status {self.stub.returncode}:\n{self.log_tail()}")
+            if len(self.worker_pids()) >= self.workers:
+                try:
+                    connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                    connection.request('GET', '/api/ready')
+                    if connection.getresponse().status == 200:
+                        return
+                except OSError:
+                    pass
+                finally:
+                    connection.close()
+            time.sleep(0.2)
+        raise LoadTestError(f"Server not ready after {READY_TIMEOUT:g}s:\n{self.log_tail()}")
+
+    def log_tail(self, lines=20):
+        self.log.flush()
+        with open(self.log.name, errors='replace') as f:
+            return ''.join(f.readlines()[-lines:])
+
+    def worker_pids(self):
+        return child_pids(self.server.pid)
+
+    def processes(self):
+        return {
+            'workers': self.worker_pids(),
+            'supervisor': [self.server.pid],
+            'weather_stub': [self.stub.pid],
+            'load_generator': [os.getpid()]
+        }
+
+    def __exit__(self, *exc):
+        for process in (self.server, self.stub):
+            if process is not None and process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+        for process in (self.server, self.stub):
+            if process is None:
+                continue
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        self.log.close()
+        if exc[0] is None:
+            os.unlink(self.log.name)
+        return False
+
+# ---------------------------------------------------------------------------
+# Load steps
+# ---------------------------------------------------------------------------
+
+def run_open_loop(served, traffic, rate, duration, max_inflight, timeout, seed):
+    """Poisson arrivals at `rate` req/s for `duration` seconds; latency counts from the scheduled arrival"""
+    results = []
+    rng = random.Random(seed)
+    pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix='client')
+
+    def issue(endpoint, body, scheduled):
+        error = send('127.0.0.1', served.port, endpoint, body, timeout)
+        results.append((endpoint, scheduled, time.perf_counter(), error))
+
+    started = time.perf_counter()
+    arrival = started
+    sent = {}
+    while True:
+        arrival += rng.expovariate(rate)
+        if arrival - started >= duration:
+            break
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        endpoint, body = traffic.next()
+        pool.submit(issue, endpoint, body, arrival)
+        sent[endpoint] = sent.get(endpoint, 0) + 1
+
+    # Requests still queued in the client once the stragglers' time is up never reach the server
+    deadline = time.perf_counter() + timeout
+    while len(results) < sum(sent.values()) and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    pool.shutdown(wait=False, cancel_futures=True)
+    answered = {}
+    for endpoint, *_ in list(results):
+        answered[endpoint] = answered.get(endpoint, 0) + 1
+    pending = {name: count - answered.get(name, 0) for name, count in sent.items()}
+    return list(results), started, duration, pending
+
+def run_closed_loop(served, traffic, clients, duration, timeout):
+    """`clients` threads each sending their next request as soon as the last is answered"""
+    results = []
+    started = time.perf_counter()
+    stop_at = started + duration
+
+    def client():
+        while time.perf_counter() < stop_at:
+            endpoint, body = traffic.next()
+            issued = time.perf_counter()
+            error = send('127.0.0.1', served.port, endpoint, body, timeout)
+            results.append((endpoint, issued, time.perf_counter(), error))
+
+    threads = [threading.Thread(target=client, name=f'client-{i}', daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + timeout + 5)
+    return results, started, duration, {}
+
+def latency_summary(latencies):
+    """Percentiles of a list of latencies (seconds) in milliseconds"""
+    if not latencies:
+        return None
+    values = np.asarray(latencies) * 1000
+    summary = {f'p{p:g}_ms': round(float(np.percentile(values, p)), 2) for p in PERCENTILES}
+    summary['mean_ms'] = round(float(values.mean()), 2)
+    summary['max_ms'] = round(float(values.max()), 2)
+    return summary
+
+def summarize_step(results, started, duration, pending, offered_rate=None, concurrency=None):
+    """Throughput, latency percentiles and errors, overall and per endpoint
+
+    ``pending`` counts, per endpoint, the requests that were still queued in
+    the client when the step ended; they are reported as 'not_sent' errors.
+    """
+    window_end = started + duration
+
+    def summarize(rows, pending=0):
+        completed_in_window = sum(1 for _, _, end, error in rows if error is None and end <= window_end)
+        errors = {}
+        for _, _, _, error in rows:
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+        if pending:
+            errors['not_sent'] = pending
+        requests = len(rows) + pending
+        return {
+            'requests': requests,
+            'throughput_rps': round(completed_in_window / duration, 1),
+            'error_rate': round(sum(errors.values()) / requests, 4) if requests else 0.0,
+            'errors': errors,
+            'latency': latency_summary([end - start for _, start, end, error in rows if error is None])
+        }
+
+    step = {'offered_rps': offered_rate, 'concurrency': concurrency}
+    step.update(summarize(results, sum(pending.values())))
+    step['endpoints'] = {
+        name: summarize([row for row in results if row[0] == name], pending.get(name, 0))
+        for name in sorted({row[0] for row in results} | set(pending))
+    }
+    return step
+
+def within_capacity(step, slo_ms, max_error_rate):
+    """Whether a step met the latency objective and error budget and kept up with the offered rate"""
+    latency = step['latency']
+    if latency is None or latency['p99_ms'] > slo_ms or step['error_rate'] > max_error_rate:
+        return False
+    return step['offered_rps'] is None or step['throughput_rps'] >= 0.9 * step['offered_rps']
+
+def capacity_summary(steps, slo_ms, max_error_rate):
+    """Best throughput within capacity, the first step past it, and where each endpoint's p99 broke the objective"""
+    passing = [step for step in steps if step['within_capacity']]
+    failing = [step for step in steps if not step['within_capacity']]
+    best = max(passing, key=lambda step: step['throughput_rps']) if passing else None
+    endpoint_limits = {}
+    for step in steps:
+        for name, endpoint in step['endpoints'].items():
+            over = endpoint['latency'] is None or endpoint['latency']['p99_ms'] > slo_ms \
+                or endpoint['error_rate'] > max_error_rate
+            if over and name not in endpoint_limits:
+                endpoint_limits[name] = step['load']
+    return {
+        'capacity_rps': best['throughput_rps'] if best else 0.0,
+        'capacity_load': best['load'] if best else None,
+        'p99_ms_at_capacity': best['latency']['p99_ms'] if best else None,
+        'saturated_at': failing[0]['load'] if failing else None,
+        'peak_throughput_rps': max(step['throughput_rps'] for step in steps),
+        'endpoint_saturated_at': endpoint_limits
+    }
+
+def describe_load(args, level):
+    return f'{level:g} req/s' if args.mode == 'open' else f'{level:g} clients'
+
+def run_config(name, env, workers, threads, args, traffic):
+    """Start one configuration, run every load step against it and return its report"""
+    levels = args.rates if args.mode == 'open' else args.concurrency
+    print(f"\n[{name}] {workers} worker(s) x {threads} thread(s)"
+          + (f", {', '.join(f'{k}={v}' for k, v in env.items())}" if env else ''))
+
+    with ServedConfig(name, env, workers, threads, args.weather_delay, args.weather_failure_rate) as served:
+        print(f"✓ Server ready on port {served.port} (workers: {', '.join(map(str, served.worker_pids()))})")
+
+        def run(level, duration, seed):
+            if args.mode == 'open':
+                return run_open_loop(served, traffic, level, duration, args.max_inflight, args.timeout, seed)
+            return run_closed_loop(served, traffic, int(level), duration, args.timeout)
+
+        if args.warmup > 0:
+            run(levels[0], args.warmup, args.seed)
+
+        steps = []
+        for index, level in enumerate(levels):
+            sampler = ResourceSampler(served.processes())
+            sampler.start()
+            results, started, duration, pending = run(level, args.duration, args.seed + index + 1)
+            resources = sampler.finish()
+
+            step = summarize_step(results, started, duration, pending,
+                                  offered_rate=level if args.mode == 'open' else None,
+                                  concurrency=int(level) if args.mode == 'closed' else None)
+            step['load'] = describe_load(args, level)
+            step['within_capacity'] = within_capacity(step, args.slo_p99_ms, args.max_error_rate)
+            step['resources'] = resources
+            steps.append(step)
+            print_step(step)
+
+    return {
+        'name': name,
+        'env': env,
+        'workers': workers,
+        'threads': threads,
+        'steps': steps,
+        'summary': capacity_summary(steps, args.slo_p99_ms, args.max_error_rate)
+    }
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def print_step(step):
+    latency = step['latency'] or {}
+    workers = step['resources']['workers']
+    cpu = [w['cpu_percent'] for w in workers if w['cpu_percent'] is not None]
+    rss = [w['rss_mb_peak'] for w in workers if w['rss_mb_peak'] is not None]
+    generator = step['resources']['load_generator'][0]['cpu_percent']
+    mark = '✓' if step['within_capacity'] else '✗'
+    print(f"  {mark} {step['load']:>12}  {step['throughput_rps']:>8.1f} req/s   "
+          f"p50 {latency.get('p50_ms', float('nan')):>8.1f}  p99 {latency.get('p99_ms', float('nan')):>8.1f}  "
+          f"p99.9 {latency.get('p99.9_ms', float('nan')):>8.1f} ms   errors {step['error_rate']:>6.1%}   "
+          f"worker CPU {'/'.join(f'{c:.0f}' for c in cpu)}%  RSS {'/'.join(f'{r:.0f}' for r in rss)} MB   "
+          f"client CPU {generator or 0:.0f}%")
+    for name, endpoint in step['endpoints'].items():
+        latency = endpoint['latency'] or {}
+        print(f"      {name:<8} {endpoint['throughput_rps']:>8.1f} req/s   p50 {latency.get('p50_ms', float('nan')):>8.1f}  "
+              f"p99 {latency.get('p99_ms', float('nan')):>8.1f} ms   errors {endpoint['error_rate']:>6.1%}")
+
+def print_comparison(configs, args):
+    print("\n" + "=" * 60)
+    print(f"CAPACITY (p99 <= {args.slo_p99_ms:g} ms, errors <= {args.max_error_rate:.1%})")
+    print("=" * 60)
+    for config in configs:
+        summary = config['summary']
+        p99 = summary['p99_ms_at_capacity']
+        print(f"  {config['name']:<16} capacity {summary['capacity_rps']:>8.1f} req/s"
+              + (f" (p99 {p99:.1f} ms at {summary['capacity_load']})" if p99 is not None else '')
+              + f"   peak {summary['peak_throughput_rps']:.1f} req/s"
+              + f"   saturated at {summary['saturated_at'] or 'not reached'}")
+        for name, load in sorted(summary['endpoint_saturated_at'].items()):
+            print(f"      {name} p99 over the objective from {load}")
+
+def environment_info():
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+def parse_levels(text, kind):
+    levels = [float(v) for v in text.split(',') if v.strip()]
+    if not levels or any(v <= 0 for v in levels):
+        raise ValueError(f'{kind} must be a comma-separated list of positive numbers')
+    return levels
+
+def parse_config(text, workers, threads):
+    """'name:KEY=VALUE,workers=2,...' -> (name, environment, workers, threads)"""
+    name, _, settings = text.partition(':')
+    env = {}
+    for setting in filter(None, (s.strip() for s in settings.split(','))):
+        key, sep, value = setting.partition('=')
+        if not sep:
+            raise ValueError(f"expected KEY=VALUE in --config '{text}', got '{setting}'")
+        if key == 'workers':
+            workers = int(value)
+        elif key == 'threads':
+            threads = int(value)
+        else:
+            env[key] = value
+    if not name or workers < 1 or threads < 1:
+        raise ValueError(f"invalid --config '{text}'")
+    return name, env, workers, threads
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Load-test the API with mixed traffic and report its capacity')
+    parser.add_argument('--mode', choices=['open', 'closed'], default='open',
+                        help='open: Poisson arrivals at each --rates value; closed: --concurrency clients (default: %(default)s)')
+    parser.add_argument('--rates', default=DEFAULT_RATES, help='Open-loop arrival rates in req/s (default: %(default)s)')
+    parser.add_argument('--concurrency', default=DEFAULT_CONCURRENCY, help='Closed-loop client counts (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds per load step (default: %(default)s)')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Unreported seconds at the first load level (default: %(default)s)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Share of each endpoint (default: %(default)s)')
+    parser.add_argument('--config', action='append', metavar='NAME[:KEY=VALUE,...]',
+                        help='Serving configuration to test; KEY is an environment variable, or workers/threads. '
+                             'Repeat to compare (default: one configuration with the current environment)')
+    parser.add_argument('--workers', type=int, default=1, help='Default worker processes (default: %(default)s)')
+    parser.add_argument('--threads', type=int, default=4, help='Default threads per worker (default: %(default)s)')
+    parser.add_argument('--weather-delay', type=float, default=0.05,
+                        help='Seconds the weather stub waits before answering (default: %(default)s)')
+    parser.add_argument('--weather-failure-rate', type=float, default=0.0,
+                        help='Fraction of weather stub calls answered with 503')
+    parser.add_argument('--slo-p99-ms', type=float, default=250.0, help='p99 latency objective (default: %(default)s)')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Error budget per step (default: %(default)s)')
+    parser.add_argument('--max-inflight', type=int, default=256,
+                        help='Open-loop client connections in flight at once (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout in seconds (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', help='Write the capacity report to this JSON file')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork') or not os.path.isdir('/proc'):
+        print("✗ The load test starts serve.py and reads /proc, so it needs Linux")
+        return 1
+    try:
+        mix = parse_mix(args.mix)
+        args.rates = parse_levels(args.rates, '--rates')
+        args.concurrency = parse_levels(args.concurrency, '--concurrency')
+        configs = [parse_config(text, args.workers, args.threads) for text in args.config or ['default']]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.duration <= 0:
+        parser.error('--duration must be positive')
+
+    print("=" * 60)
+    print("LOAD TEST")
+    print("=" * 60)
+    print(f"Mode: {args.mode}, {args.duration:g}s per step, mix "
+          + ', '.join(f'{name} {share:.0%}' for name, share in mix.items()))
+    if (os.cpu_count() or 1) < 2:
+        print("Warning: one CPU - the load generator competes with the server, so capacity is understated")
+
+    print("\n[1] Building request bodies...")
+    traffic = Traffic(mix, build_traffic(mix, args.seed), args.seed)
+    print(f"✓ {POOL_SIZE} bodies per endpoint")
+
+    print("\n[2] Running load steps...")
+    results = []
+    for name, env, workers, threads in configs:
+        try:
+            results.append(run_config(name, env, workers, threads, args, traffic))
+        except LoadTestError as e:
+            print(f"✗ {name}: {e}")
+            return 1
+    print_comparison(results, args)
+
+    if args.output:
+        report = {
+            'environment': environment_info(),
+            'settings': {
+                'mode': args.mode, 'duration': args.duration, 'mix': mix,
+                'slo_p99_ms': args.slo_p99_ms, 'max_error_rate': args.max_error_rate,
+                'weather_delay': args.weather_delay, 'weather_failure_rate': args.weather_failure_rate
+            },
+            'configs': results
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
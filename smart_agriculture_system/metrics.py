@@ -0,0 +1,243 @@
+"""
+Request Metrics
+Minimal Prometheus-style counters and histograms, per-request stage timing,
+and a sampling profiler that can be switched on for a single request
+"""
+
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+# Latency buckets in seconds, from 100 microseconds to 10 seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Rows per model call
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 4096, 16384, 65536)
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            yield self.name, self.labelnames, key, value
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items()]
+        labelnames = self.labelnames + ('le',)
+        for key, (counts, total, count) in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', labelnames, key + (_format_value(bound),), cumulative
+            yield self.name + '_sum', self.labelnames, key, total
+            yield self.name + '_count', self.labelnames, key, count
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            yield self.name, self.labelnames, key, value
+
+class Registry:
+    """Collection of metrics rendered in the text exposition format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback, labelnames=()):
+        return self.register(Gauge(name, documentation, callback, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labelnames, key, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labelnames, key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'agri_request_duration_seconds', 'Request latency by route', ('route', 'method', 'status'))
+STAGE_LATENCY = REGISTRY.histogram(
+    'agri_stage_duration_seconds', 'Time spent in each request stage', ('route', 'stage'))
+ERRORS = REGISTRY.counter(
+    'agri_errors_total', 'Handled errors by route and exception type', ('route', 'type'))
+MODEL_BATCH_ROWS = REGISTRY.histogram(
+    'agri_model_batch_rows', 'Rows per model call', ('model',), buckets=BATCH_BUCKETS)
+
+def current_route():
+    """Endpoint name of the current request, or 'none' outside a request"""
+    if has_request_context():
+        from flask import request
+        return request.endpoint or 'unknown'
+    return 'none'
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.observe(elapsed, route=current_route(), stage=name)
+        if has_request_context():
+            stages = g.setdefault('stage_timings', {})
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+def record_error(error):
+    """Count a handled exception against the current route"""
+    ERRORS.inc(route=current_route(), type=type(error).__name__)
+
+def server_timing_header(stages):
+    """Format stage timings for the Server-Timing response header"""
+    return ', '.join(f'{name};dur={seconds * 1000:.3f}' for name, seconds in stages.items())
+
+class TimedModel:
+    """Wraps a model so every predict/predict_proba call records its batch size
+    and counts as the 'inference' stage of the current request"""
+
+    def __init__(self, model, name):
+        self._model = model
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._model, attribute)
+
+    @property
+    def wrapped(self):
+        return self._model
+
+    def predict(self, X):
+        MODEL_BATCH_ROWS.observe(len(X), model=self._name)
+        with stage('inference'):
+            return self._model.predict(X)
+
+    def predict_proba(self, X):
+        MODEL_BATCH_ROWS.observe(len(X), model=self._name)
+        with stage('inference'):
+            return self._model.predict_proba(X)
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval and counts folded stacks
+
+    The output is in the folded-stack format read by flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common()) + '\n'
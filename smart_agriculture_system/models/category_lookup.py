@@ -0,0 +1,47 @@
+"""
+Category Lookup Tables
+Precomputed label -> code dictionaries for the yield model's State/Crop encoders,
+built once at model load instead of calling LabelEncoder.transform per request
+"""
+
+class UnknownCategoryError(ValueError):
+    """Raised when a label is not in the model's vocabulary"""
+
+    def __init__(self, field, value):
+        super().__init__(f"Unknown {field} '{value}'")
+        self.field = field
+        self.value = value
+
+def build_category_lookups(state_classes, crop_classes):
+    """Build code dictionaries and sorted option lists from encoder classes"""
+    # LabelEncoder.classes_ is already sorted, so list position is the code
+    states = [str(label) for label in state_classes]
+    crops = [str(label) for label in crop_classes]
+    return {
+        'state_codes': {label: code for code, label in enumerate(states)},
+        'crop_codes': {label: code for code, label in enumerate(crops)},
+        'state_options': states,
+        'crop_options': crops
+    }
+
+def add_category_lookups(model_data):
+    """Attach lookup tables to a loaded yield model dictionary
+
+    Works with both the pickled dictionary (LabelEncoders) and the artifact
+    dictionary (plain vocabulary lists).
+    """
+    if 'state_encoder' in model_data:
+        state_classes = model_data['state_encoder'].classes_
+        crop_classes = model_data['crop_encoder'].classes_
+    else:
+        state_classes = model_data['state_classes']
+        crop_classes = model_data['crop_classes']
+    model_data.update(build_category_lookups(state_classes, crop_classes))
+    return model_data
+
+def encode_category(codes, field, value):
+    """Map one label to its code, raising UnknownCategoryError for unseen labels"""
+    try:
+        return codes[value]
+    except (KeyError, TypeError):
+        raise UnknownCategoryError(field, value) from None
@@ -0,0 +1,255 @@
+"""
+Model Compression
+Shrinks a trained forest to fit a size or latency budget while losing at most
+a set amount of accuracy (R² for the yield model) on the held-out test split
+
+Candidates combine two reductions of the compiled forest:
+    depth caps     nodes at the cap become leaves carrying the class
+                   distribution (or mean yield) of the samples that reached them
+    tree subsets   trees are ordered greedily by how much each one improves the
+                   training-set fit of the trees already chosen (ordered
+                   aggregation), and the first k are kept
+
+The smallest candidate within the loss and budget is exported as the serving
+artifacts, and a before/after report is written beside the model's artifact
+directory, which is replaced on every export. The pickled scikit-learn model
+is not modified and stays the reference for the sklearn backend and for
+re-running compression, so retraining or re-exporting serves the full forest
+again until compression is re-run.
+
+Usage:
+    python compress_model.py crop --max-loss 0.01
+    python compress_model.py yield --max-loss 0.02 --max-latency-ms 0.1 --dry-run
+    python compress_model.py crop --max-kb 100
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+from sklearn.metrics import accuracy_score, r2_score
+
+from forest_engine import FlatForest, compile_forest
+from hyperparameter_search import load_search_data, single_row_latency_ms
+from model_artifacts import (ARTIFACTS_DIR, FOREST_ARRAYS, export_crop_model, export_yield_model)
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Written as artifacts/<model>_compression_report.json, outside the artifact directory
+REPORT_NAME = 'compression_report.json'
+
+DEFAULT_MAX_LOSS = 0.01
+DEPTH_CAPS = [4, 6, 8, 10, 12, 16]
+TREE_COUNTS = [5, 10, 15, 25, 50, 75]
+BATCH_ROWS = 1000
+
+def prune_forest(forest, trees=None, max_depth=None):
+    """New FlatForest keeping only the given trees (by position), cut at max_depth"""
+    roots = forest.roots if trees is None else forest.roots[np.asarray(trees, dtype=np.intp)]
+    is_leaf = forest.left == np.arange(forest.n_nodes)
+    keep = np.zeros(forest.n_nodes, dtype=bool)
+    cut = np.zeros(forest.n_nodes, dtype=bool)
+
+    # Walk all trees level by level from their roots
+    frontier = np.asarray(roots, dtype=np.intp)
+    depth = 0
+    while frontier.size:
+        keep[frontier] = True
+        if max_depth is not None and depth == max_depth:
+            cut[frontier] = True
+            break
+        internal = frontier[~is_leaf[frontier]]
+        if not internal.size:
+            break
+        frontier = np.concatenate([forest.left[internal], forest.right[internal]]).astype(np.intp)
+        depth += 1
+
+    old = np.flatnonzero(keep)
+    new_index = np.full(forest.n_nodes, -1, dtype=np.int64)
+    new_index[old] = np.arange(len(old))
+    leaf = is_leaf[old] | cut[old]
+    own = np.arange(len(old))
+    return FlatForest(
+        feature=np.where(leaf, 0, forest.feature[old]).astype(np.int32),
+        threshold=np.where(leaf, 0.0, forest.threshold[old]).astype(np.float64),
+        left=np.where(leaf, own, new_index[forest.left[old]]).astype(np.int32),
+        right=np.where(leaf, own, new_index[forest.right[old]]).astype(np.int32),
+        value=np.ascontiguousarray(forest.value[old], dtype=np.float64),
+        roots=new_index[roots].astype(np.int32),
+        max_depth=depth,
+        n_features=forest.n_features_in_,
+        classes=forest.classes_
+    )
+
+def order_trees(forest, X, y):
+    """Tree positions in ordered-aggregation order
+
+    Each step adds the tree that most lowers the squared error of the
+    averaged output (class probabilities against one-hot labels, or yield).
+    """
+    outputs = forest.value[forest.apply(X)]  # rows x trees x outputs
+    if forest.is_classifier:
+        target = (np.asarray(y)[:, None] == forest.classes_[None, :]).astype(np.float64)
+    else:
+        target = np.asarray(y, dtype=np.float64)[:, None]
+
+    total = np.zeros_like(target)
+    available = np.ones(forest.n_trees, dtype=bool)
+    order = []
+    for k in range(1, forest.n_trees + 1):
+        errors = (((total[:, None, :] + outputs) / k - target[:, None, :]) ** 2).mean(axis=(0, 2))
+        errors[~available] = np.inf
+        best = int(np.argmin(errors))
+        order.append(best)
+        available[best] = False
+        total += outputs[:, best, :]
+    return order
+
+def artifact_bytes(forest):
+    return int(sum(getattr(forest, name).nbytes for name in FOREST_ARRAYS))
+
+def holdout_score(forest, X, y):
+    predicted = forest.predict(X)
+    if forest.is_classifier:
+        return float(accuracy_score(y, predicted))
+    return float(r2_score(y, predicted))
+
+def describe(forest, X_test, y_test, kind):
+    """Size, latency and held-out score of a forest"""
+    started = time.perf_counter()
+    forest.predict(np.resize(X_test, (BATCH_ROWS, X_test.shape[1])))
+    batch_ms = (time.perf_counter() - started) * 1000
+    return {
+        'n_trees': forest.n_trees,
+        'n_nodes': forest.n_nodes,
+        'max_depth': forest.max_depth,
+        'artifact_bytes': artifact_bytes(forest),
+        'latency_ms': round(single_row_latency_ms(forest, X_test, kind), 4),
+        f'batch_{BATCH_ROWS}_ms': round(batch_ms, 3),
+        'score': holdout_score(forest, X_test, y_test)
+    }
+
+def candidate_forests(forest, X_train, y_train):
+    """(settings, forest) for every depth cap and tree count smaller than the original"""
+    depths = [None] + [d for d in DEPTH_CAPS if d < forest.max_depth]
+    counts = [c for c in TREE_COUNTS if c < forest.n_trees] + [forest.n_trees]
+    for depth in depths:
+        capped = forest if depth is None else prune_forest(forest, max_depth=depth)
+        order = order_trees(capped, X_train, y_train)
+        for count in counts:
+            if depth is None and count == forest.n_trees:
+                continue
+            yield {'max_depth': depth, 'n_trees': count}, prune_forest(capped, trees=order[:count])
+
+def _format(value):
+    return f'{value:.4f}' if isinstance(value, float) else str(value)
+
+def within_budget(stats, max_nodes=None, max_bytes=None, max_latency_ms=None):
+    return ((max_nodes is None or stats['n_nodes'] <= max_nodes)
+            and (max_bytes is None or stats['artifact_bytes'] <= max_bytes)
+            and (max_latency_ms is None or stats['latency_ms'] <= max_latency_ms))
+
+def compress(kind, max_loss=DEFAULT_MAX_LOSS, max_nodes=None, max_bytes=None, max_latency_ms=None,
+             export=True):
+    """Pick and (optionally) export the smallest forest within the budget, returns the report"""
+    print("=" * 60)
+    print(f"MODEL COMPRESSION: {kind.upper()} MODEL")
+    print("=" * 60)
+
+    pickle_path = 'crop_model.pkl' if kind == 'crop' else 'yield_model.pkl'
+    with open(pickle_path, 'rb') as f:
+        loaded = pickle.load(f)
+    model = loaded if kind == 'crop' else loaded['model']
+
+    X_train, X_test, y_train, y_test = load_search_data(kind)
+    X_train, X_test = X_train.to_numpy(np.float64), X_test.to_numpy(np.float64)
+    y_train, y_test = y_train.to_numpy(), y_test.to_numpy()
+
+    print("\n[1] Measuring the full forest...")
+    full = compile_forest(model)
+    before = describe(full, X_test, y_test, kind)
+    before['pickle_bytes'] = os.path.getsize(pickle_path)
+    print(f"{before['n_trees']} trees, {before['n_nodes']} nodes, {before['artifact_bytes'] / 1024:.0f} KB, "
+          f"{before['latency_ms']:.3f} ms/row, held-out score {before['score']:.4f}")
+
+    print("\n[2] Scoring pruned candidates on the held-out split...")
+    candidates = []
+    for settings, forest in candidate_forests(full, X_train, y_train):
+        stats = describe(forest, X_test, y_test, kind)
+        stats['depth_cap'] = settings['max_depth']
+        stats['loss'] = before['score'] - stats['score']
+        stats['feasible'] = stats['loss'] <= max_loss and within_budget(stats, max_nodes, max_bytes, max_latency_ms)
+        candidates.append((stats, forest))
+    print(f"{len(candidates)} candidates, {sum(s['feasible'] for s, _ in candidates)} within budget")
+
+    feasible = [(stats, forest) for stats, forest in candidates if stats['feasible']]
+    report = {
+        'model': kind,
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'metric': 'accuracy' if kind == 'crop' else 'r2',
+        'budget': {
+            'max_loss': max_loss,
+            'max_nodes': max_nodes,
+            'max_bytes': max_bytes,
+            'max_latency_ms': max_latency_ms
+        },
+        'before': before,
+        'after': None,
+        'candidates': [stats for stats, _ in candidates]
+    }
+    if not feasible:
+        print("\n✗ No candidate meets the budget within the allowed loss; artifacts left unchanged")
+        return report
+
+    stats, forest = min(feasible, key=lambda item: (item[0]['n_nodes'], -item[0]['score']))
+    report['after'] = stats
+    print("\n[3] Selected forest:")
+    for name in ['n_trees', 'n_nodes', 'max_depth', 'artifact_bytes', 'latency_ms', f'batch_{BATCH_ROWS}_ms', 'score']:
+        print(f"  {name:<18} {_format(before[name]):>12} -> {_format(stats[name])}")
+
+    if export:
+        print("\n[4] Exporting compressed artifacts...")
+        if kind == 'crop':
+            export_crop_model(forest)
+        else:
+            export_yield_model(dict(loaded, model=forest))
+        print(f"Warning: only the serving artifacts are compressed. {pickle_path} still holds the full forest, "
+              f"which the sklearn backend and the pickle fallback serve, and retraining or model_artifacts.py "
+              f"re-exports it. Re-run compress_model.py after either.")
+
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    path = os.path.join(ARTIFACTS_DIR, f'{kind}_{REPORT_NAME}')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to: {path}")
+    return report
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Compress a trained forest to a size or latency budget')
+    parser.add_argument('model', choices=['crop', 'yield'])
+    parser.add_argument('--max-loss', type=float, default=DEFAULT_MAX_LOSS,
+                        help='Largest allowed drop in held-out accuracy / R² (default: %(default)s)')
+    parser.add_argument('--max-nodes', type=int, help='Node budget')
+    parser.add_argument('--max-kb', type=float, help='Artifact size budget in KB')
+    parser.add_argument('--max-latency-ms', type=float, help='Single-row prediction budget in ms')
+    parser.add_argument('--dry-run', action='store_true', help='Write the report without exporting artifacts')
+    args = parser.parse_args()
+
+    os.chdir(MODELS_DIR)
+    report = compress(
+        args.model,
+        max_loss=args.max_loss,
+        max_nodes=args.max_nodes,
+        max_bytes=None if args.max_kb is None else int(args.max_kb * 1024),
+        max_latency_ms=args.max_latency_ms,
+        export=not args.dry_run
+    )
+    return 0 if report['after'] is not None else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
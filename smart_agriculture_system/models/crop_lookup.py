@@ -0,0 +1,316 @@
+"""
+Crop Recommendation Lookup Table
+Precomputes the crop forest's top-3 crops over a quantized grid of the seven
+soil and climate features, so recommendations for in-range inputs are a table
+lookup instead of a forest pass
+
+Lab soil tests and regional climate normals cluster tightly, so a coarse grid
+covers almost all real requests. Each feature's range in
+crop_recommendation.csv is cut into bins whose edges follow the forest's
+split thresholds on that feature, and every cell of the grid stores the
+forest's answer at the cell's centre. The forest is not constant over a cell,
+so the job also runs it at random points inside every cell and marks the cell
+stable only when its top crop is the same at all of them. Unstable cells and
+inputs outside the dataset's range are left to the live model. The job
+reports how often the table's answer differs from the forest's on the inputs
+it serves (the quantization error), and how many inputs it serves.
+
+Layout of the table directory (artifacts/crop_lookup/):
+    manifest.json      bin edges, crop classes, model content hash, quantization error
+    classes.npy        uint8 class indices of the top-3 crops, shape (cells, 3)
+    confidence.npy     uint16 confidences in hundredths of a percent, shape (cells, 3)
+    stable.npy         bool, whether the top crop held at every sampled point, shape (cells,)
+
+Usage:
+    python crop_lookup.py
+    python crop_lookup.py --bins 10 10 10 8 8 6 10
+"""
+
+import argparse
+import bisect
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from forest_engine import compile_forest
+from model_artifacts import (ARTIFACTS_DIR, CROP_ARTIFACT_DIR, MANIFEST_NAME, ArtifactError, content_version,
+                             load_crop_model)
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(os.path.dirname(MODELS_DIR), 'datasets', 'crop_recommendation.csv')
+LOOKUP_DIR = os.path.join(ARTIFACTS_DIR, 'crop_lookup')
+CLASSES_FILE = 'classes.npy'
+CONFIDENCE_FILE = 'confidence.npy'
+STABLE_FILE = 'stable.npy'
+LOOKUP_FORMAT_VERSION = 2
+
+# Crop-model features in order, with their dataset columns
+FEATURES = ['nitrogen', 'phosphorus', 'potassium', 'temperature', 'humidity', 'ph', 'rainfall']
+FEATURE_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+# About 1.6 million cells; pH gets fewer bins as it takes few distinct values in lab reports
+DEFAULT_BINS = [8, 8, 8, 8, 8, 6, 8]
+TOP_K = 3
+# Confidences are stored as integers in the response's precision (two decimals of a percent)
+CONFIDENCE_SCALE = 100
+# Random points per cell, besides the centre, that must agree on the top crop
+# for the cell to be served; more samples serve fewer cells, more accurately
+STABILITY_SAMPLES = 8
+EVALUATION_CHUNK = 200000
+ERROR_SAMPLES = 5000
+
+class CropLookupError(Exception):
+    """Raised when a lookup table is missing, incompatible or built from another model"""
+
+def bin_edges(model, frame, bins=DEFAULT_BINS):
+    """Bin edges for each feature: the dataset's range, cut at quantiles of the
+    forest's split thresholds on that feature
+    """
+    edges = []
+    for feature, (column, n) in enumerate(zip(FEATURE_COLUMNS, bins)):
+        low, high = float(frame[column].min()), float(frame[column].max())
+        thresholds = model.split_thresholds(feature)
+        interior = np.quantile(thresholds, np.linspace(0, 1, n + 1)[1:-1]) if len(thresholds) else []
+        edges.append(np.unique(np.clip(np.concatenate([[low, high], interior]), low, high)))
+    return edges
+
+def top_k(probabilities, k=TOP_K):
+    """Class indices and confidences of the k most likely crops per row, best first"""
+    indices = np.argsort(probabilities, axis=1)[:, ::-1][:, :k]
+    confidence = np.take_along_axis(probabilities, indices, axis=1)
+    return indices, np.rint(confidence * 100 * CONFIDENCE_SCALE)
+
+def evaluate_table(model, edges, samples=STABILITY_SAMPLES, chunk=EVALUATION_CHUNK, seed=42):
+    """Top-3 crops at the centre of every cell, in row-major cell order, and
+    whether the top crop is the same at `samples` random points in each cell
+    """
+    edges = [np.asarray(e, dtype=np.float64) for e in edges]
+    shape = tuple(len(e) - 1 for e in edges)
+    n_cells = int(np.prod(shape))
+    classes = np.empty((n_cells, TOP_K), dtype=np.uint8)
+    confidence = np.empty((n_cells, TOP_K), dtype=np.uint16)
+    stable = np.empty(n_cells, dtype=bool)
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_cells, chunk):
+        cells = np.arange(start, min(start + chunk, n_cells))
+        coordinates = np.unravel_index(cells, shape)
+        low = np.column_stack([edges[i][index] for i, index in enumerate(coordinates)])
+        high = np.column_stack([edges[i][index + 1] for i, index in enumerate(coordinates)])
+        classes[cells], confidence[cells] = top_k(model.predict_proba((low + high) / 2))
+        agrees = np.ones(len(cells), dtype=bool)
+        for _ in range(samples):
+            points = low + (high - low) * rng.random(low.shape)
+            agrees &= np.argmax(model.predict_proba(points), axis=1) == classes[cells, 0]
+        stable[cells] = agrees
+    return classes, confidence, stable
+
+class CropLookup:
+    """Memory-mapped top-3 table with constant-time lookups"""
+
+    def __init__(self, classes, confidence, stable, manifest):
+        self.classes = classes
+        self.confidence = confidence
+        self.stable = stable
+        self.manifest = manifest
+        self.crops = manifest['crops']
+        self.model_content = manifest['model_content']
+        self._edges = [list(map(float, e)) for e in manifest['bin_edges']]
+        self._shape = tuple(len(e) - 1 for e in self._edges)
+        # Row-major strides of the flattened cell index
+        self._strides = [int(np.prod(self._shape[i + 1:])) for i in range(len(self._shape))]
+
+    @classmethod
+    def load(cls, directory=LOOKUP_DIR, mmap=True):
+        path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            raise CropLookupError(f"No crop lookup table at {directory}") from None
+        if manifest.get('format_version') != LOOKUP_FORMAT_VERSION:
+            raise CropLookupError(f"Unsupported crop lookup format {manifest.get('format_version')} in {directory}")
+        mode = 'r' if mmap else None
+        classes = np.load(os.path.join(directory, CLASSES_FILE), mmap_mode=mode, allow_pickle=False)
+        confidence = np.load(os.path.join(directory, CONFIDENCE_FILE), mmap_mode=mode, allow_pickle=False)
+        stable = np.load(os.path.join(directory, STABLE_FILE), mmap_mode=mode, allow_pickle=False)
+        n_cells = int(np.prod([len(e) - 1 for e in manifest['bin_edges']]))
+        if (classes.shape != (n_cells, TOP_K) or confidence.shape != (n_cells, TOP_K)
+                or stable.shape != (n_cells,)):
+            raise CropLookupError(f"Lookup arrays in {directory} do not match their manifest")
+        return cls(classes, confidence, stable, manifest)
+
+    def cell(self, values):
+        """Flat cell index for one row of the seven features, or None when a value is outside the grid"""
+        index = 0
+        for edges, stride, value in zip(self._edges, self._strides, values):
+            value = float(value)
+            if not edges[0] <= value <= edges[-1]:
+                return None
+            # The top edge belongs to the last bin
+            index += min(bisect.bisect_right(edges, value), len(edges) - 1) * stride - stride
+        return index
+
+    def lookup(self, values):
+        """Top-3 recommendations as [{'crop', 'confidence'}], or None for an
+        out-of-grid row or an unstable cell
+        """
+        index = self.cell(values)
+        if index is None or not self.stable[index]:
+            return None
+        return self.recommendations(index)
+
+    def recommendations(self, index):
+        """Top-3 recommendations stored for one cell, stable or not"""
+        return [{'crop': self.crops[c], 'confidence': p / CONFIDENCE_SCALE}
+                for c, p in zip(self.classes[index].tolist(), self.confidence[index].tolist())]
+
+    def cells(self, points):
+        """Vectorized cell indices for an (n, 7) array; -1 for out-of-grid rows"""
+        points = np.asarray(points, dtype=np.float64)
+        index = np.zeros(len(points), dtype=np.int64)
+        inside = np.ones(len(points), dtype=bool)
+        for i, edges in enumerate(self._edges):
+            edges = np.asarray(edges)
+            inside &= (points[:, i] >= edges[0]) & (points[:, i] <= edges[-1])
+            position = np.clip(np.searchsorted(edges, points[:, i], side='right') - 1, 0, len(edges) - 2)
+            index += position * self._strides[i]
+        return np.where(inside, index, -1)
+
+def quantization_error(table, model, points):
+    """How the table's answers differ from the forest's on the rows it serves
+    (in-grid rows in stable cells), and the share of in-grid rows it serves
+    """
+    cells = table.cells(points)
+    points = points[cells >= 0]
+    cells = cells[cells >= 0]
+    served = np.asarray(table.stable[cells], dtype=bool)
+    in_grid = len(cells)
+    points = points[served]
+    cells = cells[served]
+    exact_classes, exact_confidence = top_k(model.predict_proba(points))
+    classes = table.classes[cells].astype(np.int64)
+    confidence = table.confidence[cells].astype(np.float64)
+    # Share of the forest's top 3 that the table's top 3 also contains
+    overlap = (classes[:, :, None] == exact_classes[:, None, :]).any(axis=1).mean(axis=1)
+    return {
+        'samples': in_grid,
+        'served': round(float(len(cells) / in_grid), 4) if in_grid else 0.0,
+        'top1_agreement': round(float((classes[:, 0] == exact_classes[:, 0]).mean()), 4),
+        'top3_overlap': round(float(overlap.mean()), 4),
+        # Percentage points, for the top crop
+        'mean_abs_confidence': round(float(np.abs(confidence[:, 0] - exact_confidence[:, 0]).mean())
+                                     / CONFIDENCE_SCALE, 2)
+    }
+
+def load_serving_crop_model(source):
+    """The crop forest as the app serves it, with the content hash it is known by"""
+    if source == 'artifacts':
+        try:
+            model = load_crop_model(CROP_ARTIFACT_DIR, mmap=False)
+        except ArtifactError as e:
+            raise CropLookupError(f"{e} (run model_artifacts.py, or use --source pickle)") from e
+        return model, content_version(os.path.join(CROP_ARTIFACT_DIR, MANIFEST_NAME))
+
+    path = os.path.join(MODELS_DIR, 'crop_model.pkl')
+    with open(path, 'rb') as f:
+        return compile_forest(pickle.load(f)), content_version(path)
+
+def build_table(bins=DEFAULT_BINS, source='artifacts', directory=LOOKUP_DIR):
+    """Evaluate, measure and write the lookup table; returns its manifest"""
+    print("=" * 60)
+    print("CROP RECOMMENDATION LOOKUP TABLE")
+    print("=" * 60)
+
+    # Deferred so that serving a built table does not load pandas
+    import pandas as pd
+
+    print("\n[1] Loading the crop model and dataset ranges...")
+    model, model_content = load_serving_crop_model(source)
+    crops = [str(c) for c in model.classes_]
+    if len(crops) > np.iinfo(np.uint8).max:
+        raise CropLookupError(f"{len(crops)} crop classes do not fit the table's uint8 class indices")
+    frame = pd.read_csv(DATASET_PATH, usecols=FEATURE_COLUMNS)
+    edges = bin_edges(model, frame, bins)
+    for feature, e in zip(FEATURES, edges):
+        print(f"  {feature:<12} {len(e) - 1:>3} bins, {e[0]:g} - {e[-1]:g}")
+
+    n_cells = int(np.prod([len(e) - 1 for e in edges]))
+    print(f"\n[2] Evaluating the forest on {n_cells} cells ({STABILITY_SAMPLES} stability samples each)...")
+    started = time.perf_counter()
+    classes, confidence, stable = evaluate_table(model, edges)
+    print(f"Done in {time.perf_counter() - started:.1f}s "
+          f"({(classes.nbytes + confidence.nbytes + stable.nbytes) / 1024 / 1024:.1f} MB), "
+          f"{stable.mean():.1%} of cells stable")
+
+    manifest = {
+        'format_version': LOOKUP_FORMAT_VERSION,
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'source': source,
+        'model_content': model_content,
+        'features': FEATURES,
+        'crops': crops,
+        'bin_edges': [e.tolist() for e in edges],
+        'stability_samples': STABILITY_SAMPLES
+    }
+
+    print("\n[3] Measuring quantization error against the forest...")
+    table = CropLookup(classes, confidence, stable, manifest)
+    rng = np.random.default_rng(42)
+    random_points = np.column_stack([rng.uniform(e[0], e[-1], ERROR_SAMPLES) for e in edges])
+    manifest['quantization_error'] = {
+        'dataset_rows': quantization_error(table, model, frame[FEATURE_COLUMNS].to_numpy(dtype=np.float64)),
+        'random_inputs': quantization_error(table, model, random_points)
+    }
+    for name, error in manifest['quantization_error'].items():
+        print(f"  {name:<14} {error['served']:.1%} served; top-1 agreement {error['top1_agreement']:.1%}, "
+              f"top-3 overlap {error['top3_overlap']:.1%}, "
+              f"top confidence off by {error['mean_abs_confidence']} points on average")
+
+    # Written beside the target and renamed into place, like the model artifacts
+    directory = os.path.abspath(directory)
+    staging = directory + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    np.save(os.path.join(staging, CLASSES_FILE), classes, allow_pickle=False)
+    np.save(os.path.join(staging, CONFIDENCE_FILE), confidence, allow_pickle=False)
+    np.save(os.path.join(staging, STABLE_FILE), stable, allow_pickle=False)
+    with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    if os.path.exists(directory):
+        retired = directory + '.old'
+        shutil.rmtree(retired, ignore_errors=True)
+        os.replace(directory, retired)
+        os.replace(staging, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.replace(staging, directory)
+    print(f"\n✓ Lookup table saved to: {directory}")
+    return manifest
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Precompute top-3 crop recommendations over a quantized input grid')
+    parser.add_argument('--bins', type=int, nargs=len(FEATURES), default=DEFAULT_BINS,
+                        metavar=('N', 'P', 'K', 'TEMP', 'HUMIDITY', 'PH', 'RAINFALL'),
+                        help='Bins per feature (default: %(default)s)')
+    parser.add_argument('--source', choices=['artifacts', 'pickle'], default='artifacts',
+                        help="Model to evaluate: the served artifacts (default) or crop_model.pkl, "
+                             "for AGRI_INFERENCE_BACKEND=sklearn")
+    args = parser.parse_args()
+    if min(args.bins) < 1:
+        parser.error('every feature needs at least 1 bin')
+
+    try:
+        build_table(args.bins, args.source)
+    except CropLookupError as e:
+        print(f"✗ {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
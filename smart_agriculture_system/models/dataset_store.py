@@ -0,0 +1,298 @@
+"""
+Columnar Dataset Store
+Converts the training CSVs once into typed Arrow files that training reads
+memory-mapped, one column at a time, instead of parsing and type-guessing the
+whole CSV on every run
+
+Each dataset is stored as an uncompressed Arrow IPC file next to its CSV
+(datasets/<name>.arrow). Numeric features are float32, which is what the
+forests train on anyway (the Yield target stays float64). Label columns
+(State, Crop, label) are dictionary-encoded with a sorted vocabulary, so they
+load as pandas categoricals whose codes match LabelEncoder's. Unlike Parquet,
+the file needs no decoding: loading maps it and touches only the pages of the
+requested columns.
+
+Conversion reads the CSV in blocks, twice: first to validate it, then to
+write it. Every schema column must be present, values must be non-missing and
+finite, and each numeric column must lie in its plausible range. Nothing is
+written when a check fails. The Arrow file records the size and modification
+time of the CSV it came from, and load_dataset() converts again when the CSV
+has changed.
+
+Usage:
+    python dataset_store.py                  # convert both datasets
+    python dataset_store.py yield
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASETS_DIR = os.path.join(os.path.dirname(MODELS_DIR), 'datasets')
+STORE_FORMAT_VERSION = 1
+METADATA_KEY = b'agri_dataset'
+# CSV bytes parsed per block while converting
+BLOCK_SIZE = 16 << 20
+
+DATASET_FILES = {'crop': 'crop_recommendation', 'yield': 'crop_yield'}
+# Columns in CSV order: (name, 'label' or (min, max)); None leaves a side open
+SCHEMAS = {
+    'crop': [
+        ('N', (0, 1000)),
+        ('P', (0, 1000)),
+        ('K', (0, 1000)),
+        ('temperature', (-20, 60)),
+        ('humidity', (0, 100)),
+        ('ph', (0, 14)),
+        ('rainfall', (0, 15000)),
+        ('label', 'label')
+    ],
+    'yield': [
+        ('State', 'label'),
+        ('Crop', 'label'),
+        ('Area', (0, None)),
+        ('Production', (0, None)),
+        ('Annual_Rainfall', (0, 15000)),
+        ('Fertilizer', (0, None)),
+        ('Pesticide', (0, None)),
+        ('Yield', (0, None))
+    ]
+}
+# Regression targets stay float64: the forest fits them in double precision,
+# and rounding them to float32 changes the trees it grows
+FLOAT64_COLUMNS = {'crop': [], 'yield': ['Yield']}
+
+class DatasetError(ValueError):
+    """Raised when a dataset is missing or fails schema or range validation"""
+
+def _check_kind(kind):
+    if kind not in SCHEMAS:
+        raise DatasetError(f"Unknown dataset '{kind}' (use 'crop' or 'yield')")
+
+def csv_path(kind):
+    _check_kind(kind)
+    return os.path.join(DATASETS_DIR, DATASET_FILES[kind] + '.csv')
+
+def columnar_path(kind):
+    _check_kind(kind)
+    return os.path.join(DATASETS_DIR, DATASET_FILES[kind] + '.arrow')
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+def _csv_batches(kind, source):
+    """Record batches of the schema columns, numerics parsed as float64 and labels trimmed"""
+    schema = SCHEMAS[kind]
+    column_types = {name: pa.string() if rule == 'label' else pa.float64() for name, rule in schema}
+    try:
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(block_size=BLOCK_SIZE),
+            convert_options=pa_csv.ConvertOptions(column_types=column_types,
+                                                  include_columns=[name for name, _ in schema]))
+    except (pa.ArrowInvalid, pa.ArrowKeyError) as e:
+        # A schema column missing from the header, or an unparseable first block
+        raise DatasetError(f"{os.path.basename(source)}: {e}") from e
+    while True:
+        try:
+            batch = reader.read_next_batch()
+        except StopIteration:
+            return
+        except pa.ArrowInvalid as e:
+            raise DatasetError(f"{os.path.basename(source)}: {e}") from e
+        yield {name: pc.utf8_trim_whitespace(batch.column(name)) if rule == 'label' else batch.column(name)
+               for name, rule in schema}
+
+def _first_row(mask, offset):
+    """CSV line number of the first flagged row (line 1 is the header)"""
+    return offset + int(np.flatnonzero(mask)[0]) + 2
+
+def validate_csv(kind, source=None):
+    """Check a CSV against the dataset schema
+
+    Returns the row count and the sorted vocabulary of every label column;
+    raises DatasetError listing every problem found.
+    """
+    _check_kind(kind)
+    source = source or csv_path(kind)
+    if not os.path.exists(source):
+        raise DatasetError(f"Dataset not found: {source}")
+
+    problems = {}  # (column, problem) -> [count, first line]
+    vocabularies = {name: set() for name, rule in SCHEMAS[kind] if rule == 'label'}
+    rows = 0
+
+    def flag(column, problem, mask):
+        count = int(mask.sum())
+        if count:
+            found = problems.setdefault((column, problem), [0, _first_row(mask, rows)])
+            found[0] += count
+
+    for columns in _csv_batches(kind, source):
+        for name, rule in SCHEMAS[kind]:
+            column = columns[name]
+            missing = column.is_null().to_numpy(zero_copy_only=False)
+            if rule == 'label':
+                empty = pc.equal(pc.utf8_length(column), 0).fill_null(False).to_numpy(zero_copy_only=False)
+                flag(name, 'missing values', missing | empty)
+                vocabularies[name].update(v for v in pc.unique(column.drop_null()).to_pylist() if v)
+                continue
+            values = column.to_numpy(zero_copy_only=False)
+            flag(name, 'missing values', missing)
+            present = ~missing
+            flag(name, 'non-finite values', present & ~np.isfinite(values))
+            low, high = rule
+            with np.errstate(invalid='ignore'):
+                if low is not None:
+                    flag(name, f'values below {low}', present & (values < low))
+                if high is not None:
+                    flag(name, f'values above {high}', present & (values > high))
+        rows += len(columns[SCHEMAS[kind][0][0]])
+
+    if problems:
+        details = '; '.join(f"{column}: {count} {problem} (first on line {line})"
+                            for (column, problem), (count, line) in problems.items())
+        raise DatasetError(f"{os.path.basename(source)} failed validation - {details}")
+    if rows == 0:
+        raise DatasetError(f"{os.path.basename(source)} has no rows")
+    return rows, {name: sorted(values) for name, values in vocabularies.items()}
+
+def arrow_schema(kind, vocabularies):
+    """Arrow schema of a converted dataset: float32 features, dictionary-encoded labels"""
+    fields = []
+    for name, rule in SCHEMAS[kind]:
+        if rule == 'label':
+            index_type = pa.int16() if len(vocabularies[name]) <= np.iinfo(np.int16).max else pa.int32()
+            fields.append(pa.field(name, pa.dictionary(index_type, pa.string()), nullable=False))
+        else:
+            float_type = pa.float64() if name in FLOAT64_COLUMNS[kind] else pa.float32()
+            fields.append(pa.field(name, float_type, nullable=False))
+    return pa.schema(fields)
+
+def convert_dataset(kind, source=None, destination=None):
+    """Validate a CSV and write it as a typed Arrow file; returns the stored metadata"""
+    source = source or csv_path(kind)
+    destination = destination or columnar_path(kind)
+    started = time.perf_counter()
+    rows, vocabularies = validate_csv(kind, source)
+
+    dictionaries = {name: pa.array(values, type=pa.string()) for name, values in vocabularies.items()}
+    metadata = {
+        'format_version': STORE_FORMAT_VERSION,
+        'dataset': kind,
+        'source': os.path.basename(source),
+        **_source_stamp(source),
+        'rows': rows,
+        'vocabularies': vocabularies
+    }
+    schema = arrow_schema(kind, vocabularies).with_metadata({METADATA_KEY: json.dumps(metadata)})
+
+    # Blocks are converted as they are parsed, so only the compact
+    # float32/int16 columns are held in memory
+    chunks = {field.name: [] for field in schema}
+    for columns in _csv_batches(kind, source):
+        for field in schema:
+            column = columns[field.name]
+            if field.name in dictionaries:
+                chunks[field.name].append(pc.index_in(column, value_set=dictionaries[field.name])
+                                          .cast(field.type.index_type))
+            else:
+                chunks[field.name].append(column.cast(field.type))
+
+    # One record batch: a column spread over several batches would have to
+    # be concatenated (copied) by every load instead of mapped as it is
+    arrays = []
+    for field in schema:
+        array = pa.concat_arrays(chunks.pop(field.name))
+        if field.name in dictionaries:
+            array = pa.DictionaryArray.from_arrays(array, dictionaries[field.name])
+        arrays.append(array)
+
+    # Written beside the target and renamed into place, so readers never see a partial file
+    staging = destination + '.tmp'
+    with pa.OSFile(staging, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+    os.replace(staging, destination)
+    metadata['seconds'] = round(time.perf_counter() - started, 3)
+    return metadata
+
+def read_metadata(path):
+    """Metadata stored in a converted dataset's schema, None when it is missing or unreadable"""
+    try:
+        schema = pa.ipc.open_file(pa.memory_map(path)).schema
+        metadata = json.loads(schema.metadata[METADATA_KEY])
+    except (OSError, pa.ArrowInvalid, KeyError, TypeError, ValueError):
+        return None
+    return metadata if metadata.get('format_version') == STORE_FORMAT_VERSION else None
+
+def is_current(kind):
+    """Whether the Arrow file exists and was converted from the CSV as it is now"""
+    metadata = read_metadata(columnar_path(kind))
+    if metadata is None:
+        return False
+    if not os.path.exists(csv_path(kind)):
+        # Only the converted file is kept
+        return True
+    stamp = _source_stamp(csv_path(kind))
+    return all(metadata.get(key) == value for key, value in stamp.items())
+
+def load_table(kind, columns=None, convert=True):
+    """The dataset as a memory-mapped Arrow table, converting the CSV first if needed"""
+    _check_kind(kind)
+    if not is_current(kind):
+        if not convert:
+            raise DatasetError(f"{columnar_path(kind)} is missing or out of date (run dataset_store.py)")
+        metadata = convert_dataset(kind)
+        print(f"✓ Converted {metadata['source']} to {os.path.basename(columnar_path(kind))} "
+              f"({metadata['rows']} rows, {metadata['seconds']:.1f}s)")
+    # Zero-copy: the table's buffers point into the mapping, and only the
+    # pages of the selected columns are ever read
+    table = pa.ipc.open_file(pa.memory_map(columnar_path(kind))).read_all()
+    if columns is not None:
+        missing = [name for name in columns if name not in table.column_names]
+        if missing:
+            raise DatasetError(f"Dataset '{kind}' has no column(s) {missing}")
+        table = table.select(columns)
+    return table
+
+def load_dataset(kind, columns=None, convert=True):
+    """The dataset as a DataFrame of the given columns (all by default)
+
+    Numeric columns share memory with the mapped file; label
+    columns are categoricals with sorted categories.
+    """
+    return load_table(kind, columns, convert).to_pandas(split_blocks=True)
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Validate the training CSVs and convert them to typed Arrow files')
+    parser.add_argument('datasets', nargs='*', metavar='{crop,yield}', help='Datasets to convert (default: both)')
+    args = parser.parse_args()
+    for kind in args.datasets:
+        if kind not in SCHEMAS:
+            parser.error(f"unknown dataset '{kind}'")
+
+    failed = False
+    for kind in args.datasets or sorted(SCHEMAS):
+        try:
+            metadata = convert_dataset(kind)
+        except DatasetError as e:
+            print(f"✗ {e}")
+            failed = True
+            continue
+        size = os.path.getsize(columnar_path(kind)) / 1024 / 1024
+        print(f"✓ {metadata['source']}: {metadata['rows']} rows validated and written to "
+              f"{os.path.basename(columnar_path(kind))} ({size:.1f} MB, {metadata['seconds']:.2f}s)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""
+Flat-Array Forest Inference Engine
+Exports trained scikit-learn random forests into contiguous NumPy node arrays
+and evaluates every tree at once with vectorized traversal
+
+Run this file directly to check that the compiled engine matches the pickled
+scikit-learn models:
+    python forest_engine.py
+"""
+
+import os
+import pickle
+import sys
+
+import numpy as np
+
+# Upper bound on rows x trees evaluated together, keeps temporaries small
+NODE_BATCH = 1 << 18
+# Below this many rows x trees, stepping every tree to full depth beats compacting
+SMALL_BATCH = 4096
+
+class FlatForest:
+    """Tree ensemble stored as flat node arrays
+
+    All trees share one set of arrays. ``roots`` holds the index of each
+    tree's root node, and leaves point back to themselves so a traversal
+    step on a finished tree is a no-op.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 n_features, classes=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.classes_ = classes
+
+        # scikit-learn compares float32 inputs against float64 thresholds;
+        # rounding thresholds down to float32 keeps that exact in float32
+        threshold32 = threshold.astype(np.float32)
+        rounded_up = threshold32.astype(np.float64) > threshold
+        threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+        self._threshold32 = threshold32
+        # children[2 * node + go_right] is the next node
+        self._children = np.stack([left, right], axis=1).ravel().astype(np.intp)
+        self._is_leaf = left == np.arange(len(left))
+        self._node_contributions = None
+
+    @property
+    def is_classifier(self):
+        return self.classes_ is not None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _check_input(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input with {self.n_features_in_} features, got shape {X.shape}")
+        # NaN compares false against every threshold, so it would silently walk left
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity")
+        return X
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_rows, n_trees)"""
+        X = self._check_input(X)
+        n_rows = len(X)
+        flat_X = X.ravel()
+        # Offset of each (row, tree) pair's row inside flat_X
+        row_base = np.repeat(np.arange(n_rows, dtype=np.intp) * self.n_features_in_, self.n_trees)
+        nodes = np.tile(self.roots.astype(np.intp), n_rows)
+
+        if nodes.size <= SMALL_BATCH:
+            # Few rows: step everything together, checking now and then for completion
+            for depth in range(self.max_depth):
+                go_right = flat_X[row_base + self.feature[nodes]] > self._threshold32[nodes]
+                nodes = self._children[2 * nodes + go_right]
+                if depth % 4 == 3 and self._is_leaf[nodes].all():
+                    break
+            return nodes.reshape(n_rows, self.n_trees)
+
+        # Many rows: drop (row, tree) pairs from the working set as they reach a leaf
+        active = np.arange(nodes.size)
+        current = nodes.copy()
+        while active.size:
+            go_right = flat_X[row_base + self.feature[current]] > self._threshold32[current]
+            current = self._children[2 * current + go_right]
+            nodes[active] = current
+            pending = ~self._is_leaf[current]
+            active = active[pending]
+            current = current[pending]
+            row_base = row_base[pending]
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def _mean_value(self, X):
+        X = self._check_input(X)
+        out = np.empty((len(X), self.value.shape[1]), dtype=np.float64)
+        step = max(1, NODE_BATCH // self.n_trees)
+        for start in range(0, len(X), step):
+            leaves = self.apply(X[start:start + step])
+            if leaves.size <= SMALL_BATCH:
+                out[start:start + step] = self.value[leaves].mean(axis=1)
+            else:
+                # Accumulate tree by tree to avoid a rows x trees x outputs temporary
+                total = np.zeros((len(leaves), self.value.shape[1]), dtype=np.float64)
+                for tree in range(self.n_trees):
+                    total += self.value[leaves[:, tree]]
+                out[start:start + step] = total / self.n_trees
+        return out
+
+    def predict_proba(self, X):
+        """Class probabilities averaged over trees (classifier only)"""
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._mean_value(X)
+
+    def predict(self, X):
+        """Class labels for a classifier, mean tree output for a regressor"""
+        if self.is_classifier:
+            return self.classes_[np.argmax(self._mean_value(X), axis=1)]
+        return self._mean_value(X)[:, 0]
+
+    def _path_contributions(self):
+        """Per node and feature, the change in node value summed over the splits
+        on that feature along the path from the root, shape (nodes, features, outputs)
+        """
+        if self._node_contributions is None:
+            table = np.zeros((self.n_nodes, self.n_features_in_, self.value.shape[1]), dtype=np.float64)
+            # One depth level at a time, so every parent is done before its children
+            level = self.roots.astype(np.intp)
+            while level.size:
+                level = level[~self._is_leaf[level]]
+                children = []
+                for child in (self.left[level].astype(np.intp), self.right[level].astype(np.intp)):
+                    table[child] = table[level]
+                    table[child, self.feature[level]] += self.value[child] - self.value[level]
+                    children.append(child)
+                level = np.concatenate(children)
+            self._node_contributions = table
+        return self._node_contributions
+
+    def contributions(self, X, outputs=None):
+        """Tree-path (Saabas) decomposition of each row's prediction into per-feature contributions
+
+        ``outputs`` picks the output explained for each row (a class index for
+        a classifier; the predicted class by default). Returns the mean tree
+        values (predict_proba, or the regression prediction as one column),
+        the explained outputs, the bias (the forest's mean value at its roots)
+        and the contributions, shape (n_rows, n_features). For every row,
+        bias + contributions.sum() equals the explained output's value.
+        """
+        X = self._check_input(X)
+        table = self._path_contributions()
+        n_rows, n_outputs = len(X), self.value.shape[1]
+        values = np.empty((n_rows, n_outputs), dtype=np.float64)
+        chosen = np.empty(n_rows, dtype=np.intp)
+        result = np.empty((n_rows, self.n_features_in_), dtype=np.float64)
+        step = max(1, NODE_BATCH // self.n_trees)
+        for start in range(0, n_rows, step):
+            leaves = self.apply(X[start:start + step])
+            total = np.zeros((len(leaves), n_outputs), dtype=np.float64)
+            for tree in range(self.n_trees):
+                total += self.value[leaves[:, tree]]
+            values[start:start + step] = total / self.n_trees
+            if outputs is not None:
+                chosen[start:start + step] = outputs[start:start + step]
+            elif self.is_classifier:
+                chosen[start:start + step] = np.argmax(total, axis=1)
+            else:
+                chosen[start:start + step] = 0
+            # Each tree's leaf already holds its whole path's contributions
+            index = chosen[start:start + step]
+            contribution = np.zeros((len(leaves), self.n_features_in_), dtype=np.float64)
+            for tree in range(self.n_trees):
+                contribution += table[leaves[:, tree], :, index]
+            result[start:start + step] = contribution / self.n_trees
+        bias = self.value[self.roots].mean(axis=0)[chosen]
+        return values, chosen, bias, result
+
+    def split_thresholds(self, feature):
+        """Sorted thresholds of every split on one feature, over all trees
+
+        Repeats are kept, so quantiles of the result follow how often the
+        forest splits around each value.
+        """
+        internal = self.left != np.arange(len(self.left))
+        return np.sort(self.threshold[internal & (self.feature == feature)])
+
+    def split_weights(self, feature):
+        """Distinct thresholds of the splits on one feature, with how much each moves the output
+
+        The weight of a threshold is the summed absolute difference between
+        the values of the two children, over every split at that threshold
+        in every tree (over all outputs, for a classifier).
+        """
+        nodes = np.flatnonzero((self.left != np.arange(len(self.left))) & (self.feature == feature))
+        values = self.value.reshape(self.n_nodes, -1)
+        change = np.abs(values[self.left[nodes]] - values[self.right[nodes]]).sum(axis=1)
+        thresholds, positions = np.unique(self.threshold[nodes], return_inverse=True)
+        return thresholds, np.bincount(positions, weights=change, minlength=len(thresholds))
+
+def compile_forest(model):
+    """Flatten a fitted RandomForestClassifier or RandomForestRegressor"""
+    classes = getattr(model, 'classes_', None)
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        node_ids = np.arange(n, dtype=np.int32)
+        is_leaf = tree.children_left == -1
+
+        # Leaves loop back to themselves; internal children are shifted to global indices
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left).astype(np.int32) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right).astype(np.int32) + offset)
+
+        if classes is not None:
+            counts = tree.value[:, 0, :]
+            totals = counts.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            values.append(counts / totals)
+        else:
+            values.append(tree.value[:, 0, :1])
+
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    return FlatForest(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        value=np.concatenate(values).astype(np.float64),
+        roots=np.asarray(roots, dtype=np.int32),
+        max_depth=max_depth,
+        n_features=model.n_features_in_,
+        classes=None if classes is None else np.asarray(classes),
+    )
+
+def check_parity(model, engine, X, atol=1e-9):
+    """Compare the compiled engine with scikit-learn on X, return the max abs difference"""
+    X = np.asarray(X, dtype=np.float64)
+    if engine.is_classifier:
+        expected = model.predict_proba(X)
+        actual = engine.predict_proba(X)
+        if not np.array_equal(model.predict(X), engine.predict(X)):
+            raise AssertionError("Predicted labels differ from scikit-learn")
+    else:
+        expected = model.predict(X)
+        actual = engine.predict(X)
+
+    diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    if diff > atol:
+        raise AssertionError(f"Max abs difference {diff:.3e} exceeds tolerance {atol:.0e}")
+    return diff
+
+def _parity_inputs(reference, n_random=2000, seed=42):
+    """Training-like rows plus random rows spread over the observed range"""
+    rng = np.random.default_rng(seed)
+    low, high = reference.min(axis=0), reference.max(axis=0)
+    span = np.where(high > low, high - low, 1.0)
+    random_rows = rng.uniform(low - 0.1 * span, high + 0.1 * span, size=(n_random, reference.shape[1]))
+    return np.vstack([reference, random_rows])
+
+def main():
+    """Check the compiled engine against both pickled models"""
+    import warnings
+    import pandas as pd
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    with open('crop_model.pkl', 'rb') as f:
+        crop_model = pickle.load(f)
+    with open('yield_model.pkl', 'rb') as f:
+        yield_model = pickle.load(f)['model']
+
+    crop_df = pd.read_csv('../datasets/crop_recommendation.csv')
+    crop_X = crop_df[['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']].to_numpy(np.float64)
+
+    yield_df = pd.read_csv('../datasets/crop_yield.csv')
+    yield_X = np.column_stack([
+        pd.Categorical(yield_df['State']).codes,
+        pd.Categorical(yield_df['Crop']).codes,
+        yield_df[['Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']].to_numpy(np.float64)
+    ])
+
+    failed = False
+    for name, model, reference in [('crop', crop_model, crop_X), ('yield', yield_model, yield_X)]:
+        engine = compile_forest(model)
+        X = _parity_inputs(reference)
+        try:
+            diff = check_parity(model, engine, X)
+            print(f"✓ {name} model: {engine.n_trees} trees, {engine.n_nodes} nodes, "
+                  f"{len(X)} rows, max abs difference {diff:.2e}")
+        except AssertionError as e:
+            print(f"✗ {name} model: {e}")
+            failed = True
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""
+Hyperparameter Search
+Cross-validated search over forest size, depth and leaf size for the crop and
+yield models, run on a process pool. Every (configuration, fold) result is
+cached on disk under a hash of the training data and parameters, so re-runs
+only fit what changed.
+
+The selected configuration is the fastest one whose mean CV score is within a
+tolerance of the best score, which always lies on the score/latency Pareto
+front (latencies within 10% are treated as equal, and the smaller forest
+wins). It is then trained with the regular training script, and a metrics
+report is written beside the model's artifact directory, which is replaced
+on every export.
+
+Usage:
+    python hyperparameter_search.py                       # search both models and retrain
+    python hyperparameter_search.py crop --workers 4 --tolerance 0.01
+    python hyperparameter_search.py yield --dry-run       # report only, keep the current model
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import accuracy_score, mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold, StratifiedKFold
+
+from dataset_store import load_dataset
+from forest_engine import compile_forest
+from model_artifacts import ARTIFACTS_DIR
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+SEARCH_CACHE_DIR = os.path.join(MODELS_DIR, 'search_cache')
+# Written as artifacts/<model>_training_report.json, outside the artifact directory
+REPORT_NAME = 'training_report.json'
+
+PARAM_GRID = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [8, 12, 20, None],
+    'min_samples_leaf': [1, 2, 4]
+}
+DEFAULT_FOLDS = 5
+DEFAULT_TOLERANCE = 0.005
+RANDOM_STATE = 42
+# Single-row predictions timed per fold model on the compiled engine: the
+# best median over several rounds, which is steadier than one long run
+LATENCY_ROUNDS = 5
+LATENCY_SAMPLES = 40
+# Latencies within 10% of each other count as equal; the smaller model wins the tie
+LATENCY_BAND = 1.10
+
+# Training data for the worker processes, set once per worker by _init_worker
+_worker_data = {}
+
+def load_search_data(kind):
+    """The training script's train/test split; the search only ever sees the training part"""
+    if kind == 'crop':
+        from train_crop_model import FEATURE_COLUMNS, split_crop_data
+        df = load_dataset('crop', FEATURE_COLUMNS + ['label'])
+        X_train, X_test, y_train, y_test = split_crop_data(df)
+    else:
+        from train_yield_model import DATASET_COLUMNS, encode_yield_data, split_yield_data
+        df = load_dataset('yield', DATASET_COLUMNS)
+        encode_yield_data(df)
+        X_train, X_test, y_train, y_test = split_yield_data(df)
+    return X_train, X_test, y_train, y_test
+
+def metric_name(kind):
+    return 'accuracy' if kind == 'crop' else 'r2'
+
+def data_fingerprint(X, y):
+    """sha256 over column names and values of the training data"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(X.columns)).encode('utf-8'))
+    digest.update(np.ascontiguousarray(X.to_numpy(np.float64)).tobytes())
+    digest.update(json.dumps([str(v) for v in y]).encode('utf-8'))
+    return digest.hexdigest()
+
+def fold_key(kind, data_hash, params, fold, n_folds):
+    """Cache key for one fold of one configuration"""
+    payload = json.dumps({
+        'kind': kind,
+        'data': data_hash,
+        'params': params,
+        'fold': fold,
+        'folds': n_folds,
+        'random_state': RANDOM_STATE,
+        'sklearn': sklearn.__version__
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def read_cached(kind, key):
+    path = os.path.join(SEARCH_CACHE_DIR, kind, f'{key}.json')
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def write_cached(kind, key, result):
+    directory = os.path.join(SEARCH_CACHE_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{key}.json')
+    # Write then rename, so an interrupted run never leaves a truncated entry
+    with open(path + '.tmp', 'w') as f:
+        json.dump(result, f)
+    os.replace(path + '.tmp', path)
+
+def fold_indices(kind, X, y, n_folds):
+    """Deterministic CV folds (stratified for the classifier)"""
+    if kind == 'crop':
+        splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE)
+    else:
+        splitter = KFold(n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE)
+    return list(splitter.split(X, y))
+
+def build_model(kind, params, n_jobs=1):
+    estimator = RandomForestClassifier if kind == 'crop' else RandomForestRegressor
+    return estimator(**params, random_state=RANDOM_STATE, n_jobs=n_jobs)
+
+def single_row_latency_ms(engine, X, kind):
+    """Time of one single-row prediction on the compiled engine, in ms"""
+    predict = engine.predict_proba if kind == 'crop' else engine.predict
+    rows = [X[i % len(X)][None, :] for i in range(LATENCY_SAMPLES)]
+    predict(rows[0])
+    medians = []
+    for _ in range(LATENCY_ROUNDS):
+        samples = []
+        for row in rows:
+            started = time.perf_counter()
+            predict(row)
+            samples.append(time.perf_counter() - started)
+        medians.append(np.median(samples))
+    return float(min(medians)) * 1000
+
+def _init_worker(X, y):
+    _worker_data['X'] = X
+    _worker_data['y'] = y
+
+def evaluate_fold(kind, params, train_index, test_index):
+    """Fit one configuration on one fold; runs in a worker process"""
+    X, y = _worker_data['X'], _worker_data['y']
+    model = build_model(kind, params)
+
+    started = time.perf_counter()
+    model.fit(X[train_index], y[train_index])
+    fit_seconds = time.perf_counter() - started
+
+    predicted = model.predict(X[test_index])
+    if kind == 'crop':
+        score = accuracy_score(y[test_index], predicted)
+    else:
+        score = r2_score(y[test_index], predicted)
+
+    engine = compile_forest(model)
+    return {
+        'score': float(score),
+        'latency_ms': single_row_latency_ms(engine, X[test_index], kind),
+        'n_nodes': engine.n_nodes,
+        'max_depth': engine.max_depth,
+        'fit_seconds': fit_seconds
+    }
+
+def parameter_grid(grid):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def run_search(kind, grid=PARAM_GRID, n_folds=DEFAULT_FOLDS, workers=None, use_cache=True):
+    """Score every configuration by CV, returns (candidates, cache counters, data hash)"""
+    X_train, _, y_train, _ = load_search_data(kind)
+    X = X_train.to_numpy(np.float64)
+    y = y_train.to_numpy()
+    data_hash = data_fingerprint(X_train, y_train)
+    folds = fold_indices(kind, X, y, n_folds)
+    configurations = parameter_grid(grid)
+
+    results = {}
+    pending = []
+    for c, params in enumerate(configurations):
+        for f in range(n_folds):
+            key = fold_key(kind, data_hash, params, f, n_folds)
+            cached = read_cached(kind, key) if use_cache else None
+            if cached is not None:
+                results[c, f] = cached
+            else:
+                pending.append((c, f, key))
+
+    print(f"  {len(configurations)} configurations x {n_folds} folds: "
+          f"{len(results)} cached, {len(pending)} to fit")
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y)) as pool:
+            futures = {
+                pool.submit(evaluate_fold, kind, configurations[c], *folds[f]): (c, f, key)
+                for c, f, key in pending
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                c, f, key = futures[future]
+                results[c, f] = future.result()
+                write_cached(kind, key, results[c, f])
+                if done % 20 == 0 or done == len(futures):
+                    print(f"  fitted {done}/{len(futures)}")
+
+    candidates = []
+    for c, params in enumerate(configurations):
+        folds_done = [results[c, f] for f in range(n_folds)]
+        scores = [r['score'] for r in folds_done]
+        candidates.append({
+            'params': params,
+            'score_mean': float(np.mean(scores)),
+            'score_std': float(np.std(scores)),
+            'latency_ms': float(np.mean([r['latency_ms'] for r in folds_done])),
+            'n_nodes': int(np.mean([r['n_nodes'] for r in folds_done])),
+            'fit_seconds': float(np.mean([r['fit_seconds'] for r in folds_done]))
+        })
+    cache = {'cached_folds': len(results) - len(pending), 'fitted_folds': len(pending)}
+    return candidates, cache, data_hash
+
+def inference_cost(candidate):
+    """Latency band, then node count: the cost axis of the Pareto front"""
+    return (round(math.log(candidate['latency_ms']) / math.log(LATENCY_BAND)), candidate['n_nodes'])
+
+def pareto_front(candidates):
+    """Candidates not beaten on both score (higher) and inference cost (lower) by another"""
+    front = []
+    for candidate in candidates:
+        cost = inference_cost(candidate)
+        dominated = any(
+            other['score_mean'] >= candidate['score_mean'] and inference_cost(other) <= cost
+            and (other['score_mean'] > candidate['score_mean'] or inference_cost(other) < cost)
+            for other in candidates
+        )
+        if not dominated:
+            front.append(candidate)
+    return sorted(front, key=inference_cost)
+
+def select_configuration(front, tolerance):
+    """Cheapest point on the front whose score is within tolerance of the best"""
+    best = max(c['score_mean'] for c in front)
+    eligible = [c for c in front if c['score_mean'] >= best - tolerance]
+    return min(eligible, key=lambda c: (inference_cost(c), -c['score_mean']))
+
+def holdout_metrics(kind, model):
+    """Scores of the trained model on the held-out test split"""
+    _, X_test, _, y_test = load_search_data(kind)
+    predicted = model.predict(X_test)
+    if kind == 'crop':
+        return {'accuracy': float(accuracy_score(y_test, predicted))}
+    mse = mean_squared_error(y_test, predicted)
+    return {
+        'r2': float(r2_score(y_test, predicted)),
+        'rmse': float(np.sqrt(mse)),
+        'mae': float(mean_absolute_error(y_test, predicted))
+    }
+
+def write_report(kind, report):
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    path = os.path.join(ARTIFACTS_DIR, f'{kind}_{REPORT_NAME}')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def search_and_train(kind, grid=PARAM_GRID, n_folds=DEFAULT_FOLDS, tolerance=DEFAULT_TOLERANCE,
+                     workers=None, use_cache=True, retrain=True):
+    """Run the search for one model, retrain with the selected parameters and write the report"""
+    print("=" * 60)
+    print(f"HYPERPARAMETER SEARCH: {kind.upper()} MODEL")
+    print("=" * 60)
+
+    started = time.perf_counter()
+    candidates, cache, data_hash = run_search(kind, grid, n_folds, workers, use_cache)
+    search_seconds = time.perf_counter() - started
+
+    front = pareto_front(candidates)
+    selected = select_configuration(front, tolerance)
+    front_ids = {id(c) for c in front}
+    metric = metric_name(kind)
+
+    print(f"\nPareto front ({metric} vs single-row latency):")
+    for candidate in front:
+        marker = '  <- selected' if candidate is selected else ''
+        print(f"  {metric} {candidate['score_mean']:.4f}  {candidate['latency_ms']:.3f} ms  "
+              f"{candidate['params']}{marker}")
+
+    report = {
+        'model': kind,
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'data_sha256': data_hash,
+        'metric': metric,
+        'cv_folds': n_folds,
+        'tolerance': tolerance,
+        'selection': (f'fastest Pareto configuration with mean CV {metric} within {tolerance} of the best; '
+                      f'latencies within {LATENCY_BAND - 1:.0%} are ties, won by the smaller forest'),
+        'search_seconds': round(search_seconds, 2),
+        'cache': cache,
+        'selected': selected,
+        'pareto_front': front,
+        'candidates': [dict(c, pareto=id(c) in front_ids) for c in candidates]
+    }
+
+    if retrain:
+        print()
+        if kind == 'crop':
+            from train_crop_model import train_crop_recommendation_model
+            model = train_crop_recommendation_model(selected['params'])
+        else:
+            from train_yield_model import train_yield_prediction_model
+            model = train_yield_prediction_model(selected['params'])['model']
+        report['holdout'] = holdout_metrics(kind, model)
+
+    path = write_report(kind, report)
+    print(f"\nReport saved to: {path}")
+    return report
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Cross-validated hyperparameter search for the forests')
+    parser.add_argument('models', nargs='*', metavar='{crop,yield}', help='Models to tune (default: both)')
+    parser.add_argument('--folds', type=int, default=DEFAULT_FOLDS, help='CV folds (default: %(default)s)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Score loss accepted for a faster model (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help='Refit every fold instead of reading cached results')
+    parser.add_argument('--dry-run', action='store_true', help='Write the report without retraining the model')
+    for name in PARAM_GRID:
+        parser.add_argument('--' + name.replace('_', '-'), help=f'Comma-separated values (default: {PARAM_GRID[name]})')
+    args = parser.parse_args()
+    unknown = set(args.models) - {'crop', 'yield'}
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(sorted(unknown))} (choose from 'crop', 'yield')")
+
+    grid = dict(PARAM_GRID)
+    for name in PARAM_GRID:
+        value = getattr(args, name)
+        if value:
+            grid[name] = [None if v.strip() == 'none' else int(v) for v in value.split(',')]
+
+    os.chdir(MODELS_DIR)
+    for kind in dict.fromkeys(args.models or ['crop', 'yield']):
+        search_and_train(kind, grid, args.folds, args.tolerance, args.workers,
+                         use_cache=not args.no_cache, retrain=not args.dry_run)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
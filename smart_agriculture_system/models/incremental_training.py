@@ -0,0 +1,334 @@
+"""
+Incremental Training
+Folds field observations appended through observation_store.py into the
+trained models, without retraining from scratch on every run
+
+An update runs once enough new rows have arrived (--min-rows) or once the new
+rows show drift: labels the model has never seen, a feature mean that moved
+more than DRIFT_SHIFT training standard deviations, or a score on the new rows
+more than DRIFT_DROP below the held-out score. Otherwise the run only reports.
+
+Update modes:
+    warm   keeps every existing tree and fits --add-trees new ones (warm_start)
+           on the training split plus all observations
+    full   refits the forest with its current settings on the same data
+    auto   warm, unless the observations bring new crop labels (or new
+           states/crop types for the yield encoders) or the forest would grow
+           past --max-trees; then full
+
+The pickled model is replaced atomically and the serving artifacts are
+re-exported. --publish also stores the result as a new registry version
+(model_registry.py) for activation or a shadow/A-B trial; an app serving
+models/ directly swaps the new models in on POST /api/models/reload (see
+--reload-url).
+
+Usage:
+    python incremental_training.py                          # both models, update if triggered
+    python incremental_training.py yield --min-rows 20 --reload-url http://127.0.0.1:5000/api/models/reload
+    python incremental_training.py crop --force --mode full --dry-run
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sys
+from datetime import datetime
+
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, r2_score
+
+from model_artifacts import export_crop_model, export_yield_model
+from observation_store import OBSERVED_AT, count_observations, load_base_dataset, read_observations
+from train_crop_model import FEATURE_COLUMNS as CROP_FEATURES, split_crop_data
+from train_yield_model import FEATURE_COLUMNS as YIELD_FEATURES, encode_yield_data, split_yield_data
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join(MODELS_DIR, 'incremental_state.json')
+MODEL_FILES = {'crop': 'crop_model.pkl', 'yield': 'yield_model.pkl'}
+
+DEFAULT_MIN_ROWS = 50
+DEFAULT_ADD_TREES = 20
+DEFAULT_MAX_TREES = 300
+# Drift is only judged once this many new rows are available
+DRIFT_MIN_ROWS = 10
+DRIFT_SHIFT = 0.5
+DRIFT_DROP = 0.05
+# Raw dataset columns compared for feature drift
+DRIFT_COLUMNS = {
+    'crop': ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall'],
+    'yield': ['Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+}
+
+def read_state():
+    """Rows already trained on and the last update, per model"""
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+def write_state(state):
+    staging = STATE_PATH + '.tmp'
+    with open(staging, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(staging, STATE_PATH)
+
+def load_model_data(kind):
+    """The pickled model as a yield-style dictionary (crop models get only 'model')"""
+    with open(MODEL_FILES[kind], 'rb') as f:
+        loaded = pickle.load(f)
+    return {'model': loaded} if kind == 'crop' else loaded
+
+def save_model_data(kind, model_data):
+    """Replace the pickle atomically and re-export the serving artifacts"""
+    path = MODEL_FILES[kind]
+    staging = path + '.tmp'
+    with open(staging, 'wb') as f:
+        pickle.dump(model_data['model'] if kind == 'crop' else model_data, f)
+    os.replace(staging, path)
+    if kind == 'crop':
+        return export_crop_model(model_data['model'])
+    return export_yield_model(model_data)
+
+def features_and_target(kind, df, model_data):
+    """Model inputs and target of dataset rows, encoded with the model's encoders"""
+    if kind == 'crop':
+        return df[CROP_FEATURES], df['label']
+    df = df.assign(
+        State_Encoded=model_data['state_encoder'].transform(df['State']),
+        Crop_Encoded=model_data['crop_encoder'].transform(df['Crop'])
+    )
+    return df[YIELD_FEATURES], df['Yield']
+
+def split_base(kind, base, model_data):
+    """The training script's train/test split of the base dataset"""
+    if kind == 'crop':
+        return split_crop_data(base)
+    X, _ = features_and_target(kind, base, model_data)
+    return split_yield_data(base.assign(State_Encoded=X['State_Encoded'], Crop_Encoded=X['Crop_Encoded']))
+
+def unseen_labels(kind, df, model_data):
+    """Labels in the rows that the model (or its encoders) does not know"""
+    if kind == 'crop':
+        known = {'label': set(model_data['model'].classes_)}
+    else:
+        known = {'State': set(model_data['state_encoder'].classes_),
+                 'Crop': set(model_data['crop_encoder'].classes_)}
+    return [f"{column} '{value}'" for column, labels in known.items()
+            for value in sorted(set(df[column]) - labels)]
+
+def score(kind, model, X, y):
+    """Accuracy (crop) or R² (yield), None when there are too few rows"""
+    if len(y) < 2:
+        return None
+    predicted = model.predict(X)
+    if kind == 'crop':
+        return float(accuracy_score(y, predicted))
+    return float(r2_score(y, predicted))
+
+def check_drift(kind, reference, new_rows, model_data, holdout_score):
+    """Compare new rows against the data the model was trained on"""
+    drift = {'rows': len(new_rows), 'unseen_labels': unseen_labels(kind, new_rows, model_data),
+             'feature_shift': {}, 'score': None, 'reasons': []}
+    if drift['unseen_labels']:
+        drift['reasons'].append(f"new labels: {', '.join(drift['unseen_labels'])}")
+    if len(new_rows) < DRIFT_MIN_ROWS:
+        return drift
+
+    columns = DRIFT_COLUMNS[kind]
+    scale = reference[columns].std().replace(0, 1.0)
+    shift = (new_rows[columns].mean() - reference[columns].mean()).abs() / scale
+    drift['feature_shift'] = {column: round(float(value), 4) for column, value in shift.items()}
+    for column, value in shift.items():
+        if value > DRIFT_SHIFT:
+            drift['reasons'].append(f"'{column}' mean moved {value:.2f} standard deviations")
+
+    if not drift['unseen_labels']:
+        X_new, y_new = features_and_target(kind, new_rows, model_data)
+        drift['score'] = score(kind, model_data['model'], X_new, y_new)
+        if drift['score'] is not None and holdout_score - drift['score'] > DRIFT_DROP:
+            drift['reasons'].append(
+                f"score on new rows {drift['score']:.3f} is {holdout_score - drift['score']:.3f} "
+                f"below the held-out {holdout_score:.3f}")
+    return drift
+
+def warm_start(model, X, y, add_trees):
+    """Fit add_trees more trees on X, y, keeping the existing ones"""
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + add_trees)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return model
+
+def refit(kind, model_data, base, observations):
+    """Full retrain on the base training split plus all observations
+
+    The yield encoders are refitted as well, since new states or crop types
+    change the codes of the existing ones.
+    """
+    updated = dict(model_data, model=clone(model_data['model']))
+    if kind == 'yield':
+        combined = pd.concat([base, observations], ignore_index=True)
+        updated['state_encoder'], updated['crop_encoder'] = encode_yield_data(combined)
+    X_train, _, y_train, _ = split_base(kind, base, updated)
+    X_new, y_new = features_and_target(kind, observations, updated)
+    updated['model'].fit(pd.concat([X_train, X_new]), pd.concat([y_train, y_new]))
+    return updated
+
+def update_model(kind, min_rows=DEFAULT_MIN_ROWS, mode='auto', add_trees=DEFAULT_ADD_TREES,
+                 max_trees=DEFAULT_MAX_TREES, force=False, save=True):
+    """Update one model from its stored observations if triggered, returns the run report"""
+    print("=" * 60)
+    print(f"INCREMENTAL TRAINING: {kind.upper()} MODEL")
+    print("=" * 60)
+
+    print("\n[1] Loading model and observations...")
+    model_data = load_model_data(kind)
+    model = model_data['model']
+    state = read_state()
+    trained_rows = state.get(kind, {}).get('rows_trained', 0)
+    observations = read_observations(kind).drop(columns=[OBSERVED_AT])
+    if trained_rows > len(observations):
+        print(f"Warning: state records {trained_rows} trained rows but only {len(observations)} are stored")
+        trained_rows = 0
+    new_rows = observations.iloc[trained_rows:]
+    print(f"Model: {model.n_estimators} trees")
+    print(f"Observations: {len(observations)} stored, {len(new_rows)} new since the last update")
+
+    print("\n[2] Checking for drift...")
+    base = load_base_dataset(kind)
+    _, X_test, _, y_test = split_base(kind, base, model_data)
+    holdout_before = score(kind, model, X_test, y_test)
+    reference = pd.concat([base, observations.iloc[:trained_rows]], ignore_index=True) if trained_rows else base
+    drift = check_drift(kind, reference, new_rows, model_data, holdout_before)
+    for reason in drift['reasons']:
+        print(f"  • {reason}")
+    if not drift['reasons']:
+        print("No drift detected" if len(new_rows) >= DRIFT_MIN_ROWS
+              else f"Too few new rows to judge drift (need {DRIFT_MIN_ROWS})")
+
+    report = {
+        'model': kind,
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'observations': len(observations),
+        'new_rows': len(new_rows),
+        'drift': drift,
+        'holdout_before': holdout_before,
+        'action': 'skipped'
+    }
+    triggers = []
+    if force:
+        triggers.append('forced')
+    if len(new_rows) and len(new_rows) >= min_rows:
+        triggers.append(f'{len(new_rows)} new rows (threshold {min_rows})')
+    if drift['reasons']:
+        triggers.append('drift')
+    if not triggers:
+        print(f"\nNo update needed: {len(new_rows)} new rows (threshold {min_rows}) and no drift")
+        return report
+
+    if mode in ('auto', 'warm'):
+        if drift['unseen_labels']:
+            blocker = 'the observations contain new labels'
+        elif model.n_estimators + add_trees > max_trees:
+            blocker = f'the forest would grow past {max_trees} trees'
+        else:
+            blocker = None
+        if blocker and mode == 'warm':
+            print(f"\nWarm start is not possible ({blocker}); falling back to a full retrain")
+        mode = 'full' if blocker else 'warm'
+
+    print(f"\n[3] Updating model ({mode}, triggered by: {'; '.join(triggers)})...")
+    if mode == 'warm':
+        X_train, _, y_train, _ = split_base(kind, base, model_data)
+        X_new, y_new = features_and_target(kind, observations, model_data)
+        warm_start(model, pd.concat([X_train, X_new]), pd.concat([y_train, y_new]), add_trees)
+        updated = model_data
+    else:
+        updated = refit(kind, model_data, base, observations)
+    print(f"Model now has {updated['model'].n_estimators} trees")
+
+    print("\n[4] Evaluating updated model...")
+    _, X_test, _, y_test = split_base(kind, base, updated)
+    holdout_after = score(kind, updated['model'], X_test, y_test)
+    X_new, y_new = features_and_target(kind, new_rows, updated)
+    new_rows_after = score(kind, updated['model'], X_new, y_new)
+    print(f"Held-out score: {holdout_before:.4f} -> {holdout_after:.4f}")
+    if new_rows_after is not None:
+        before = 'n/a' if drift['score'] is None else f"{drift['score']:.4f}"
+        print(f"Score on new rows: {before} -> {new_rows_after:.4f}")
+
+    report.update({
+        'action': mode,
+        'triggers': triggers,
+        'n_estimators': updated['model'].n_estimators,
+        'holdout_after': holdout_after,
+        'new_rows_score_after': new_rows_after
+    })
+    if not save:
+        print("\nDry run: model and artifacts left unchanged")
+        return report
+
+    print("\n[5] Saving model and exporting artifacts...")
+    manifest = save_model_data(kind, updated)
+    print(f"✓ {MODEL_FILES[kind]} replaced, artifacts exported ({manifest['n_nodes']} nodes)")
+    state[kind] = {'rows_trained': len(observations), 'last_update': report}
+    write_state(state)
+    return report
+
+def notify_reload(url):
+    """Ask a running app to swap in the new models"""
+    import requests
+
+    token = os.environ.get('AGRI_ADMIN_TOKEN')
+    try:
+        response = requests.post(url, headers={'X-Admin-Token': token} if token else {}, timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"✗ Reload request to {url} failed: {e}")
+        return False
+    print(f"✓ App reloaded models: {response.json().get('models')}")
+    return True
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Fold appended observations into the trained models')
+    parser.add_argument('models', nargs='*', metavar='{crop,yield}', help='Models to update (default: both)')
+    parser.add_argument('--min-rows', type=int, default=DEFAULT_MIN_ROWS,
+                        help='New rows that trigger an update without drift (default: %(default)s)')
+    parser.add_argument('--mode', choices=['auto', 'warm', 'full'], default='auto',
+                        help='Add trees (warm) or retrain (full) (default: %(default)s)')
+    parser.add_argument('--add-trees', type=int, default=DEFAULT_ADD_TREES,
+                        help='Trees added by a warm-start update (default: %(default)s)')
+    parser.add_argument('--max-trees', type=int, default=DEFAULT_MAX_TREES,
+                        help='Forest size above which auto mode retrains instead (default: %(default)s)')
+    parser.add_argument('--force', action='store_true', help='Update even if not triggered')
+    parser.add_argument('--dry-run', action='store_true', help='Report without saving the model')
+    parser.add_argument('--publish', action='store_true',
+                        help='Store the updated models as a new (inactive) registry version')
+    parser.add_argument('--reload-url', help='POST here after saving, e.g. http://127.0.0.1:5000/api/models/reload')
+    args = parser.parse_args()
+    unknown = set(args.models) - {'crop', 'yield'}
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(sorted(unknown))} (choose from 'crop', 'yield')")
+
+    os.chdir(MODELS_DIR)
+    updated = False
+    for kind in dict.fromkeys(args.models or ['crop', 'yield']):
+        if not count_observations(kind) and not args.force:
+            print(f"No stored observations for the {kind} model")
+            continue
+        report = update_model(kind, args.min_rows, args.mode, args.add_trees, args.max_trees,
+                              force=args.force, save=not args.dry_run)
+        updated = updated or (report['action'] != 'skipped' and not args.dry_run)
+
+    if updated and args.publish:
+        from model_registry import publish_version
+        version = publish_version(note='incremental update: ' + ', '.join(args.models or ['crop', 'yield']))
+        print(f"✓ Published {version}; activate it with: python model_registry.py activate {version}")
+    if updated and args.reload_url:
+        return 0 if notify_reload(args.reload_url) else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
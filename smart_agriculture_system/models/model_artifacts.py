@@ -0,0 +1,194 @@
+"""
+Model Artifact Format
+Stores compiled forests as raw .npy node arrays plus a JSON manifest, so the
+app can memory-map them instead of unpickling scikit-learn models
+
+Layout of one artifact directory:
+    manifest.json        format version, model kind, classes, vocabularies, array index
+    feature.npy          int32   split feature per node
+    threshold.npy        float64 split threshold per node
+    left.npy, right.npy  int32   child node indices (leaves point to themselves)
+    value.npy            float64 class probabilities or regression output per node
+    roots.npy            int32   root node of each tree
+
+Run this file directly to export artifacts from the existing pickled models:
+    python model_artifacts.py
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from forest_engine import FlatForest, compile_forest
+
+ARTIFACT_FORMAT_VERSION = 1
+FOREST_ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+MANIFEST_NAME = 'manifest.json'
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACTS_DIR = os.path.join(MODELS_DIR, 'artifacts')
+CROP_ARTIFACT_DIR = os.path.join(ARTIFACTS_DIR, 'crop')
+YIELD_ARTIFACT_DIR = os.path.join(ARTIFACTS_DIR, 'yield')
+
+class ArtifactError(Exception):
+    """Raised when an artifact directory is missing, incomplete or incompatible"""
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def content_version(path):
+    """Short content hash of a model file or artifact manifest, used as its version"""
+    return _sha256(path)[:12]
+
+def export_forest(forest, directory, metadata=None):
+    """Write a FlatForest (or a fitted sklearn forest) to an artifact directory
+
+    Files are written to a temporary sibling directory that is then renamed
+    into place, so readers never see a half-written artifact.
+    """
+    if not isinstance(forest, FlatForest):
+        forest = compile_forest(forest)
+
+    directory = os.path.abspath(directory)
+    staging = directory + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    arrays = {}
+    for name in FOREST_ARRAYS:
+        data = np.ascontiguousarray(getattr(forest, name))
+        filename = f'{name}.npy'
+        np.save(os.path.join(staging, filename), data, allow_pickle=False)
+        arrays[name] = {
+            'file': filename,
+            'dtype': str(data.dtype),
+            'shape': list(data.shape),
+            'sha256': _sha256(os.path.join(staging, filename))
+        }
+
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'kind': 'classifier' if forest.is_classifier else 'regressor',
+        'n_features': forest.n_features_in_,
+        'n_trees': forest.n_trees,
+        'n_nodes': forest.n_nodes,
+        'max_depth': forest.max_depth,
+        'classes': None if forest.classes_ is None else [str(c) for c in forest.classes_],
+        'arrays': arrays,
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'metadata': metadata or {}
+    }
+    with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the finished directory into place
+    if os.path.exists(directory):
+        retired = directory + '.old'
+        shutil.rmtree(retired, ignore_errors=True)
+        os.replace(directory, retired)
+        os.replace(staging, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.replace(staging, directory)
+    return manifest
+
+def read_manifest(directory):
+    """Read and check an artifact manifest"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ArtifactError(f"No artifact manifest at {path}") from None
+
+    if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ArtifactError(
+            f"Unsupported artifact format {manifest.get('format_version')} in {directory} "
+            f"(expected {ARTIFACT_FORMAT_VERSION})"
+        )
+    return manifest
+
+def load_forest(directory, mmap=True, verify=False):
+    """Load a FlatForest from an artifact directory
+
+    With ``mmap`` the node arrays are memory-mapped read-only, so every
+    process serving the same files shares one copy through the page cache.
+    ``verify`` re-hashes the files against the manifest (reads every page).
+    """
+    manifest = read_manifest(directory)
+    arrays = {}
+    for name in FOREST_ARRAYS:
+        entry = manifest['arrays'][name]
+        path = os.path.join(directory, entry['file'])
+        if verify and _sha256(path) != entry['sha256']:
+            raise ArtifactError(f"Checksum mismatch for {path}")
+
+        data = np.load(path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        if str(data.dtype) != entry['dtype'] or list(data.shape) != entry['shape']:
+            raise ArtifactError(f"{path} does not match its manifest entry")
+        arrays[name] = data
+
+    classes = manifest['classes']
+    forest = FlatForest(
+        max_depth=manifest['max_depth'],
+        n_features=manifest['n_features'],
+        classes=None if classes is None else np.asarray(classes, dtype=object),
+        **arrays
+    )
+    return forest, manifest
+
+def export_crop_model(model, directory=CROP_ARTIFACT_DIR):
+    """Export the crop recommendation forest"""
+    return export_forest(model, directory, metadata={
+        'feature_names': ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+    })
+
+def export_yield_model(model_data, directory=YIELD_ARTIFACT_DIR):
+    """Export the yield forest together with its State/Crop vocabularies"""
+    return export_forest(model_data['model'], directory, metadata={
+        'feature_names': list(model_data['feature_columns']),
+        'state_classes': [str(c) for c in model_data['state_encoder'].classes_],
+        'crop_classes': [str(c) for c in model_data['crop_encoder'].classes_]
+    })
+
+def load_crop_model(directory=CROP_ARTIFACT_DIR, mmap=True):
+    """Load the crop recommendation forest"""
+    forest, _ = load_forest(directory, mmap=mmap)
+    return forest
+
+def load_yield_model(directory=YIELD_ARTIFACT_DIR, mmap=True):
+    """Load the yield forest as a model dictionary with vocabularies instead of encoders"""
+    forest, manifest = load_forest(directory, mmap=mmap)
+    metadata = manifest['metadata']
+    return {
+        'model': forest,
+        'feature_columns': metadata['feature_names'],
+        'state_classes': metadata['state_classes'],
+        'crop_classes': metadata['crop_classes']
+    }
+
+def main():
+    """Export artifacts from the pickled models in this directory"""
+    os.chdir(MODELS_DIR)
+
+    with open('crop_model.pkl', 'rb') as f:
+        manifest = export_crop_model(pickle.load(f))
+    print(f"✓ Crop model exported to {CROP_ARTIFACT_DIR} ({manifest['n_nodes']} nodes)")
+
+    with open('yield_model.pkl', 'rb') as f:
+        manifest = export_yield_model(pickle.load(f))
+    print(f"✓ Yield model exported to {YIELD_ARTIFACT_DIR} ({manifest['n_nodes']} nodes)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Model Registry
+Numbered, immutable model versions and a manifest saying which version serves
+and which one (if any) runs beside it as a shadow or A/B candidate
+
+Layout:
+    registry/
+        registry.json          current, previous, candidate, mode, fraction, versions
+        v1/                    one version, laid out like the models/ directory
+            crop_model.pkl
+            yield_model.pkl
+            artifacts/crop/
+            artifacts/yield/
+            artifacts/yield_surface/   (if built)
+        v2/ ...
+
+A version is written to a staging directory and renamed into place, and
+registry.json is replaced atomically, so the app's workers (which watch
+registry.json) never see a half-published version.
+
+Usage:
+    python model_registry.py publish --note "weekly retrain"   # snapshot models/ as the next version
+    python model_registry.py activate v3
+    python model_registry.py candidate v4 --mode shadow
+    python model_registry.py candidate v4 --mode ab --fraction 0.1
+    python model_registry.py clear-candidate
+    python model_registry.py rollback
+    python model_registry.py list
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+
+from model_artifacts import MANIFEST_NAME, ArtifactError, content_version, read_manifest
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.environ.get('AGRI_MODEL_REGISTRY', os.path.join(MODELS_DIR, 'registry'))
+REGISTRY_FILE = 'registry.json'
+# Files copied from a models directory into a version
+VERSION_FILES = ['crop_model.pkl', 'yield_model.pkl']
+VERSION_ARTIFACTS = ['crop', 'yield']
+# Copied along when present (built by yield_surface.py and crop_lookup.py)
+OPTIONAL_ARTIFACTS = ['yield_surface', 'crop_lookup']
+CANDIDATE_MODES = ('shadow', 'ab')
+
+class RegistryError(Exception):
+    """Raised for unknown versions, incomplete sources or invalid settings"""
+
+def empty_registry():
+    return {'current': None, 'previous': None, 'candidate': None, 'mode': None, 'fraction': 0.0,
+            'versions': {}}
+
+def read_registry(directory=REGISTRY_DIR):
+    """The registry manifest, or None when nothing has been published"""
+    try:
+        with open(os.path.join(directory, REGISTRY_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_registry(registry, directory=REGISTRY_DIR):
+    """Replace the manifest atomically"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, REGISTRY_FILE)
+    staging = path + '.tmp'
+    with open(staging, 'w') as f:
+        json.dump(registry, f, indent=2)
+    os.replace(staging, path)
+
+def version_dir(version, directory=REGISTRY_DIR):
+    return os.path.join(directory, version)
+
+def _require(registry, version):
+    if registry is None or version not in registry['versions']:
+        raise RegistryError(f"Unknown model version '{version}'")
+
+def publish_version(source=MODELS_DIR, note='', activate=False, directory=REGISTRY_DIR):
+    """Copy the models and artifacts in ``source`` into the registry as the next version
+
+    The first version published becomes current; later ones only when
+    ``activate`` is set. Returns the new version name.
+    """
+    registry = read_registry(directory) or empty_registry()
+    number = max((int(name[1:]) for name in registry['versions']), default=0) + 1
+    version = f'v{number}'
+
+    staging = os.path.join(directory, f'.{version}.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(os.path.join(staging, 'artifacts'))
+    content = {}
+    try:
+        for name in VERSION_FILES:
+            shutil.copy2(os.path.join(source, name), os.path.join(staging, name))
+        for kind in VERSION_ARTIFACTS:
+            artifact = os.path.join(source, 'artifacts', kind)
+            read_manifest(artifact)
+            shutil.copytree(artifact, os.path.join(staging, 'artifacts', kind))
+            content[kind] = content_version(os.path.join(artifact, MANIFEST_NAME))
+        for kind in OPTIONAL_ARTIFACTS:
+            artifact = os.path.join(source, 'artifacts', kind)
+            if os.path.isdir(artifact):
+                shutil.copytree(artifact, os.path.join(staging, 'artifacts', kind))
+    except (OSError, ArtifactError) as e:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise RegistryError(f'Cannot publish from {source}: {e}') from e
+    os.replace(staging, version_dir(version, directory))
+
+    registry['versions'][version] = {
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'note': note,
+        'content': content
+    }
+    if activate or registry['current'] is None:
+        registry['previous'], registry['current'] = registry['current'], version
+    write_registry(registry, directory)
+    return version
+
+def activate_version(version, directory=REGISTRY_DIR):
+    """Make a version the one every request uses (the candidate is cleared if it was this one)"""
+    registry = read_registry(directory)
+    _require(registry, version)
+    if registry['current'] != version:
+        registry['previous'], registry['current'] = registry['current'], version
+    if registry['candidate'] == version:
+        registry.update(candidate=None, mode=None, fraction=0.0)
+    write_registry(registry, directory)
+    return registry
+
+def rollback(directory=REGISTRY_DIR):
+    """Re-activate the previously current version"""
+    registry = read_registry(directory)
+    if registry is None or not registry.get('previous'):
+        raise RegistryError('No previous version to roll back to')
+    return activate_version(registry['previous'], directory)
+
+def set_candidate(version, mode='shadow', fraction=0.0, directory=REGISTRY_DIR):
+    """Serve a second version beside the current one
+
+    In 'shadow' mode every prediction is repeated on the candidate in the
+    background and only compared; in 'ab' mode the given fraction of clients
+    is answered by the candidate.
+    """
+    registry = read_registry(directory)
+    _require(registry, version)
+    if mode not in CANDIDATE_MODES:
+        raise RegistryError(f"Unknown candidate mode '{mode}' (use 'shadow' or 'ab')")
+    if not 0.0 <= fraction <= 1.0:
+        raise RegistryError('fraction must be between 0 and 1')
+    if version == registry['current']:
+        raise RegistryError(f"'{version}' is already the current version")
+    registry.update(candidate=version, mode=mode, fraction=fraction if mode == 'ab' else 0.0)
+    write_registry(registry, directory)
+    return registry
+
+def clear_candidate(directory=REGISTRY_DIR):
+    registry = read_registry(directory)
+    if registry is None:
+        raise RegistryError('Nothing has been published yet')
+    registry.update(candidate=None, mode=None, fraction=0.0)
+    write_registry(registry, directory)
+    return registry
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Publish and activate model versions')
+    commands = parser.add_subparsers(dest='command', required=True)
+    publish = commands.add_parser('publish', help='Copy the models in models/ into the registry as a new version')
+    publish.add_argument('--note', default='', help='Free-text description of the version')
+    publish.add_argument('--source', default=MODELS_DIR, help='Directory holding the .pkl files and artifacts/')
+    publish.add_argument('--activate', action='store_true', help='Make the new version current')
+    activate = commands.add_parser('activate', help='Make a version current')
+    activate.add_argument('version')
+    candidate = commands.add_parser('candidate', help='Serve a version beside the current one')
+    candidate.add_argument('version')
+    candidate.add_argument('--mode', choices=CANDIDATE_MODES, default='shadow')
+    candidate.add_argument('--fraction', type=float, default=0.1,
+                           help="Share of clients answered by the candidate in 'ab' mode (default: %(default)s)")
+    commands.add_parser('clear-candidate', help='Stop serving the candidate')
+    commands.add_parser('rollback', help='Re-activate the previous version')
+    commands.add_parser('list', help='Show all versions')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'publish':
+            version = publish_version(args.source, args.note, args.activate)
+            print(f"✓ Published {version}")
+        elif args.command == 'activate':
+            activate_version(args.version)
+            print(f"✓ {args.version} is now current")
+        elif args.command == 'candidate':
+            set_candidate(args.version, args.mode, args.fraction)
+            print(f"✓ {args.version} is now the {args.mode} candidate")
+        elif args.command == 'clear-candidate':
+            clear_candidate()
+            print("✓ Candidate cleared")
+        elif args.command == 'rollback':
+            registry = rollback()
+            print(f"✓ Rolled back to {registry['current']}")
+    except RegistryError as e:
+        print(f"✗ {e}")
+        return 1
+
+    registry = read_registry() or empty_registry()
+    for version, info in sorted(registry['versions'].items(), key=lambda item: int(item[0][1:])):
+        role = ''
+        if version == registry['current']:
+            role = 'current'
+        elif version == registry['candidate']:
+            role = f"candidate ({registry['mode']}" + (f", {registry['fraction']:.0%})" if registry['mode'] == 'ab' else ')')
+        print(f"  {version:<6} {info['created']}  {role:<22} {info['note']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Observation Store
+Append-only columnar store for newly collected, labeled field observations,
+kept next to the base CSVs instead of rewriting them
+
+Each append writes one Parquet file under datasets/observations/<model>/.
+File names start with the UTC time of the append, so listing them in name
+order gives arrival order. Files are written under a temporary name and
+renamed into place, so readers never see a partial file.
+"""
+
+import os
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import load_dataset
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASETS_DIR = os.path.join(os.path.dirname(MODELS_DIR), 'datasets')
+OBSERVATIONS_DIR = os.environ.get('AGRI_OBSERVATIONS_DIR', os.path.join(DATASETS_DIR, 'observations'))
+
+# Columns of each dataset, in CSV order: numeric columns are stored as float64
+NUMERIC_COLUMNS = {
+    'crop': ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall'],
+    'yield': ['Area', 'Production', 'Annual_Rainfall', 'Fertilizer', 'Pesticide', 'Yield']
+}
+LABEL_COLUMNS = {
+    'crop': ['label'],
+    'yield': ['State', 'Crop']
+}
+COLUMN_ORDER = {
+    'crop': ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall', 'label'],
+    'yield': ['State', 'Crop', 'Area', 'Production', 'Annual_Rainfall', 'Fertilizer', 'Pesticide', 'Yield']
+}
+# API field names (lower-cased) accepted in place of the dataset column names
+FIELD_ALIASES = {
+    'crop': {'n': 'N', 'p': 'P', 'k': 'K', 'nitrogen': 'N', 'phosphorus': 'P', 'potassium': 'K',
+             'crop': 'label'},
+    'yield': {'state': 'State', 'crop': 'Crop', 'area': 'Area', 'production': 'Production',
+              'rainfall': 'Annual_Rainfall', 'annual_rainfall': 'Annual_Rainfall',
+              'fertilizer': 'Fertilizer', 'pesticide': 'Pesticide', 'yield': 'Yield'}
+}
+OBSERVED_AT = 'observed_at'
+
+class ObservationError(ValueError):
+    """Raised when observations cannot be stored or read"""
+
+def _check_kind(kind):
+    if kind not in COLUMN_ORDER:
+        raise ObservationError(f"Unknown dataset '{kind}' (use 'crop' or 'yield')")
+
+def normalize_observations(kind, rows):
+    """Validate labeled rows and build a typed frame
+
+    Returns the frame of valid rows and a dict of per-row error messages
+    keyed by input position. A yield row without Production gets
+    Yield x Area.
+    """
+    _check_kind(kind)
+    aliases = FIELD_ALIASES[kind]
+    records = []
+    errors = {}
+
+    for row_index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[row_index] = 'Row must be an object with named fields'
+            continue
+
+        normalized = {}
+        for key, value in row.items():
+            key = str(key).strip()
+            normalized[aliases.get(key.lower(), key)] = value
+        if kind == 'yield' and normalized.get('Production') in (None, ''):
+            try:
+                normalized['Production'] = float(normalized['Yield']) * float(normalized['Area'])
+            except (KeyError, TypeError, ValueError):
+                pass  # reported below as a missing or invalid Yield/Area
+
+        record = {}
+        for name in COLUMN_ORDER[kind]:
+            value = normalized.get(name)
+            if value is None or str(value).strip() == '':
+                errors[row_index] = f"Missing field '{name}'"
+                break
+            if name in LABEL_COLUMNS[kind]:
+                # Crop labels are lower case in the dataset, states and crop types title case
+                record[name] = str(value).strip().lower() if name == 'label' else str(value).strip()
+                continue
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                number = np.nan
+            if not np.isfinite(number):
+                errors[row_index] = f"Invalid value for '{name}': {value!r}"
+                break
+            record[name] = number
+        else:
+            records.append(record)
+
+    frame = pd.DataFrame.from_records(records, columns=COLUMN_ORDER[kind])
+    return frame.astype({name: np.float64 for name in NUMERIC_COLUMNS[kind]}), errors
+
+def observation_files(kind):
+    """Parquet files of one dataset, oldest first"""
+    _check_kind(kind)
+    directory = os.path.join(OBSERVATIONS_DIR, kind)
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith('.parquet')]
+
+def append_observations(kind, rows):
+    """Validate rows and append the valid ones as a new Parquet file
+
+    Returns the number of rows stored, the per-row errors and the new file
+    (None when no row was valid).
+    """
+    frame, errors = normalize_observations(kind, rows)
+    if frame.empty:
+        return 0, errors, None
+
+    now = datetime.now(timezone.utc)
+    frame[OBSERVED_AT] = pd.Timestamp(now)
+    directory = os.path.join(OBSERVATIONS_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{now.strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet"
+    path = os.path.join(directory, name)
+    staging = os.path.join(directory, f'.{name}.tmp')
+    try:
+        frame.to_parquet(staging, index=False)
+    except ImportError as e:
+        raise ObservationError(f'Parquet support is not installed ({e})') from e
+    os.replace(staging, path)
+    return len(frame), errors, path
+
+def read_observations(kind, columns=None):
+    """All stored observations of one dataset in arrival order"""
+    files = observation_files(kind)
+    if not files:
+        frame = pd.DataFrame(columns=COLUMN_ORDER[kind] + [OBSERVED_AT])
+        frame = frame.astype({name: np.float64 for name in NUMERIC_COLUMNS[kind]})
+        return frame if columns is None else frame[columns]
+    try:
+        frames = [pd.read_parquet(path, columns=columns) for path in files]
+    except ImportError as e:
+        raise ObservationError(f'Parquet support is not installed ({e})') from e
+    return pd.concat(frames, ignore_index=True)
+
+def count_observations(kind):
+    """Number of stored rows, read from the Parquet footers only"""
+    files = observation_files(kind)
+    if not files:
+        return 0
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ObservationError(f'Parquet support is not installed ({e})') from e
+    return sum(pq.ParquetFile(path).metadata.num_rows for path in files)
+
+def load_base_dataset(kind):
+    """The original dataset, memory-mapped from its typed Arrow copy (see dataset_store.py)"""
+    _check_kind(kind)
+    return load_dataset(kind, COLUMN_ORDER[kind])
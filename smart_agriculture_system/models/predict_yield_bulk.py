@@ -0,0 +1,123 @@
+"""
+Bulk Crop Yield Prediction
+Streams yield predictions for large district-level CSV files chunk by chunk,
+so memory use stays flat regardless of the number of input rows
+"""
+
+import argparse
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+from category_lookup import add_category_lookups
+
+# Input columns, named as in datasets/crop_yield.csv
+INPUT_COLUMNS = ['State', 'Crop', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+NUMERIC_COLUMNS = ['Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+DEFAULT_CHUNK_SIZE = 50000
+
+def encode_categories(values, options):
+    """Map labels to codes in one vectorized lookup; unknown labels become -1
+
+    ``options`` is the sorted vocabulary, so a label's position is its code.
+    """
+    return pd.Categorical(values, categories=options).codes
+
+def predict_yield_chunks(source, model_data, chunksize=DEFAULT_CHUNK_SIZE):
+    """Read a yield CSV in fixed-size chunks and return a generator of result DataFrames
+
+    The CSV header is validated before the generator is returned, so a bad
+    file fails before any output has been written.
+    """
+    reader = pd.read_csv(
+        source,
+        usecols=INPUT_COLUMNS,
+        dtype={'State': str, 'Crop': str},
+        chunksize=chunksize
+    )
+    return _predict_chunks(reader, model_data)
+
+def _predict_chunks(reader, model_data):
+    model = model_data['model']
+    state_options = model_data['state_options']
+    crop_options = model_data['crop_options']
+    row_offset = 0
+
+    with reader:
+        for chunk in reader:
+            n_rows = len(chunk)
+
+            state_codes = encode_categories(chunk['State'], state_options)
+            crop_codes = encode_categories(chunk['Crop'], crop_options)
+            numeric = chunk[NUMERIC_COLUMNS].apply(pd.to_numeric, errors='coerce').to_numpy(np.float64)
+
+            # Per-row validation, reported in the same order as the input
+            error = np.full(n_rows, None, dtype=object)
+            bad_numeric = ~np.isfinite(numeric).all(axis=1)
+            error[bad_numeric] = 'Invalid numeric value'
+            error[crop_codes < 0] = 'Unknown crop'
+            error[state_codes < 0] = 'Unknown state'
+            valid = (state_codes >= 0) & (crop_codes >= 0) & ~bad_numeric
+
+            predicted_yield = np.full(n_rows, np.nan)
+            if valid.any():
+                features = np.column_stack([state_codes, crop_codes, numeric])[valid]
+                predicted_yield[valid] = model.predict(features)
+
+            result = chunk[INPUT_COLUMNS].copy()
+            result.insert(0, 'row', np.arange(row_offset, row_offset + n_rows))
+            result['Predicted_Yield'] = predicted_yield.round(2)
+            result['Predicted_Production'] = (predicted_yield * numeric[:, 0]).round(2)
+            result['error'] = error
+            row_offset += n_rows
+
+            yield result
+
+def iter_ndjson(chunks):
+    """Serialize result chunks as newline-delimited JSON"""
+    for result in chunks:
+        text = result.to_json(orient='records', lines=True, force_ascii=False)
+        yield text if text.endswith('\n') else text + '\n'
+
+def iter_csv(chunks):
+    """Serialize result chunks as CSV, writing the header once"""
+    header = True
+    for result in chunks:
+        yield result.to_csv(index=False, header=header)
+        header = False
+
+SERIALIZERS = {
+    'ndjson': iter_ndjson,
+    'csv': iter_csv
+}
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Stream yield predictions for a large CSV file')
+    parser.add_argument('input', help="Input CSV with columns: " + ', '.join(INPUT_COLUMNS))
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    parser.add_argument('--format', choices=sorted(SERIALIZERS), default='ndjson',
+                        help='Output format (default: ndjson)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'Rows per chunk (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--model', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yield_model.pkl'),
+                        help='Path to the trained yield model')
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        model_data = add_category_lookups(pickle.load(f))
+
+    chunks = predict_yield_chunks(args.input, model_data, chunksize=args.chunksize)
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for piece in SERIALIZERS[args.format](chunks):
+            out.write(piece)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
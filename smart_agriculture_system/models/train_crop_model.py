@@ -11,8 +11,23 @@ from sklearn.metrics import accuracy_score, classification_report
 import pickle
 import os
 
-def train_crop_recommendation_model():
+from dataset_store import load_dataset
+from forest_engine import compile_forest, check_parity
+from model_artifacts import export_crop_model
+
+FEATURE_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+# Forest settings used when no tuned parameters are given (see hyperparameter_search.py)
+DEFAULT_PARAMS = {'n_estimators': 100, 'max_depth': 20, 'min_samples_leaf': 1}
+
+def split_crop_data(df):
+    """Train/test split shared by training and the hyperparameter search"""
+    X = df[FEATURE_COLUMNS]
+    y = df['label']
+    return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+def train_crop_recommendation_model(params=None):
     """Train and save the crop recommendation model"""
+    params = {**DEFAULT_PARAMS, **(params or {})}
     
     print("=" * 60)
     print("CROP RECOMMENDATION MODEL TRAINING")
@@ -20,14 +35,14 @@ def train_crop_recommendation_model():
     
     # Load dataset
     print("\n[1] Loading dataset...")
-    df = pd.read_csv('../datasets/crop_recommendation.csv')
+    df = load_dataset('crop', FEATURE_COLUMNS + ['label'])
     print(f"Dataset loaded: {df.shape[0]} rows, {df.shape[1]} columns")
-    print(f"Crops in dataset: {df['label'].unique()}")
+    print(f"Crops in dataset: {list(df['label'].cat.categories)}")
     print(f"Number of unique crops: {df['label'].nunique()}")
     
     # Prepare features and target
     print("\n[2] Preparing features and target...")
-    X = df[['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']]
+    X = df[FEATURE_COLUMNS]
     y = df['label']
     
     print(f"Features shape: {X.shape}")
@@ -35,17 +50,15 @@ def train_crop_recommendation_model():
     
     # Split data
     print("\n[3] Splitting data into train and test sets...")
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
+    X_train, X_test, y_train, y_test = split_crop_data(df)
     print(f"Training set: {X_train.shape[0]} samples")
     print(f"Testing set: {X_test.shape[0]} samples")
     
     # Train model
     print("\n[4] Training Random Forest Classifier...")
+    print(f"Parameters: {params}")
     model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=20,
+        **params,
         random_state=42,
         n_jobs=-1
     )
@@ -80,6 +93,14 @@ def train_crop_recommendation_model():
     print(f"Sample input: N=90, P=42, K=43, Temp=20.87, Humidity=82, pH=6.5, Rainfall=202.93")
     print(f"Predicted crop: {prediction[0]}")
     
+    # Export memory-mappable artifacts for the app
+    print("\n[9] Exporting inference artifacts...")
+    engine = compile_forest(model)
+    diff = check_parity(model, engine, X_test.to_numpy())
+    print(f"Compiled engine matches scikit-learn (max abs difference: {diff:.2e})")
+    manifest = export_crop_model(model)
+    print(f"Artifacts saved: {manifest['n_trees']} trees, {manifest['n_nodes']} nodes")
+    
     print("\n" + "=" * 60)
     print("MODEL TRAINING COMPLETED SUCCESSFULLY!")
     print("=" * 60)
@@ -12,8 +12,47 @@ from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import pickle
 import os
 
-def train_yield_prediction_model():
+from dataset_store import load_dataset
+from forest_engine import compile_forest, check_parity
+from model_artifacts import export_yield_model
+
+FEATURE_COLUMNS = ['State_Encoded', 'Crop_Encoded', 'Area', 'Annual_Rainfall',
+                   'Fertilizer', 'Pesticide']
+# Dataset columns training reads (Production is not used)
+DATASET_COLUMNS = ['State', 'Crop', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide', 'Yield']
+# Forest settings used when no tuned parameters are given (see hyperparameter_search.py)
+DEFAULT_PARAMS = {'n_estimators': 100, 'max_depth': 20, 'min_samples_leaf': 1}
+
+def _fit_label_encoder(column):
+    """A LabelEncoder fitted on a column, with the column's codes
+
+    Categorical columns (as loaded by dataset_store.py) are encoded from their
+    categories, skipping LabelEncoder's sort of every value.
+    """
+    encoder = LabelEncoder()
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return encoder, encoder.fit_transform(column)
+    column = column.cat.remove_unused_categories()
+    categories = sorted(column.cat.categories)
+    column = column.cat.reorder_categories(categories)
+    encoder.classes_ = np.array(categories, dtype=object)
+    return encoder, column.cat.codes.to_numpy(np.int64)
+
+def encode_yield_data(df):
+    """Add State_Encoded/Crop_Encoded columns, returns the two fitted encoders"""
+    le_state, df['State_Encoded'] = _fit_label_encoder(df['State'])
+    le_crop, df['Crop_Encoded'] = _fit_label_encoder(df['Crop'])
+    return le_state, le_crop
+
+def split_yield_data(df):
+    """Train/test split shared by training and the hyperparameter search"""
+    X = df[FEATURE_COLUMNS]
+    y = df['Yield']
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+def train_yield_prediction_model(params=None):
     """Train and save the yield prediction model"""
+    params = {**DEFAULT_PARAMS, **(params or {})}
     
     print("=" * 60)
     print("CROP YIELD PREDICTION MODEL TRAINING")
@@ -21,27 +60,22 @@ def train_yield_prediction_model():
     
     # Load dataset
     print("\n[1] Loading dataset...")
-    df = pd.read_csv('../datasets/crop_yield.csv')
+    df = load_dataset('yield', DATASET_COLUMNS)
     print(f"Dataset loaded: {df.shape[0]} rows, {df.shape[1]} columns")
     print(f"\nDataset columns: {list(df.columns)}")
-    print(f"Crops in dataset: {df['Crop'].unique()}")
+    print(f"Crops in dataset: {list(df['Crop'].cat.categories)}")
     
     # Prepare features
     print("\n[2] Encoding categorical variables...")
     
     # Create label encoders
-    le_state = LabelEncoder()
-    le_crop = LabelEncoder()
-    
-    df['State_Encoded'] = le_state.fit_transform(df['State'])
-    df['Crop_Encoded'] = le_crop.fit_transform(df['Crop'])
+    le_state, le_crop = encode_yield_data(df)
     
     print(f"States encoded: {len(le_state.classes_)} unique states")
     print(f"Crops encoded: {len(le_crop.classes_)} unique crops")
     
     # Select features and target
-    feature_columns = ['State_Encoded', 'Crop_Encoded', 'Area', 'Annual_Rainfall', 
-                      'Fertilizer', 'Pesticide']
+    feature_columns = FEATURE_COLUMNS
     X = df[feature_columns]
     y = df['Yield']
     
@@ -51,17 +85,15 @@ def train_yield_prediction_model():
     
     # Split data
     print("\n[3] Splitting data into train and test sets...")
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
+    X_train, X_test, y_train, y_test = split_yield_data(df)
     print(f"Training set: {X_train.shape[0]} samples")
     print(f"Testing set: {X_test.shape[0]} samples")
     
     # Train model
     print("\n[4] Training Random Forest Regressor...")
+    print(f"Parameters: {params}")
     model = RandomForestRegressor(
-        n_estimators=100,
-        max_depth=20,
+        **params,
         random_state=42,
         n_jobs=-1
     )
@@ -117,6 +149,14 @@ def train_yield_prediction_model():
     print(f"Sample input: State=Maharashtra, Crop=Rice, Area=1200, Rainfall=1150, Fertilizer=120, Pesticide=15")
     print(f"Predicted yield: {prediction[0]:.2f} tons/hectare")
     
+    # Export memory-mappable artifacts for the app
+    print("\n[9] Exporting inference artifacts...")
+    engine = compile_forest(model)
+    diff = check_parity(model, engine, X_test.to_numpy())
+    print(f"Compiled engine matches scikit-learn (max abs difference: {diff:.2e})")
+    manifest = export_yield_model(model_data)
+    print(f"Artifacts saved: {manifest['n_trees']} trees, {manifest['n_nodes']} nodes")
+    
     print("\n" + "=" * 60)
     print("MODEL TRAINING COMPLETED SUCCESSFULLY!")
     print("=" * 60)
@@ -0,0 +1,274 @@
+"""
+Yield Response Surfaces
+Precomputes the yield forest over a grid of area, rainfall, fertilizer and
+pesticide cells for every State x Crop pair, so what-if questions ("what if I
+add 20 kg/ha of fertilizer?") are answered by a table lookup instead of a
+forest pass
+
+A forest is a step function: its output only changes where an input crosses
+one of its split thresholds. Each axis is therefore cut into cells at the
+split thresholds that move the forest's output the most, and each cell holds
+the forest's value at its centre. A lookup returns the value of the input's
+cell, so it is exact wherever no omitted threshold falls inside the cell.
+Each axis spans the range seen in crop_yield.csv; the forest does not change
+beyond it, so the end cells extend to infinity. The job measures the error
+of the surface against the forest on random inputs, and the app refuses a
+surface whose mean relative error is above its limit.
+
+Layout of the surface directory (artifacts/yield_surface/):
+    manifest.json    cell edges and centres, vocabularies, model content hash, approximation error
+    surface.npy      float32 yields, shape (states, crops, area, rainfall, fertilizer, pesticide cells)
+
+Usage:
+    python yield_surface.py
+    python yield_surface.py --cells 8 32 32 16
+"""
+
+import argparse
+import bisect
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from forest_engine import compile_forest
+from model_artifacts import (ARTIFACTS_DIR, MANIFEST_NAME, YIELD_ARTIFACT_DIR, ArtifactError, content_version,
+                             load_yield_model)
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(os.path.dirname(MODELS_DIR), 'datasets', 'crop_yield.csv')
+SURFACE_DIR = os.path.join(ARTIFACTS_DIR, 'yield_surface')
+SURFACE_FILE = 'surface.npy'
+SURFACE_FORMAT_VERSION = 2
+
+# Grid axes in yield-model feature order, with their dataset columns
+AXES = ['area', 'rainfall', 'fertilizer', 'pesticide']
+# Yield-model features are State, Crop, then the axes
+FIRST_AXIS_FEATURE = 2
+AXIS_COLUMNS = {'area': 'Area', 'rainfall': 'Annual_Rainfall', 'fertilizer': 'Fertilizer', 'pesticide': 'Pesticide'}
+# Cells per axis; area is not a what-if slider, so it gets the fewest
+DEFAULT_CELLS = [6, 24, 24, 12]
+ERROR_SAMPLES = 5000
+
+class SurfaceError(Exception):
+    """Raised when a surface is missing, incompatible or built from another model"""
+
+def grid_axes(model, frame, cells=DEFAULT_CELLS):
+    """Cell edges and centres for each axis
+
+    The edges are the (cells - 1) split thresholds inside the dataset's range
+    that move the forest's output the most. Centres are the midpoints of the
+    cells, the end cells running to the dataset's minimum and maximum.
+    Returns (edges, centres, ranges), each a dict of axis -> array.
+    """
+    edges, centres, ranges = {}, {}, {}
+    for position, (axis, n) in enumerate(zip(AXES, cells)):
+        column = frame[AXIS_COLUMNS[axis]]
+        low, high = float(column.min()), float(column.max())
+        thresholds, weights = model.split_weights(FIRST_AXIS_FEATURE + position)
+        inside = (thresholds > low) & (thresholds < high)
+        thresholds, weights = thresholds[inside], weights[inside]
+        edges[axis] = np.sort(thresholds[np.argsort(weights, kind='stable')[::-1][:n - 1]])
+        bounds = np.concatenate([[low], edges[axis], [high]])
+        centres[axis] = (bounds[:-1] + bounds[1:]) / 2
+        ranges[axis] = np.array([low, high])
+    return edges, centres, ranges
+
+def evaluate_surface(model, n_states, n_crops, centres):
+    """Predicted yield at the centre of every cell of every State x Crop pair, one forest pass per state"""
+    grid = np.stack(np.meshgrid(*(centres[axis] for axis in AXES), indexing='ij'), axis=-1).reshape(-1, len(AXES))
+    shape = tuple(len(centres[axis]) for axis in AXES)
+    values = np.empty((n_states, n_crops) + shape, dtype=np.float32)
+
+    features = np.empty((n_crops, len(grid), 2 + len(AXES)), dtype=np.float64)
+    features[:, :, 1] = np.arange(n_crops)[:, None]
+    features[:, :, 2:] = grid[None, :, :]
+    for state in range(n_states):
+        features[:, :, 0] = state
+        values[state] = model.predict(features.reshape(-1, features.shape[-1])).reshape((n_crops,) + shape)
+    return values
+
+class YieldSurface:
+    """Memory-mapped response surface answering lookups from the input's cell"""
+
+    def __init__(self, values, manifest):
+        self.values = values
+        self.manifest = manifest
+        self.edges = [np.asarray(manifest['edges'][axis], dtype=np.float64) for axis in AXES]
+        self._edge_lists = [edges.tolist() for edges in self.edges]
+        self.state_index = {state: i for i, state in enumerate(manifest['states'])}
+        self.crop_index = {crop: i for i, crop in enumerate(manifest['crops'])}
+        self.model_content = manifest['model_content']
+
+    @classmethod
+    def load(cls, directory=SURFACE_DIR, mmap=True):
+        path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            raise SurfaceError(f"No yield surface at {directory}") from None
+        if manifest.get('format_version') != SURFACE_FORMAT_VERSION:
+            raise SurfaceError(f"Unsupported yield surface format {manifest.get('format_version')} in {directory} "
+                               "(re-run yield_surface.py)")
+        values = np.load(os.path.join(directory, SURFACE_FILE), mmap_mode='r' if mmap else None,
+                         allow_pickle=False)
+        expected = [len(manifest['states']), len(manifest['crops'])] + [len(manifest['edges'][a]) + 1 for a in AXES]
+        if list(values.shape) != expected:
+            raise SurfaceError(f"{SURFACE_FILE} in {directory} does not match its manifest")
+        return cls(values, manifest)
+
+    @property
+    def error(self):
+        """Approximation error measured when the surface was built"""
+        return self.manifest['approximation_error']
+
+    def _cell(self, axis, value):
+        # Cell k holds (edge[k - 1], edge[k]]: the forest sends a value equal
+        # to a threshold left, with the values below it
+        return bisect.bisect_left(self._edge_lists[axis], value)
+
+    def lookup(self, state, crop, area, rainfall, fertilizer, pesticide):
+        """Yield (tons/ha) for one input; KeyError for an unknown state or crop"""
+        return self.lookup_index(self.state_index[state], self.crop_index[crop], area, rainfall, fertilizer,
+                                 pesticide)
+
+    def lookup_index(self, state_index, crop_index, area, rainfall, fertilizer, pesticide):
+        """Yield for surface state/crop indices"""
+        cells = [self._cell(i, float(value)) for i, value in enumerate((area, rainfall, fertilizer, pesticide))]
+        return float(self.values[(state_index, crop_index, *cells)])
+
+    def lookup_many(self, state_codes, crop_codes, points):
+        """Vectorized lookup for arrays of surface state/crop indices and an (n, 4) array of axis values"""
+        points = np.asarray(points, dtype=np.float64)
+        cells = [np.searchsorted(edges, points[:, i], side='left') for i, edges in enumerate(self.edges)]
+        return self.values[(state_codes, crop_codes, *cells)].astype(np.float64)
+
+    def slice(self, state, crop, area):
+        """The rainfall x fertilizer x pesticide cells of one State x Crop pair at a given area"""
+        grid = self.values[self.state_index[state], self.crop_index[crop], self._cell(0, float(area))]
+        return {
+            'edges': {axis: self._edge_lists[i] for i, axis in enumerate(AXES) if axis != 'area'},
+            'ranges': {axis: self.manifest['ranges'][axis] for axis in AXES if axis != 'area'},
+            'values': np.round(grid.astype(np.float64), 3).tolist()
+        }
+
+def approximation_error(surface, model, ranges, n_samples=ERROR_SAMPLES, seed=42):
+    """Absolute and relative difference between surface lookups and the forest on random in-range inputs"""
+    rng = np.random.default_rng(seed)
+    n_states, n_crops = surface.values.shape[:2]
+    states = rng.integers(n_states, size=n_samples)
+    crops = rng.integers(n_crops, size=n_samples)
+    points = np.column_stack([rng.uniform(*ranges[axis], n_samples) for axis in AXES])
+    exact = model.predict(np.column_stack([states, crops, points]))
+    difference = np.abs(surface.lookup_many(states, crops, points) - exact)
+    return {
+        'samples': n_samples,
+        'mean_abs': round(float(difference.mean()), 4),
+        'p95_abs': round(float(np.percentile(difference, 95)), 4),
+        'max_abs': round(float(difference.max()), 4),
+        'mean_relative': round(float((difference / np.maximum(np.abs(exact), 1e-9)).mean()), 4),
+        'exact_fraction': round(float((difference < 1e-3).mean()), 4)
+    }
+
+def load_serving_yield_model(source):
+    """The yield forest as the app serves it, with the content hash it is known by"""
+    if source == 'artifacts':
+        try:
+            model_data = load_yield_model(YIELD_ARTIFACT_DIR, mmap=False)
+        except ArtifactError as e:
+            raise SurfaceError(f"{e} (run model_artifacts.py, or use --source pickle)") from e
+        return (model_data['model'], model_data['state_classes'], model_data['crop_classes'],
+                content_version(os.path.join(YIELD_ARTIFACT_DIR, MANIFEST_NAME)))
+
+    path = os.path.join(MODELS_DIR, 'yield_model.pkl')
+    with open(path, 'rb') as f:
+        model_data = pickle.load(f)
+    return (compile_forest(model_data['model']), [str(c) for c in model_data['state_encoder'].classes_],
+            [str(c) for c in model_data['crop_encoder'].classes_], content_version(path))
+
+def build_surface(cells=DEFAULT_CELLS, source='artifacts', directory=SURFACE_DIR):
+    """Evaluate, measure and write the surface; returns its manifest"""
+    print("=" * 60)
+    print("YIELD RESPONSE SURFACES")
+    print("=" * 60)
+
+    # Deferred so that serving a built surface does not load pandas
+    import pandas as pd
+
+    print("\n[1] Loading the yield model and dataset ranges...")
+    model, states, crops, model_content = load_serving_yield_model(source)
+    edges, centres, ranges = grid_axes(model, pd.read_csv(DATASET_PATH, usecols=list(AXIS_COLUMNS.values())), cells)
+    for axis in AXES:
+        print(f"  {axis:<11} {len(centres[axis]):>3} cells, {ranges[axis][0]:g} - {ranges[axis][1]:g}")
+
+    print(f"\n[2] Evaluating {len(states)} states x {len(crops)} crops...")
+    started = time.perf_counter()
+    values = evaluate_surface(model, len(states), len(crops), centres)
+    print(f"{values.size} grid values in {time.perf_counter() - started:.1f}s "
+          f"({values.nbytes / 1024 / 1024:.1f} MB as float32)")
+
+    manifest = {
+        'format_version': SURFACE_FORMAT_VERSION,
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'source': source,
+        'model_content': model_content,
+        'states': list(states),
+        'crops': list(crops),
+        'edges': {axis: edges[axis].tolist() for axis in AXES},
+        'centres': {axis: centres[axis].tolist() for axis in AXES},
+        'ranges': {axis: ranges[axis].tolist() for axis in AXES}
+    }
+
+    print("\n[3] Measuring the error against the forest...")
+    manifest['approximation_error'] = approximation_error(YieldSurface(values, manifest), model, ranges)
+    error = manifest['approximation_error']
+    print(f"Mean {error['mean_abs']} t/ha, p95 {error['p95_abs']} t/ha, max {error['max_abs']} t/ha "
+          f"({error['mean_relative']:.1%} mean relative, exact on {error['exact_fraction']:.0%} of inputs)")
+
+    # Written beside the target and renamed into place, like the model artifacts
+    directory = os.path.abspath(directory)
+    staging = directory + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    np.save(os.path.join(staging, SURFACE_FILE), values, allow_pickle=False)
+    with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    if os.path.exists(directory):
+        retired = directory + '.old'
+        shutil.rmtree(retired, ignore_errors=True)
+        os.replace(directory, retired)
+        os.replace(staging, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.replace(staging, directory)
+    print(f"\n✓ Surface saved to: {directory}")
+    return manifest
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Precompute yield response surfaces for every State x Crop pair')
+    parser.add_argument('--cells', type=int, nargs=len(AXES), default=DEFAULT_CELLS,
+                        metavar=('AREA', 'RAINFALL', 'FERTILIZER', 'PESTICIDE'),
+                        help='Cells per axis (default: %(default)s)')
+    parser.add_argument('--source', choices=['artifacts', 'pickle'], default='artifacts',
+                        help="Model to evaluate: the served artifacts (default) or yield_model.pkl, "
+                             "for AGRI_INFERENCE_BACKEND=sklearn")
+    args = parser.parse_args()
+    if min(args.cells) < 1:
+        parser.error('every axis needs at least 1 cell')
+
+    try:
+        build_surface(args.cells, args.source)
+    except SurfaceError as e:
+        print(f"✗ {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
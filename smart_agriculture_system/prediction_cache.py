@@ -0,0 +1,210 @@
+"""
+Prediction Cache
+Bounded in-process LRU/TTL cache for model outputs, keyed on rounded inputs,
+with an optional SQLite file shared by all worker processes
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel for cache misses, since None can be a valid cached value
+MISSING = object()
+
+def quantize(names, values, rounding, default_digits=2):
+    """Round each feature to its configured number of decimal places"""
+    return [round(float(value), rounding.get(name, default_digits)) for name, value in zip(names, values)]
+
+def make_key(namespace, names, values):
+    """Build a cache key from a namespace and already-normalized feature values"""
+    return namespace + '|' + '|'.join(f'{name}={value!r}' for name, value in zip(names, values))
+
+class SQLiteCacheBackend:
+    """Cache entries in a SQLite file so every worker on the host shares hits
+
+    Every ``purge_every`` writes a process deletes the expired rows and, if
+    more than ``max_rows`` remain, the ones closest to expiry, so the file
+    stays bounded.
+    """
+
+    def __init__(self, path, ttl, max_rows=100000, purge_every=1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.purge_every = purge_every
+        self.purged = 0
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, reopened after fork so children never share a handle
+        cached = getattr(self._local, 'connection', None)
+        if cached is not None and cached[0] == os.getpid():
+            return cached[1]
+
+        connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS predictions '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS predictions_expires ON predictions (expires)')
+        self._local.connection = (os.getpid(), connection)
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires FROM predictions WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return MISSING
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO predictions (key, value, expires) VALUES (?, ?, ?)',
+            (key, json.dumps(value), time.time() + self.ttl)
+        )
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % self.purge_every == 0
+        if due:
+            self.purge()
+
+    def purge_expired(self):
+        """Delete expired rows, returns how many were removed"""
+        return self._connection().execute(
+            'DELETE FROM predictions WHERE expires < ?', (time.time(),)
+        ).rowcount
+
+    def purge(self):
+        """Delete expired rows, then the oldest rows beyond max_rows; returns how many were removed"""
+        connection = self._connection()
+        removed = self.purge_expired()
+        excess = connection.execute('SELECT COUNT(*) FROM predictions').fetchone()[0] - self.max_rows
+        if excess > 0:
+            # Every row lives for the same TTL, so the soonest to expire are the oldest
+            removed += connection.execute(
+                'DELETE FROM predictions WHERE key IN '
+                '(SELECT key FROM predictions ORDER BY expires LIMIT ?)', (excess,)
+            ).rowcount
+        with self._writes_lock:
+            self.purged += removed
+        return removed
+
+class PredictionCache:
+    """Thread-safe LRU cache with per-entry expiry
+
+    Lookups check the local LRU first, then the shared backend if one is
+    configured; shared hits are copied into the local LRU. Values must be
+    JSON-serializable when a shared backend is used.
+    """
+
+    def __init__(self, maxsize=10000, ttl=3600, backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'backend_errors': 0
+        }
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 or self.backend is not None
+
+    def get(self, key, record=True):
+        """Return the cached value for key, or MISSING
+
+        ``record=False`` skips the hit/miss counters, for re-checks of a key
+        that was already counted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    if record:
+                        self.counters['hits'] += 1
+                    return entry[0]
+                del self._entries[key]
+                self.counters['expirations'] += 1
+
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except sqlite3.Error:
+                value = MISSING
+                self._count('backend_errors')
+            if value is not MISSING:
+                if record:
+                    self._count('shared_hits')
+                self._store_local(key, value)
+                return value
+
+        if record:
+            self._count('misses')
+        return MISSING
+
+    def set(self, key, value):
+        """Store a value locally and in the shared backend"""
+        self._store_local(key, value)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value)
+            except sqlite3.Error:
+                self._count('backend_errors')
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        """Drop all local entries (the shared backend is left alone)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters plus current size, safe to serialize"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self._entries)
+        stats['maxsize'] = self.maxsize
+        stats['ttl_seconds'] = self.ttl
+        stats['shared_backend'] = self.backend.path if self.backend is not None else None
+        if self.backend is not None:
+            stats['shared_max_rows'] = self.backend.max_rows
+            stats['shared_purged'] = self.backend.purged
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _store_local(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
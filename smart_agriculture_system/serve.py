@@ -0,0 +1,280 @@
+"""
+Production Server
+Pre-fork process pool for serving the app on every core: the parent loads
+and warms up the models once, then forks the workers, which share them
+
+Model memory is shared rather than copied per worker. Memory-mapped
+artifacts (the default) are shared through the page cache; pickled models are
+shared copy-on-write, and the parent freezes the garbage collector before
+forking so collections in the workers do not touch (and copy) those pages.
+
+Each worker accepts connections from the socket the parent opened and handles
+them on a bounded thread pool. SIGTERM or Ctrl+C shuts down gracefully:
+workers stop accepting, finish in-flight requests and exit, and any still
+running after --graceful-timeout are killed. A worker that dies is replaced.
+SIGHUP reloads the models in every process (see /api/models/reload).
+
+Usage:
+    python serve.py                                  # one worker per available CPU
+    python serve.py --workers 8 --threads 4 --port 8000 --cpu-affinity
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# A worker that exits sooner than this after starting is restarted only after a pause
+MIN_WORKER_LIFETIME = 1.0
+RESPAWN_DELAY = 1.0
+# Seconds a connection may stay silent before its worker thread gives up on it
+CONNECTION_TIMEOUT = 30
+# Seconds a worker with every thread busy waits for one to free up before
+# checking for shutdown again; meanwhile other workers take the connections
+ACCEPT_WAIT = 0.05
+
+def available_cpus():
+    """CPUs this process may run on (all of them where affinity is not supported)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection: an idle keep-alive client would otherwise
+    # hold one of the worker's few threads
+    protocol_version = 'HTTP/1.0'
+    timeout = CONNECTION_TIMEOUT
+    access_log = False
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server handling requests on a fixed-size thread pool"""
+
+    multithread = True
+
+    def __init__(self, app, listener, threads, handler=RequestHandler):
+        host, port = listener.getsockname()[:2]
+        super().__init__(host, port, app, handler=handler, fd=listener.fileno())
+        # The listening socket is shared by all workers: one that loses the
+        # race for a connection gets EAGAIN instead of blocking in accept()
+        self.socket.setblocking(False)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+        # One slot per thread, taken before accepting: a worker whose threads
+        # are all busy leaves new connections in the shared backlog for the
+        # others instead of queueing them behind its own requests
+        self.slots = threading.BoundedSemaphore(threads)
+
+    def get_request(self):
+        if not self.slots.acquire(timeout=ACCEPT_WAIT):
+            # Treated like losing the accept race: serve_forever() polls again
+            raise BlockingIOError('all request threads busy')
+        try:
+            return super().get_request()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def shutdown_request(self, request):
+        # Called exactly once for every accepted connection
+        try:
+            super().shutdown_request(request)
+        finally:
+            self.slots.release()
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        """Wait for in-flight requests, then close the socket"""
+        self.pool.shutdown(wait=True)
+        self.server_close()
+
+def open_listener(host, port, backlog=2048):
+    """The listening socket, opened once in the parent and inherited by every worker"""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    listener.set_inheritable(True)
+    return listener
+
+def run_worker(app_module, listener, threads, cpu=None):
+    """Worker process body: serve until SIGTERM, then drain and exit"""
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    server = PooledWSGIServer(app_module.app, listener, threads)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it cannot run
+        # on the thread that is inside serve_forever()
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    # Replace the handlers inherited from the supervisor
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, app_module.handle_reload_signal)
+    server.serve_forever(poll_interval=0.2)
+    server.drain()
+
+class Supervisor:
+    """Forks the workers, replaces ones that die and shuts them all down"""
+
+    def __init__(self, app_module, listener, workers, threads, cpu_affinity=False, graceful_timeout=30.0):
+        self.app_module = app_module
+        self.listener = listener
+        self.workers = workers
+        self.threads = threads
+        self.cpus = available_cpus() if cpu_affinity else None
+        self.graceful_timeout = graceful_timeout
+        self.children = {}  # pid -> (slot, started)
+        self.stopping = False
+
+    def spawn(self, slot):
+        cpu = None if self.cpus is None else self.cpus[slot % len(self.cpus)]
+        # Unflushed output would otherwise be printed again by the child
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.app_module, self.listener, self.threads, cpu)
+            except BaseException as e:
+                print(f"✗ Worker {os.getpid()} failed - {e}", file=sys.stderr)
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.children[pid] = (slot, time.monotonic())
+        pinned = '' if cpu is None else f' on CPU {cpu}'
+        print(f"✓ Worker {slot} started (pid {pid}{pinned})")
+
+    def signal_children(self, signum):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def handle_stop(self, signum, frame):
+        if not self.stopping:
+            self.stopping = True
+            print("\nShutting down: waiting for in-flight requests...")
+            self.signal_children(signal.SIGTERM)
+
+    def handle_reload(self, signum, frame):
+        # The parent reloads too, so workers started later begin with the new models
+        self.app_module.handle_reload_signal(signum, frame)
+        self.signal_children(signal.SIGHUP)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self.handle_reload)
+
+        for slot in range(self.workers):
+            self.spawn(slot)
+
+        deadline = None
+        while self.children:
+            if self.stopping and deadline is None:
+                deadline = time.monotonic() + self.graceful_timeout
+            if deadline is not None and time.monotonic() > deadline:
+                print(f"Killing {len(self.children)} worker(s) still running after {self.graceful_timeout:g}s")
+                self.signal_children(signal.SIGKILL)
+                deadline = float('inf')
+
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.1)
+                continue
+
+            if pid not in self.children:
+                continue
+            slot, started = self.children.pop(pid)
+            if self.stopping:
+                continue
+            print(f"Warning: worker {slot} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}; "
+                  "replacing it")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(RESPAWN_DELAY)
+            self.spawn(slot)
+        print("✓ All workers stopped")
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Serve the app with a pre-fork pool of worker processes')
+    parser.add_argument('--host', default=os.environ.get('AGRI_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('AGRI_PORT', '5000')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('AGRI_WORKERS', len(available_cpus()))),
+                        help='Worker processes (default: one per available CPU)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('AGRI_THREADS', '4')),
+                        help='Request threads per worker (default: %(default)s)')
+    parser.add_argument('--cpu-affinity', action='store_true',
+                        default=os.environ.get('AGRI_CPU_AFFINITY', '0') == '1',
+                        help='Pin worker i to the i-th available CPU (Linux)')
+    parser.add_argument('--graceful-timeout', type=float, default=30.0,
+                        help='Seconds workers get to finish in-flight requests on shutdown (default: %(default)s)')
+    parser.add_argument('--access-log', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        print("✗ Pre-fork serving needs a POSIX system; use python app.py instead")
+        return 1
+    if args.workers < 1 or args.threads < 1:
+        parser.error('--workers and --threads must be at least 1')
+    if args.cpu_affinity and not hasattr(os, 'sched_setaffinity'):
+        parser.error('--cpu-affinity is not supported on this platform')
+    RequestHandler.access_log = args.access_log
+
+    import app as agri_app
+    print(f"App imported in {agri_app.model_state['import_seconds'] * 1000:.1f} ms")
+    try:
+        agri_app.warm_up()
+    except agri_app.ModelsUnavailable:
+        return 1
+    agri_app.register_fork_handlers()
+    listener = open_listener(args.host, args.port)
+
+    # Everything allocated so far (models, lookup tables, the app) moves to
+    # the permanent generation, so worker GCs leave those pages shared
+    gc.collect()
+    gc.freeze()
+
+    print("\n" + "=" * 60)
+    print("SMART AGRICULTURE DECISION SUPPORT SYSTEM")
+    print("=" * 60)
+    print(f"\nServing on http://{args.host}:{args.port} with {args.workers} worker(s) x {args.threads} thread(s)")
+    print("Press CTRL+C to stop the server\n")
+
+    Supervisor(agri_app, listener, args.workers, args.threads, args.cpu_affinity, args.graceful_timeout).run()
+    listener.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -129,6 +129,7 @@ function handleYieldPrediction(event) {
         if (data.success) {
             displayYieldPrediction(data);
             showResults('results-yield');
+            loadYieldSurfaceSlice(formData, data.predicted_yield);
         } else {
             alert('Error: ' + data.error);
         }
@@ -162,6 +163,87 @@ function displayYieldPrediction(data) {
     document.getElementById('advice-yield').innerHTML = adviceHtml;
 }
 
+// What-if sliders: a rainfall x fertilizer x pesticide grid for the chosen
+// state and crop is fetched once, then slider moves are looked up locally.
+// Estimates are anchored to the exact prediction at the submitted inputs, so
+// the sliders show how the surface changes from there
+let yieldSurfaceSlice = null;
+
+function loadYieldSurfaceSlice(formData, predictedYield) {
+    const params = new URLSearchParams({
+        state: formData.state,
+        crop: formData.crop,
+        area: formData.area
+    });
+    
+    fetch('/api/yield-surface/slice?' + params.toString())
+    .then(response => response.json())
+    .then(data => {
+        const panel = document.getElementById('what-if');
+        if (!data.success) {
+            // No surface for the serving model: keep using full predictions only
+            yieldSurfaceSlice = null;
+            panel.style.display = 'none';
+            return;
+        }
+        yieldSurfaceSlice = data;
+        
+        const startValues = {
+            rainfall: formData.rainfall,
+            fertilizer: formData.fertilizer,
+            pesticide: formData.pesticide
+        };
+        ['rainfall', 'fertilizer', 'pesticide'].forEach(axis => {
+            const [low, high] = data.ranges[axis];
+            const slider = document.getElementById('what-if-' + axis);
+            slider.min = low;
+            slider.max = high;
+            slider.step = (high - low) / 200;
+            slider.value = Math.min(Math.max(parseFloat(startValues[axis]), low), high);
+        });
+        data.offset = predictedYield - lookupSurface(
+            data, parseFloat(formData.rainfall), parseFloat(formData.fertilizer), parseFloat(formData.pesticide));
+        panel.style.display = '';
+        updateWhatIf();
+    })
+    .catch(error => {
+        console.error('Error:', error);
+    });
+}
+
+// Cell of a value: the number of cell edges below it
+function surfaceCell(edges, value) {
+    let cell = 0;
+    while (cell < edges.length && edges[cell] < value) {
+        cell++;
+    }
+    return cell;
+}
+
+// Value of the input's cell in the slice, the same as the server's lookup
+function lookupSurface(slice, rainfall, fertilizer, pesticide) {
+    return slice.values[surfaceCell(slice.edges.rainfall, rainfall)]
+        [surfaceCell(slice.edges.fertilizer, fertilizer)]
+        [surfaceCell(slice.edges.pesticide, pesticide)];
+}
+
+function updateWhatIf() {
+    if (!yieldSurfaceSlice) {
+        return;
+    }
+    const values = {};
+    ['rainfall', 'fertilizer', 'pesticide'].forEach(axis => {
+        values[axis] = parseFloat(document.getElementById('what-if-' + axis).value);
+        document.getElementById('what-if-' + axis + '-value').textContent = values[axis].toFixed(1);
+    });
+    
+    const estimate = Math.max(0, yieldSurfaceSlice.offset +
+        lookupSurface(yieldSurfaceSlice, values.rainfall, values.fertilizer, values.pesticide));
+    document.getElementById('what-if-yield').textContent = '≈ ' + estimate.toFixed(2) + ' tons/ha';
+    document.getElementById('what-if-production').textContent =
+        '≈ ' + (estimate * yieldSurfaceSlice.area).toFixed(2) + ' tons';
+}
+
 // Weather Advisory Form Handler
 function handleWeatherAdvisory(event) {
     event.preventDefault();
@@ -243,6 +325,11 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // What-if sliders on the yield page
+    document.querySelectorAll('#what-if input[type="range"]').forEach(slider => {
+        slider.addEventListener('input', updateWhatIf);
+    });
+    
     // Add smooth scroll for navigation
     const navLinks = document.querySelectorAll('.nav a');
     navLinks.forEach(link => {
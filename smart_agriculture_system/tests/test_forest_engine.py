@@ -0,0 +1,100 @@
+"""
+Parity of the compiled forest engine with scikit-learn
+Compiles both pickled models and checks that predict / predict_proba match
+scikit-learn on the dataset rows and on rows placed exactly at, just below
+and just above the forests' split thresholds.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import pickle
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(APP_DIR, 'models')
+DATASETS_DIR = os.path.join(APP_DIR, 'datasets')
+sys.path.insert(0, MODELS_DIR)
+
+from forest_engine import check_parity, compile_forest  # noqa: E402
+
+THRESHOLD_ROWS = 3000
+SINGLE_ROWS = 50
+
+def load_model(kind):
+    """The pickled model and its dataset rows as the model's feature matrix"""
+    if kind == 'crop':
+        with open(os.path.join(MODELS_DIR, 'crop_model.pkl'), 'rb') as f:
+            model = pickle.load(f)
+        frame = pd.read_csv(os.path.join(DATASETS_DIR, 'crop_recommendation.csv'))
+        return model, frame[['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']].to_numpy(np.float64)
+
+    with open(os.path.join(MODELS_DIR, 'yield_model.pkl'), 'rb') as f:
+        model_data = pickle.load(f)
+    frame = pd.read_csv(os.path.join(DATASETS_DIR, 'crop_yield.csv'))
+    X = np.column_stack([
+        model_data['state_encoder'].transform(frame['State']),
+        model_data['crop_encoder'].transform(frame['Crop']),
+        frame[['Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']].to_numpy(np.float64)
+    ])
+    return model_data['model'], X
+
+def threshold_rows(engine, reference, n_rows=THRESHOLD_ROWS, seed=42):
+    """Dataset rows with one feature moved onto a split threshold or to its float32 neighbours
+
+    scikit-learn compares float32 inputs with the thresholds, so these are the
+    rows where a rounding or comparison slip would send a row the wrong way.
+    """
+    rng = np.random.default_rng(seed)
+    rows = reference[rng.integers(len(reference), size=n_rows)].copy()
+    features = rng.integers(reference.shape[1], size=n_rows)
+    for feature in np.unique(features):
+        thresholds = engine.split_thresholds(feature)
+        if not len(thresholds):
+            continue
+        chosen = np.flatnonzero(features == feature)
+        at = thresholds[rng.integers(len(thresholds), size=len(chosen))].astype(np.float32)
+        direction = rng.choice([-np.inf, 0, np.inf], size=len(chosen)).astype(np.float32)
+        moved = np.where(direction == 0, at, np.nextafter(at, direction))
+        rows[chosen, feature] = moved
+    return rows
+
+@pytest.fixture(scope='module', params=['crop', 'yield'])
+def compiled(request):
+    model, reference = load_model(request.param)
+    return model, compile_forest(model), reference
+
+@pytest.fixture(autouse=True)
+def quiet_feature_names():
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+        yield
+
+def test_parity_on_dataset_rows(compiled):
+    model, engine, reference = compiled
+    check_parity(model, engine, reference)
+
+def test_parity_at_split_thresholds(compiled):
+    model, engine, reference = compiled
+    check_parity(model, engine, threshold_rows(engine, reference))
+
+def test_predict_matches(compiled):
+    model, engine, reference = compiled
+    X = np.vstack([reference, threshold_rows(engine, reference)])
+    if engine.is_classifier:
+        np.testing.assert_array_equal(model.predict(X), engine.predict(X))
+        np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+    else:
+        np.testing.assert_allclose(engine.predict(X), model.predict(X), rtol=0, atol=1e-9)
+
+def test_parity_on_single_rows(compiled):
+    # Single rows take the engine's small-batch path
+    model, engine, reference = compiled
+    for row in threshold_rows(engine, reference, n_rows=SINGLE_ROWS):
+        check_parity(model, engine, row.reshape(1, -1))
@@ -0,0 +1,162 @@
+"""
+Weather Provider Client
+OpenWeather client on a pooled requests.Session with strict timeouts and
+retries, a per-city TTL cache, and coalescing of concurrent fetches so many
+simultaneous requests for one city make a single upstream call
+"""
+
+import threading
+from datetime import datetime
+
+from prediction_cache import PredictionCache, MISSING
+
+class WeatherProviderError(Exception):
+    """Raised when the weather provider cannot be reached or returns bad data"""
+
+class _InflightFetch:
+    """One upstream fetch that other callers for the same city wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class WeatherClient:
+    """Fetch current weather for a city, normalized to the app's weather dict"""
+
+    def __init__(self, api_url, api_key, connect_timeout=2.0, read_timeout=3.0,
+                 retries=2, backoff=0.2, pool_size=32, cache_ttl=600, cache_size=2000):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.cache = PredictionCache(maxsize=cache_size, ttl=cache_ttl)
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Shared keep-alive session, created on first use"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        # requests is only needed once a real provider is configured
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def fetch(self, city):
+        """Current weather for city, from the cache or one shared upstream call"""
+        key = city.strip().lower()
+        if not key:
+            raise WeatherProviderError('City must not be empty')
+
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            return dict(cached)
+
+        with self._inflight_lock:
+            # A fetch may have finished between the cache check and taking the lock
+            cached = self.cache.get(key, record=False)
+            if cached is not MISSING:
+                return dict(cached)
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InflightFetch()
+                self.upstream_calls += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = self._fetch_upstream(city.strip())
+                self.cache.set(key, call.result)
+            except WeatherProviderError as e:
+                call.error = e
+            except Exception as e:
+                call.error = WeatherProviderError(f'Weather fetch failed: {e}')
+            finally:
+                with self._inflight_lock:
+                    del self._inflight[key]
+                call.done.set()
+        elif not call.done.wait(self._max_wait()):
+            raise WeatherProviderError(f'Timed out waiting for weather for {city}')
+
+        if call.error is not None:
+            raise call.error
+        return dict(call.result)
+
+    def _max_wait(self):
+        # Worst case for the leader: every attempt times out, plus backoff
+        attempts = self.retries + 1
+        return attempts * sum(self.timeout) + self.backoff * (2 ** attempts)
+
+    def _fetch_upstream(self, city):
+        import requests
+
+        try:
+            response = self.session.get(
+                self.api_url,
+                params={'q': city, 'appid': self.api_key, 'units': 'metric'},
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise WeatherProviderError(f'Weather request failed: {e}') from e
+
+        if response.status_code != 200:
+            raise WeatherProviderError(f'Weather provider returned HTTP {response.status_code}')
+
+        try:
+            return parse_openweather(response.json(), city)
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            raise WeatherProviderError(f'Unexpected weather response: {e}') from e
+
+    def stats(self):
+        """Upstream call, coalescing and cache counters"""
+        return {
+            'upstream_calls': self.upstream_calls,
+            'coalesced_requests': self.coalesced,
+            'cache': self.cache.stats()
+        }
+
+def parse_openweather(payload, city):
+    """Convert an OpenWeather current-weather response to the app's weather dict"""
+    rain = payload.get('rain') or {}
+    description = payload['weather'][0]['description'] if payload.get('weather') else ''
+    return {
+        'city': payload.get('name') or city,
+        'temperature': round(float(payload['main']['temp']), 1),
+        'humidity': round(float(payload['main']['humidity']), 1),
+        'rainfall': round(float(rain.get('1h', rain.get('3h', 0.0))), 1),
+        # OpenWeather reports m/s in metric units; the UI shows km/h
+        'wind_speed': round(float(payload.get('wind', {}).get('speed', 0.0)) * 3.6, 1),
+        'description': description.capitalize(),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
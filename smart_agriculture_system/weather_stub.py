@@ -0,0 +1,108 @@
+"""
+Local Weather Stub Server
+Serves OpenWeather-shaped responses with deterministic values per city, for
+exercising the weather client without network access
+
+Usage:
+    python weather_stub.py --port 8001 --delay 0.2
+    WEATHER_API_URL=http://127.0.0.1:8001/data/2.5/weather OPENWEATHER_API_KEY=stub python app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DESCRIPTIONS = ['clear sky', 'few clouds', 'scattered clouds', 'light rain', 'moderate rain']
+
+def stub_weather(city):
+    """Deterministic OpenWeather payload for a city"""
+    rng = random.Random(zlib.crc32(city.strip().lower().encode('utf-8')))
+    payload = {
+        'name': city.strip().title(),
+        'main': {
+            'temp': round(rng.uniform(8, 42), 2),
+            'humidity': rng.randint(25, 95)
+        },
+        'wind': {'speed': round(rng.uniform(0.5, 8), 2)},
+        'weather': [{'description': rng.choice(DESCRIPTIONS)}]
+    }
+    if rng.random() < 0.4:
+        payload['rain'] = {'1h': round(rng.uniform(0.5, 40), 2)}
+    return payload
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handles /data/2.5/weather?q=<city> and /stats"""
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+
+        if url.path == '/stats':
+            self._send(200, {'requests': server.request_count})
+            return
+
+        with server.lock:
+            server.request_count += 1
+
+        if server.delay:
+            time.sleep(server.delay)
+        if server.failure_rate and random.random() < server.failure_rate:
+            self._send(503, {'cod': 503, 'message': 'stub failure'})
+            return
+
+        city = parse_qs(url.query).get('q', [''])[0]
+        if not city:
+            self._send(400, {'cod': 400, 'message': 'Nothing to geocode'})
+            return
+        self._send(200, stub_weather(city))
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded server with a listen backlog large enough for load tests"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+def start_stub_server(host='127.0.0.1', port=0, delay=0.0, failure_rate=0.0):
+    """Start the stub in a daemon thread; returns the server (see server.server_port)"""
+    server = StubServer((host, port), StubHandler)
+    server.delay = delay
+    server.failure_rate = failure_rate
+    server.request_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name='weather-stub', daemon=True).start()
+    return server
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Local OpenWeather stub server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before each response')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.host, args.port, args.delay, args.failure_rate)
+    print(f"Weather stub listening on http://{args.host}:{server.server_port}/data/2.5/weather")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()